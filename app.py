@@ -1,25 +1,25 @@
-import os
-import time
 import json
 import sqlite3
 import threading
-from flask import Flask, render_template, jsonify, Response
+from flask import Flask, render_template, jsonify, Response, request
 import common  
+import database
+import memory
+import ingest
+import chat
+from tracing import tracer
 import logging
 
 app = Flask(__name__)
 
+SSE_TIMEOUT = 15 # SSE 无状态变化时最长等待秒数
+
 log = logging.getLogger('werkzeug') 
 log.setLevel(logging.ERROR) 
 
-DATABASE = "chat_memory.db" # 数据库文件路径
-
-def get_db_mtime():
-    """获取数据库文件的最后修改时间"""
-    try:
-        return os.path.getmtime(DATABASE)
-    except OSError:
-        return 0 # 文件不存在或无法访问
+def get_db_version():
+    """获取数据库的数据版本号 (WAL 模式下文件修改时间不可靠)"""
+    return database.data_version()
 
 def get_current_status():
     """从 common 模块获取当前状态"""
@@ -47,18 +47,19 @@ def status_stream():
     """服务器推送事件 (SSE) 的接口，监控状态和数据库变化并通知前端"""
     def event_stream():
         local_last_status = None
-        local_last_mtime = get_db_mtime()
+        local_last_version = get_db_version()
         local_last_question = common.question_text()
+        state_version = common.state.snapshot()[0]
 
         try:
             while True:
                 current_status = get_current_status()
-                current_mtime = get_db_mtime()
+                current_version = get_db_version()
                 current_question = common.question_text()
                 current_delta = common.delta_text()
 
                 status_changed = (current_status != local_last_status)
-                db_changed = (current_mtime != local_last_mtime and current_mtime != 0)
+                db_changed = (current_version != local_last_version)
                 question_changed = (current_question != local_last_question)
                 delta_update_needed = bool(current_delta) # delta 非空就需要更新
 
@@ -79,11 +80,11 @@ def status_stream():
                     if status_changed:
                         local_last_status = current_status
                     if db_changed:
-                        local_last_mtime = current_mtime
+                        local_last_version = current_version
                     if question_changed:
                         local_last_question = current_question
 
-                time.sleep(0.05)
+                state_version = common.state.wait_change(state_version, SSE_TIMEOUT)[0] # 状态变化时才唤醒
         except Exception as e:
             print(f"SSE 流发生错误: {e}")
 
@@ -94,38 +95,53 @@ def status_stream():
 
 @app.route('/records')
 def get_records():
-    """获取聊天记录"""
-    records = []
-    if os.path.exists(DATABASE):
-        try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='chat_records';") # 检查表是否存在
-            if cursor.fetchone():
-                cursor.execute(
-                    "SELECT id, user_id, event_type, question, response, answered FROM chat_records ORDER BY id DESC"
-                )
-                rows = cursor.fetchall()
-                for row in rows:
-                    records.append({
-                        "id": row[0],
-                        "user_id": row[1],
-                        "event_type": row[2],
-                        "question": row[3],
-                        "response": row[4],
-                        "answered": bool(row[5]) # 确保是布尔值
-                    })
-            conn.close()
-        except sqlite3.Error as e:
-            print(f"数据库错误: {e}")
-            return jsonify({"error": f"数据库读取错误: {e}"}), 500 
-        except Exception as e:
-            print(f"读取记录时发生未知错误: {e}")
-            return jsonify({"error": "读取记录时发生未知错误"}), 500
+    """获取聊天记录，?archive=1 时读取归档表"""
+    try:
+        records = memory.fetch_records(descending=True, archive=request.args.get('archive') == '1')
+    except sqlite3.Error as e:
+        print(f"数据库错误: {e}")
+        return jsonify({"error": f"数据库读取错误: {e}"}), 500 
+    except Exception as e:
+        print(f"读取记录时发生未知错误: {e}")
+        return jsonify({"error": "读取记录时发生未知错误"}), 500
         
     return jsonify(records)
 
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus 文本格式的轮次耗时和弹幕写入计数"""
+    stats = ingest.stats()
+    depth = stats.pop("queue_depth")
+    text = tracer.prometheus({
+        "vtuber_ingest_messages_total": ("counter", "Chat messages by ingest outcome.", stats),
+        "vtuber_ingest_queue_depth": ("gauge", "Messages waiting to be written.", {"queue": depth}),
+        "vtuber_realtime_connection": ("gauge", "Realtime connection counters and failover time in milliseconds.",
+                                       chat.supervisor.stats()),
+        "vtuber_audio_player": ("gauge", "Audio jitter buffer counters, buffered milliseconds and queue depth.",
+                                common.player.stats()),
+        "vtuber_subtitle_channel": ("gauge", "Subtitle channel message counters and connection state.",
+                                    common.subtitles.stats()),
+        "vtuber_subtitle_window": ("gauge", "Subtitle window wakeups, redraws and latency in milliseconds, as last reported.",
+                                   common.subtitles.window_stats),
+    })
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/maintenance/rebuild', methods=['POST'])
+def rebuild_clusters():
+    """在应用进程内批量重建问题分组，内存中的问题簇索引随之更新，?block_size=N"""
+    block_size = request.args.get('block_size', default=1024, type=int)
+    try:
+        return jsonify({"clusters": memory.rebuild_clusters(block_size)})
+    except Exception as e:
+        print(f"重建问题分组失败: {e}")
+        return jsonify({"error": f"重建问题分组失败: {e}"}), 500
+
+@app.route('/traces')
+def get_traces():
+    """最近轮次的各阶段耗时 (毫秒)，?limit=N 限制条数"""
+    limit = request.args.get('limit', type=int)
+    return jsonify({"summary": tracer.summary(), "traces": tracer.traces(limit)})
+
 def run_flask():
     """启动 Flask 服务器"""
     print("Running on http://127.0.0.1:5000")
@@ -0,0 +1,980 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import shutil
+import tempfile
+import argparse
+import subprocess
+import base64
+import wave
+import io
+
+# 基准测试在临时目录中运行，避免改动 chat_memory.db，结束后删除
+ORIGINAL_DIR = os.getcwd()
+WORK_DIR = tempfile.mkdtemp(prefix="vtuber_bench_")
+os.chdir(WORK_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import memory
+from recall import RecallIndex
+from scheduler import QuestionScheduler
+import prompt
+from vad import VoiceActivityDetector
+from rapidfuzz import fuzz
+from tracing import quantile
+from fixtures import legacy_next_id, vad_audio, VAD_SEGMENTS
+
+SAMPLE_TEXTS = [
+    "主播晚上好", "今天播什么", "唱首歌吧", "好可爱", "哈哈哈哈哈", "这个游戏叫什么",
+    "主播吃饭了吗", "来点互动", "关注了", "下次什么时候播", "新人第一次来", "老婆好美",
+]
+
+COMMON_CHARS = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+
+def random_question():
+    """生成随机弹幕"""
+    return random.choice(SAMPLE_TEXTS) + str(random.randint(0, 100000))
+
+def random_text():
+    """生成随机汉字弹幕，大多互不相似"""
+    if random.random() < 0.3:
+        return random_question()
+    return "".join(random.choice(COMMON_CHARS) for _ in range(random.randint(4, 16)))
+
+def legacy_insert(path, user_id, question):
+    """旧实现：每次调用新建连接"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute('''INSERT INTO chat_records (user_id, event_type, question, answered)
+                      VALUES (?, ?, ?, ?)''', (user_id, "live_message", question, False))
+    conn.commit()
+    conn.close()
+
+def legacy_read(path):
+    """旧实现：每次调用新建连接"""
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, user_id, event_type, question, response, answered FROM chat_records WHERE answered = 0 LIMIT 1")
+    cursor.fetchall()
+    conn.close()
+
+def pooled_insert(user_id, question):
+    """新实现：提交到写线程"""
+    database.execute_write(lambda conn: conn.execute(
+        '''INSERT INTO chat_records (user_id, event_type, question, answered)
+           VALUES (?, ?, ?, ?)''', (user_id, "live_message", question, False)))
+
+def pooled_read():
+    """新实现：从只读连接池读取"""
+    database.read("SELECT id, user_id, event_type, question, response, answered FROM chat_records WHERE answered = 0 LIMIT 1")
+
+def throughput(func, n):
+    """返回每秒操作次数"""
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return n / (time.perf_counter() - start)
+
+def bench_db(args):
+    """连接层基准：旧的逐次连接 vs 写线程 + 连接池"""
+    database.close_db()
+    legacy_path = os.path.join(WORK_DIR, "legacy.db")
+    conn = sqlite3.connect(legacy_path)
+    memory._create_tables(conn)
+    conn.commit()
+    conn.close()
+
+    memory.init_db(os.path.join(WORK_DIR, "pooled.db"))
+
+    results = {
+        "legacy_insert": throughput(lambda: legacy_insert(legacy_path, "user", random_question()), args.n),
+        "pooled_insert": throughput(lambda: pooled_insert("user", random_question()), args.n),
+        "legacy_read": throughput(lambda: legacy_read(legacy_path), args.n),
+        "pooled_read": throughput(pooled_read, args.n),
+    }
+    for name, ops in results.items():
+        print(f"{name:>16}: {ops:10.1f} ops/s")
+
+def check_ids(args):
+    """随机插入/删除流下，校验 ID 分配与旧的扫描算法一致"""
+    random.seed(args.seed)
+    memory.init_db(os.path.join(WORK_DIR, "ids.db"))
+
+    for step in range(args.n):
+        used_ids = [row[0] for row in database.read("SELECT id FROM chat_records ORDER BY id")]
+        if used_ids and random.random() < 0.4:
+            merged = random.sample(used_ids, random.randint(1, min(5, len(used_ids))))
+            memory.update_chat_response(merged, "回复") # 保留一条，删除其余
+            continue
+
+        if step % 97 == 0:
+            memory.init_db(os.path.join(WORK_DIR, "ids.db")) # 模拟重启，从表恢复分配器
+
+        expected = legacy_next_id(used_ids)
+        question = f"问题{step}"
+        memory.save_chat_record("user", "stt_message", question)
+        actual = database.read("SELECT id FROM chat_records WHERE question = ?", (question,))[0][0]
+        if actual != expected:
+            print(f"第 {step} 步 ID 不一致: 期望 {expected}, 实际 {actual}")
+            sys.exit(1)
+
+    print(f"{args.n} 步 ID 分配与旧算法一致")
+
+def bench_recall(args):
+    """长期记忆检索：旧的逐条 fuzz.ratio vs TF-IDF 倒排索引"""
+    random.seed(args.seed)
+    pairs = [(random_question(), random.choice(SAMPLE_TEXTS)) for _ in range(args.n)]
+    index = RecallIndex()
+    for record_id, (question, response) in enumerate(pairs):
+        index.add(record_id, "live_message", question, response)
+
+    queries = [random_question() for _ in range(200)]
+
+    start = time.perf_counter()
+    for query in queries:
+        [q for q, _ in pairs if fuzz.ratio(query, q) >= 50]
+    legacy_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, memory.RECALL_TOP_K)
+    indexed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    # 相关性：原问题应检索到自己，无关查询不应返回结果
+    found = sum(record_id in {i for i, _ in index.search(pairs[record_id][0], memory.RECALL_TOP_K)}
+                for record_id in random.sample(range(args.n), min(200, args.n)))
+    unrelated = ["".join(random.choice(COMMON_CHARS) for _ in range(random.randint(4, 16))) + str(random.randint(0, 999))
+                 for _ in range(200)] # 只有数字和部分记录偶然相同
+    noisy = sum(1 for query in unrelated if index.search(query, memory.RECALL_TOP_K))
+
+    print(f"{args.n} 条已回答记录")
+    print(f"  逐条 fuzz.ratio: {legacy_ms:8.3f} ms/次")
+    print(f"  TF-IDF top-{memory.RECALL_TOP_K}:    {indexed_ms:8.3f} ms/次")
+    print(f"  原问题检索到自己: {found}/{min(200, args.n)} | 无关查询有结果: {noisy}/{len(unrelated)} (应为 0)")
+
+def pairwise_groups(questions):
+    """旧路径：逐对调用 fuzz.ratio 分组"""
+    assigned = [False] * len(questions)
+    groups = []
+    for i, question in enumerate(questions):
+        if assigned[i]:
+            continue
+        members = [j for j in range(i, len(questions))
+                   if not assigned[j] and fuzz.ratio(question, questions[j]) >= 50]
+        for j in members:
+            assigned[j] = True
+        groups.append(members)
+    return groups
+
+def bench_cdist(args):
+    """批量分组：逐对 fuzz.ratio vs cdist 矩阵"""
+    random.seed(args.seed)
+    for size in args.sizes:
+        questions = [random_text() for _ in range(size)]
+
+        start = time.perf_counter()
+        groups = memory.group_questions(questions, args.block_size)
+        batch_s = time.perf_counter() - start
+
+        if size <= args.pair_limit:
+            start = time.perf_counter()
+            expected = pairwise_groups(questions)
+            pair_s = f"{time.perf_counter() - start:9.2f} s"
+            same = "一致" if sorted(expected) == sorted(groups) else "不一致"
+        else:
+            pair_s, same = "     跳过", "-"
+
+        print(f"{size:>6} 条: 逐对 {pair_s} | cdist {batch_s:9.2f} s | {len(groups)} 个簇 | 结果{same}")
+
+def simulate_schedule(scheduler, arrivals, service_time, duration):
+    """模拟单线程回答：每次取下一条问题，回答耗时 service_time 秒，返回 {类别: [等待秒数]}"""
+    waits = {}
+    pending = {}
+    index = 0
+    now = 0.0
+    while now < duration:
+        while index < len(arrivals) and arrivals[index][0] <= now:
+            arrival_time, record_id, user_id, event_type, gift_value, kind = arrivals[index]
+            scheduler.add(record_id, user_id, event_type, gift_value, arrival_time)
+            pending[record_id] = (arrival_time, kind)
+            index += 1
+
+        record_id = scheduler.peek()
+        if record_id is None:
+            now = arrivals[index][0] if index < len(arrivals) else duration
+            continue
+
+        arrival_time, kind = pending.pop(record_id)
+        waits.setdefault(kind, []).append(now - arrival_time)
+        now += service_time
+        scheduler.complete([record_id], now)
+    return waits, pending
+
+def synthetic_arrivals(args):
+    """合成负载：普通观众、刷屏用户、礼物和语音"""
+    arrivals = []
+    for second in range(args.duration):
+        for _ in range(random.randint(0, args.rate * 2)):
+            kind, user_id, gift = "普通", f"观众{random.randint(1, 300)}", 0
+            if random.random() < 0.05:
+                kind, gift = "礼物", random.choice([100, 1000, 5200, 52000])
+            arrivals.append((second + random.random(), user_id, "live_message", gift, kind))
+        for _ in range(args.spam_rate):
+            arrivals.append((second + random.random(), "刷屏用户", "live_message", 0, "刷屏"))
+        if random.random() < 0.02:
+            arrivals.append((second + random.random(), "Niama78", "stt_message", 0, "语音"))
+    arrivals.sort()
+    return [(t, record_id, user_id, event_type, gift, kind)
+            for record_id, (t, user_id, event_type, gift, kind) in enumerate(arrivals, 1)]
+
+def simulate_scheduler(args):
+    """调度器模拟：旧的先进先出 vs 加权公平调度的等待时间分布"""
+    random.seed(args.seed)
+    arrivals = synthetic_arrivals(args)
+    policies = {
+        "先进先出 (旧)": QuestionScheduler(gift_weight=0, fairness_delay=0),
+        "加权公平": QuestionScheduler(),
+    }
+    print(f"{len(arrivals)} 条问题, {args.duration} 秒, 每条回答 {args.service_time} 秒")
+    for name, scheduler in policies.items():
+        waits, pending = simulate_schedule(scheduler, arrivals, args.service_time, args.duration)
+        print(f"\n{name}: 回答 {sum(len(w) for w in waits.values())} 条, 未回答 {len(pending)} 条")
+        for kind in ["语音", "礼物", "普通", "刷屏"]:
+            values = waits.get(kind, [])
+            print(f"  {kind}: 回答 {len(values):4d} 条 | 等待 p50 {quantile(values, 0.5):7.1f}s"
+                  f" p90 {quantile(values, 0.9):7.1f}s p99 {quantile(values, 0.99):7.1f}s")
+
+def git_commit():
+    """当前提交，用于对比不同版本的结果"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)), text=True).strip()
+    except Exception:
+        return None
+
+def db_size(path):
+    """数据库文件大小 (含 WAL)"""
+    return sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix))
+
+def timed(latencies, name, func, *args):
+    """执行并记录耗时 (毫秒)"""
+    start = time.perf_counter()
+    result = func(*args)
+    latencies.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+    return result
+
+def danmaku_stream(args):
+    """按秒生成合成直播消息：普通弹幕、重复、刷屏、礼物和语音爆发"""
+    recent = []
+    for second in range(args.duration):
+        events = []
+        for _ in range(random.randint(0, args.rate * 2)):
+            user_id = f"观众{random.randint(1, args.users)}"
+            if recent and random.random() < args.duplicate_ratio:
+                events.append(random.choice(recent)) # 复读和重复提问
+            elif random.random() < args.gift_ratio:
+                gift = random.choice(["辣条", "小心心", "小电视飞船", "舰长"])
+                events.append((user_id, "live_message", f"送出 {random.randint(1, 10)} 个 {gift}",
+                               random.choice([0, 100, 1000, 52000])))
+            else:
+                events.append((user_id, "live_message", random_text(), 0))
+            recent = (recent + events[-1:])[-50:]
+        for _ in range(args.spam_rate):
+            events.append(("刷屏用户", "live_message", random_text(), 0))
+        if random.random() < args.stt_burst:
+            events.extend(("Niama78", "stt_message", random_text(), 0) for _ in range(random.randint(1, 4)))
+        random.shuffle(events)
+        yield second, events
+
+def bench_pipeline(args):
+    """聊天记忆全流程压测：写入、取题、回答，输出 JSON"""
+    random.seed(args.seed)
+    path = os.path.join(WORK_DIR, "pipeline.db")
+    memory.init_db(path)
+
+    latencies = {}
+    size_samples = []
+    operations = 0
+    start = time.perf_counter()
+
+    for second, events in danmaku_stream(args):
+        if args.batch:
+            timed(latencies, "save_chat_records", memory.save_chat_records, events)
+        else:
+            for user_id, event_type, question, gift_value in events:
+                timed(latencies, "save_chat_record", memory.save_chat_record, user_id, event_type, question, gift_value)
+        operations += len(events)
+
+        if second % args.turn_interval == 0: # 每轮回答一个问题
+            records, id_list = timed(latencies, "get_records", memory.get_records)
+            operations += 1
+            if records:
+                timed(latencies, "update_chat_response", memory.update_chat_response, id_list, random_text())
+                operations += 1
+
+        if second % args.sample_interval == 0:
+            size_samples.append({"second": second, "db_bytes": db_size(path),
+                                 "rows": database.read("SELECT COUNT(*) FROM chat_records")[0][0]})
+
+    elapsed = time.perf_counter() - start
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "config": {key: value for key, value in vars(args).items() if key != "func"},
+        "elapsed_s": elapsed,
+        "throughput_ops_per_s": operations / elapsed,
+        "operations": {
+            name: {
+                "count": len(values),
+                "p50_ms": quantile(values, 0.5),
+                "p99_ms": quantile(values, 0.99),
+                "max_ms": max(values),
+            }
+            for name, values in latencies.items()
+        },
+        "db_size": size_samples,
+    }
+
+    for name, stats in result["operations"].items():
+        print(f"{name:>22}: {stats['count']:7d} 次 | p50 {stats['p50_ms']:8.3f} ms | p99 {stats['p99_ms']:8.3f} ms")
+    print(f"吞吐量 {result['throughput_ops_per_s']:.1f} ops/s, 最终数据库 {size_samples[-1]['db_bytes'] / 1024:.0f} KB")
+
+    if args.output:
+        with open(os.path.join(ORIGINAL_DIR, args.output), "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+def wav_playback(delta, sink):
+    """旧路径：pydub 封装 WAV，再用 wave 解析后按 1024 帧写出"""
+    from pydub import AudioSegment
+    audio = AudioSegment.from_raw(io.BytesIO(delta), sample_width=2, frame_rate=24000, channels=1)
+    wav_io = io.BytesIO()
+    audio.export(wav_io, format="wav")
+    wf = wave.open(io.BytesIO(wav_io.getvalue()), 'rb')
+    data = wf.readframes(1024)
+    while data:
+        sink(data)
+        data = wf.readframes(1024)
+
+def pcm_playback(delta, sink):
+    """新路径：PCM16 直接写出"""
+    sink(bytes(delta))
+
+def bench_pcm(args):
+    """音频增量处理的 CPU 开销 (每秒音频)"""
+    delta_bytes = int(24000 * args.delta_ms / 1000) * 2
+    messages = [json.dumps({"type": "response.audio.delta",
+                            "delta": base64.b64encode(os.urandom(delta_bytes)).decode()})
+                for _ in range(int(args.seconds * 1000 / args.delta_ms))]
+    sink = lambda data: None # 代替 PyAudio stream.write
+
+    paths = {"PCM 直通": pcm_playback}
+    try:
+        import pydub # noqa: F401
+        paths = {"WAV 兼容 (旧)": wav_playback, **paths}
+    except ImportError:
+        print("未安装 pydub，跳过 WAV 路径")
+
+    for name, playback in paths.items():
+        start = time.process_time()
+        for message in messages:
+            playback(base64.b64decode(json.loads(message)["delta"]), sink)
+        cpu_ms = (time.process_time() - start) * 1000 / args.seconds
+        print(f"{name:>10}: {cpu_ms:8.3f} ms CPU / 秒音频 ({len(messages)} 个 {args.delta_ms} ms 增量)")
+
+def legacy_chat_request(roleplay_path, records):
+    """旧实现：每轮读取角色设定并整体序列化请求 (序列化参数与 prompt.py 相同)"""
+    with open(roleplay_path) as f:
+        roleplay = f.read()
+    response_create = {"type": "response.create", "response": {
+        "modalities": ["audio", "text"], "instructions": prompt.CHAT_INSTRUCTIONS, "conversation": None,
+        "input": [{"type": "message", "role": "system", "content": [{"type": "input_text", "text": roleplay}]}]}}
+    for rec in records:
+        response_create["response"]["input"].append(
+            {"type": "message", "role": "user", "content": [{"type": "input_text", "text": f"{rec['user_id']}: {rec['question']}"}]})
+        if rec.get("answered", False):
+            response_create["response"]["input"].append(
+                {"type": "message", "role": "assistant", "content": [{"type": "text", "text": rec["response"]}]})
+    return json.dumps(response_create, ensure_ascii=False)
+
+def bench_prompt(args):
+    """每轮请求组装耗时：旧的每轮读文件 vs 按修改时间缓存角色设定，两者都整体序列化"""
+    prompt.ROLEPLAY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roleplay.txt")
+    records = [{"user_id": "观众1", "question": random_text(), "answered": False}] + [
+        {"user_id": f"观众{i}", "question": random_text(), "response": random_text(), "answered": True}
+        for i in range(memory.RECALL_TOP_K)]
+
+    start = time.perf_counter()
+    for _ in range(args.n):
+        legacy_chat_request(prompt.ROLEPLAY_FILE, records)
+    legacy_us = (time.perf_counter() - start) * 1e6 / args.n
+
+    start = time.perf_counter()
+    for _ in range(args.n):
+        prompt.Turn.from_records(records).chat_request()
+    cached_us = (time.perf_counter() - start) * 1e6 / args.n
+
+    print(f"旧实现: {legacy_us:8.1f} us/轮")
+    print(f"新实现: {cached_us:8.1f} us/轮")
+
+def write_vad_fixture(path, rate=24000):
+    """把合成音频 (fixtures.vad_audio) 写成 WAV，返回语音段 [(开始秒, 结束秒)]"""
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(vad_audio(rate))
+    return VAD_SEGMENTS
+
+def run_vad(path, segments=None):
+    """把 WAV 按麦克风块大小送入检测器，报告发送字节和检测延迟"""
+    with wave.open(path, "rb") as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            print(f"{path}: 只支持单声道 16 位 WAV")
+            return
+        rate = wf.getframerate()
+        detector = VoiceActivityDetector(rate, 1024)
+        messages = 0
+        data = wf.readframes(1024)
+        while data:
+            messages += len(detector.process(data))
+            data = wf.readframes(1024)
+
+    print(f"{os.path.basename(path)}: 输入 {detector.bytes_in} 字节, 发送 {detector.bytes_sent} 字节"
+          f" ({detector.bytes_sent / max(1, detector.bytes_in):.0%}), {messages} 条消息"
+          f" (逐块发送需 {detector.bytes_in // 2048} 条)")
+    starts = [ms for event, ms in detector.events if event == "speech_start"]
+    stops = [ms for event, ms in detector.events if event == "speech_stop"]
+    for i, ms in enumerate(starts):
+        line = f"  语音 {i + 1}: 开始 {ms:7.0f} ms, 结束 {stops[i] if i < len(stops) else float('nan'):7.0f} ms"
+        if segments and i < len(segments):
+            line += f" | 检测延迟 {ms - segments[i][0] * 1000:5.0f} ms"
+        print(line)
+    if segments and len(starts) != len(segments):
+        print(f"  检测到 {len(starts)} 段语音, 实际 {len(segments)} 段")
+
+def bench_vad(args):
+    """本地语音检测：WAV 样本上的发送字节和检测延迟"""
+    if args.wav:
+        for path in args.wav:
+            run_vad(os.path.join(ORIGINAL_DIR, path))
+    else:
+        path = os.path.join(WORK_DIR, "vad_fixture.wav")
+        run_vad(path, write_vad_fixture(path))
+
+def bench_realtime(args):
+    """端到端：chat.py 连接模拟服务器，运行 main.answer_loop 回答问题，报告吞吐量和各阶段延迟"""
+    from mock_realtime import MockRealtimeServer, load_script
+    script = load_script(os.path.join(ORIGINAL_DIR, args.script) if args.script else None)
+    server = MockRealtimeServer(port=0, script=script, token_ms=args.token_ms, audio_ms_per_token=args.audio_ms,
+                                first_delay_ms=args.first_delay_ms).start()
+    os.environ["OPENAI_WS_URL"] = server.url
+    os.environ.setdefault("AUDIO_SINK", "null") # 不需要音频输出设备
+    os.environ.setdefault("AUDIO_SOURCE", "none") # 不读取麦克风
+    prompt.ROLEPLAY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roleplay.txt")
+    memory.init_db(os.path.join(WORK_DIR, "realtime.db"))
+    random.seed(args.seed)
+    memory.save_chat_records([(f"观众{i}", "live_message", random_text()) for i in range(args.turns)])
+
+    import chat # 与 main.py 相同 (不需要音频设备)
+    import main # 只导入主循环，不启动 Flask 和字幕窗口
+    from common import state
+    from tracing import tracer
+
+    deadline = time.perf_counter() + args.timeout
+    while not chat.supervisor.connected: # 等待连接建立
+        if time.perf_counter() > deadline:
+            print("连接模拟服务器超时")
+            return
+        time.sleep(0.01)
+
+    main.WAIT_TIMEOUT = 0.05 # 缩短最后一轮结束后的等待，减小计时误差
+    start = time.perf_counter()
+    main.answer_loop(lambda: time.perf_counter() < deadline and
+                     (len(memory.question_scheduler) or not main.idle(state.snapshot()[1]))) # 全部回答完且空闲时结束
+    elapsed = time.perf_counter() - start
+
+    print(f"{tracer.turns} 轮, 用时 {elapsed:.2f} s, 吞吐量 {tracer.turns / elapsed:.2f} 轮/s")
+    for stage, data in tracer.summary().items():
+        if data["count"]:
+            q = data["quantiles"]
+            print(f"{stage:>22}: p50 {q[0.5]:8.1f} ms | p95 {q[0.95]:8.1f} ms | p99 {q[0.99]:8.1f} ms")
+
+class PollingFlags:
+    """旧实现：模块全局变量，消费者每 10 ms 轮询一次"""
+    def __init__(self):
+        self.values = {"processing": True, "playing": False, "stt": False, "mic": False, "stop": False}
+
+    def set(self, key, value):
+        self.values[key] = value
+
+    def wait_for(self, predicate, interval=0.01):
+        while not predicate(self.values):
+            time.sleep(interval)
+
+def idle_loops(bus):
+    """模拟空闲时的各个等待线程 (主循环、播放器、备份写入、麦克风、SSE)，返回停止函数"""
+    import queue
+    import threading
+    stop = threading.Event()
+    queues = [queue.Queue(), queue.Queue()] # 播放队列和备份队列
+
+    if isinstance(bus, PollingFlags):
+        def waiter(predicate, interval=0.01):
+            return lambda: bus.wait_for(lambda s: stop.is_set() or predicate(s), interval)
+        def queue_loop(q):
+            while not stop.is_set():
+                try:
+                    q.get(timeout=0.01)
+                except queue.Empty:
+                    continue
+    else:
+        def waiter(predicate, interval=None):
+            return lambda: bus.wait_for(lambda s: s["stop"] or predicate(s))
+        def queue_loop(q):
+            while q.get() is not None:
+                pass
+
+    targets = [waiter(lambda s: not s["processing"]), waiter(lambda s: s["mic"]),
+               waiter(lambda s: False, 0.05)] + [lambda q=q: queue_loop(q) for q in queues]
+    threads = [threading.Thread(target=target, daemon=True) for target in targets]
+    for thread in threads:
+        thread.start()
+
+    def shutdown():
+        stop.set()
+        bus.set("stop", True)
+        for q in queues:
+            q.put(None)
+        for thread in threads:
+            thread.join()
+    return shutdown
+
+def bench_state(args):
+    """共享状态：空闲 CPU 占用和状态切换的唤醒延迟，旧的轮询 vs 条件变量"""
+    import threading
+    from state import StateBus
+
+    def polling():
+        return PollingFlags()
+    def bus():
+        return StateBus(processing=True, playing=False, stt=False, mic=False, stop=False)
+
+    for name, make in (("轮询", polling), ("状态总线", bus)):
+        shutdown = idle_loops(make())
+        time.sleep(0.2)
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        time.sleep(args.seconds)
+        cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+        shutdown()
+
+        delays = []
+        for _ in range(args.n):
+            flags = make()
+            woke = []
+            waiter = threading.Thread(target=lambda: (flags.wait_for(lambda s: not s["processing"]), woke.append(time.perf_counter())))
+            waiter.start()
+            time.sleep(random.uniform(0.005, 0.02))
+            flipped = time.perf_counter()
+            flags.set("processing", False)
+            waiter.join()
+            delays.append((woke[0] - flipped) * 1000)
+        print(f"{name:>6}: 空闲 CPU {cpu:6.2%} | 唤醒延迟 p50 {quantile(delays, 0.5):7.3f} ms, p99 {quantile(delays, 0.99):7.3f} ms")
+
+def free_port():
+    """返回一个空闲的本地端口"""
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def bench_runtime(args):
+    """WebSocket 客户端的线程数、上下文切换和 CPU：每个连接一个 run_forever 线程 vs 共享事件循环"""
+    import threading
+    import resource
+    import websocket
+    import runtime
+
+    port = free_port()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_realtime.py")
+    server = subprocess.Popen([sys.executable, script, "--port", str(port), "--token-ms", str(args.token_ms),
+                               "--first-delay-ms", "0"], stdout=subprocess.DEVNULL) # 服务器在子进程，不计入本进程
+    url = f"ws://127.0.0.1:{port}/v1/realtime"
+    request = json.dumps({"type": "response.create", "response": {"modalities": ["audio", "text"]}})
+    time.sleep(1)
+
+    try:
+        for name in ("线程", "asyncio"):
+            received = [0]
+            def on_open(ws):
+                ws.send(request)
+            def on_message(ws, message):
+                received[0] += 1
+                if '"response.done"' in message: # 持续请求回复
+                    ws.send(request)
+
+            base_threads = threading.active_count()
+            if name == "线程":
+                clients = [websocket.WebSocketApp(url, on_open=on_open, on_message=on_message) for _ in range(args.clients)]
+                for client in clients:
+                    threading.Thread(target=client.run_forever, daemon=True).start()
+            else:
+                clients = [runtime.AsyncWebSocket(url, on_open=on_open, on_message=on_message).start() for _ in range(args.clients)]
+            time.sleep(0.5)
+
+            received[0] = 0
+            before = resource.getrusage(resource.RUSAGE_SELF)
+            wall_start = time.perf_counter()
+            time.sleep(args.seconds)
+            after = resource.getrusage(resource.RUSAGE_SELF)
+            elapsed = time.perf_counter() - wall_start
+            threads = threading.active_count() - base_threads
+
+            for client in clients:
+                if name == "线程":
+                    client.close()
+                else:
+                    client.task.cancel()
+            switches = (after.ru_nvcsw + after.ru_nivcsw) - (before.ru_nvcsw + before.ru_nivcsw)
+            cpu = (after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime)
+            print(f"{name:>7}: {args.clients} 个连接, 新增线程 {threads:3d} | 消息 {received[0] / elapsed:8.0f} 条/s"
+                  f" | 上下文切换 {switches / elapsed:8.0f} 次/s | CPU {cpu / elapsed:6.1%}")
+            time.sleep(0.5)
+    finally:
+        server.terminate()
+        server.wait()
+
+def run_jitter(gaps, pcm, prebuffer_ms, max_prebuffer_ms, wav_path=None):
+    """按到达间隔 (毫秒) 送入音频增量，播放完后返回播放器统计"""
+    from play import AudioPlayer, NullSink, FileSink
+    sink = FileSink(wav_path, realtime=True) if wav_path else NullSink()
+    player = AudioPlayer(sink=sink, prebuffer_ms=prebuffer_ms, max_prebuffer_ms=max_prebuffer_ms)
+    for gap in gaps:
+        player.add_pcm(pcm)
+        time.sleep(gap / 1000)
+    player.end_stream()
+    while player.is_playing:
+        time.sleep(0.01)
+    stats = player.stats()
+    player.stop()
+    return stats
+
+def bench_jitter(args):
+    """抖动缓冲：不规则到达的音频增量，对比无缓冲 (缓冲目标固定为 0) 和默认缓冲的欠载，多个随机种子"""
+    from play import PREBUFFER_MS, MAX_PREBUFFER_MS
+    delta_ms = args.delta_ms
+    pcm = bytes(int(24000 * delta_ms / 1000) * 2)
+    prebuffer = args.prebuffer_ms if args.prebuffer_ms is not None else PREBUFFER_MS
+    policies = (("无缓冲", 0, 0), ("抖动缓冲", prebuffer, MAX_PREBUFFER_MS)) # 无缓冲时欠载后也不提高目标
+
+    totals = {name: [] for name, _, _ in policies}
+    for seed in range(args.seed, args.seed + args.seeds):
+        rng = random.Random(seed)
+        # 到达间隔：平均略快于实时，偶尔出现网络停顿
+        gaps = [rng.expovariate(1 / (delta_ms * 0.8)) + (rng.uniform(200, args.stall_ms) if rng.random() < args.stall_ratio else 0)
+                for _ in range(int(args.seconds * 1000 / delta_ms))]
+        for name, prebuffer_ms, max_prebuffer_ms in policies:
+            wav_path = os.path.join(ORIGINAL_DIR, f"{args.wav_prefix}_{seed}_{prebuffer_ms}ms.wav") if args.wav_prefix else None
+            stats = run_jitter(gaps, pcm, prebuffer_ms, max_prebuffer_ms, wav_path)
+            totals[name].append(stats)
+            print(f"种子 {seed} {name:>6}: 欠载 {stats['underruns']:4d} 次 | 补静音 {stats['silence_ms']:7.0f} ms"
+                  f" | 播放 {stats['played_ms'] / 1000:6.1f} s | 最终缓冲目标 {stats['target_ms']:4.0f} ms")
+
+    print(f"\n{args.seeds} 个种子合计:")
+    for name, results in totals.items():
+        underruns = [stats["underruns"] for stats in results]
+        silence = [stats["silence_ms"] for stats in results]
+        print(f"{name:>6}: 欠载 {sum(underruns):5d} 次 (每个种子 {min(underruns)}-{max(underruns)})"
+              f" | 补静音 {sum(silence):8.0f} ms (每个种子 {min(silence):.0f}-{max(silence):.0f})")
+
+def legacy_backup_reader(path, idle_s):
+    """旧实现：word.py 每 10 ms 读取 backup.txt 并清空，返回 [(收到时间, 内容)]"""
+    chunks = []
+    open(path, 'a', encoding='utf-8').close()
+    last = time.time()
+    with open(path, 'r+', encoding='utf-8') as f:
+        while time.time() - last < idle_s or not chunks:
+            content = f.read().strip()
+            if content:
+                chunks.append((time.time(), content))
+                last = time.time()
+                f.seek(0)
+                f.truncate() # 清空内容
+            time.sleep(0.01)
+    return chunks
+
+def subtitle_reader(args):
+    """字幕通道基准测试的接收端 (子进程)，结果以 JSON 输出到最后一行"""
+    if args.file:
+        chunks = legacy_backup_reader(args.file, 1.0)
+    else:
+        import subtitle
+        chunks = []
+        for message in subtitle.receive(subtitle.connect(args.address)):
+            if message["type"] == "delta":
+                chunks.append((message["received"], message["text"]))
+            elif message["type"] == "end":
+                break
+    print(json.dumps(chunks, ensure_ascii=False))
+
+def bench_subtitle(args):
+    """回复文本送到字幕窗口进程的延迟和完整性：backup.txt 轮询 vs 本地通道"""
+    import threading
+    import queue
+    from subtitle import SubtitleChannel
+    rng = random.Random(args.seed)
+    deltas = ["".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(1, 4))) for _ in range(args.n)]
+    sent_text = "".join(deltas)
+
+    for name in ("backup.txt", "通道"):
+        if name == "backup.txt":
+            path = os.path.join(WORK_DIR, "backup.txt")
+            reader = subprocess.Popen([sys.executable, os.path.abspath(__file__), "subtitle-reader", "--file", path],
+                                      stdout=subprocess.PIPE, text=True, encoding="utf-8")
+            write_queue = queue.Queue()
+            def file_writer(): # 旧的 common.file_writer：每个增量写入并 flush
+                with open(path, "a", encoding="utf-8") as f:
+                    while True:
+                        f.write(write_queue.get())
+                        f.flush()
+            threading.Thread(target=file_writer, daemon=True).start()
+            send, end = write_queue.put, lambda: None
+        else:
+            channel = SubtitleChannel()
+            reader = subprocess.Popen([sys.executable, os.path.abspath(__file__), "subtitle-reader", "--address", channel.address],
+                                      stdout=subprocess.PIPE, text=True, encoding="utf-8")
+            send, end = channel.delta, channel.end
+        time.sleep(1.5) # 等待子进程启动
+
+        sent = [] # (累计字数, 发送时间)
+        total = 0
+        for delta in deltas:
+            total += len(delta)
+            sent.append((total, time.time()))
+            send(delta)
+            time.sleep(rng.expovariate(1000 / args.interval_ms))
+        end()
+        chunks = json.loads(reader.communicate()[0].strip().splitlines()[-1])
+
+        # 按累计字数把收到的内容对应回增量；有丢失时后面的对应会偏移，只作参考
+        latencies, received, index = [], 0, 0
+        for received_at, content in chunks:
+            received += len(content)
+            while index < len(sent) and sent[index][0] <= received:
+                latencies.append((received_at - sent[index][1]) * 1000)
+                index += 1
+        received_text = "".join(content for _, content in chunks)
+        print(f"{name:>10}: 增量 {len(deltas)} 个 | 延迟 p50 {quantile(latencies, 0.5):6.2f} ms p95 {quantile(latencies, 0.95):6.2f} ms"
+              f" p99 {quantile(latencies, 0.99):6.2f} ms | 收到 {len(received_text)}/{len(sent_text)} 字"
+              f" | {'完整' if received_text == sent_text else '内容不一致'}")
+
+def render_schedule(args, replies):
+    """按脚本生成字幕事件 [(时间, 类型, 文本)]：每轮回复拆成 1-4 字的增量，打字显示完后停顿再开始下一轮"""
+    rng = random.Random(args.seed)
+    events, t, index = [], 0.0, 0
+    while t < args.seconds:
+        reply = replies[index % len(replies)]
+        index += 1
+        events.append((t, "begin", ""))
+        position, sent_at = 0, t
+        while position < len(reply):
+            size = rng.randint(1, 4)
+            events.append((sent_at, "delta", reply[position:position + size]))
+            position += size
+            sent_at += args.delta_ms / 1000
+        events.append((sent_at, "end", ""))
+        t = max(sent_at, t + len(reply) * args.typing_speed) + args.pause
+    return events
+
+def bench_render(args):
+    """word.py 无窗口渲染：按脚本驱动打字效果，虚拟时钟每帧推进 1/30 秒，统计每帧耗时"""
+    os.environ["WORD_HEADLESS"] = "1" # 必须在导入 word 之前设置
+    import word
+    import pygame
+    import OpenGL.GL as gl
+    if args.script:
+        with open(os.path.join(ORIGINAL_DIR, args.script), encoding="utf-8") as f:
+            replies = [line.strip() for line in f if line.strip()]
+    else:
+        rng = random.Random(args.seed)
+        replies = ["，".join(random_text() for _ in range(rng.randint(2, 12))) + "。" for _ in range(20)]
+    events = render_schedule(args, replies)
+    png_dir = os.path.join(ORIGINAL_DIR, args.png_dir) if args.png_dir else None
+    if png_dir:
+        os.makedirs(png_dir, exist_ok=True)
+
+    display = word.ChatDisplay(font_path=os.path.join(ORIGINAL_DIR, args.font), typing_speed=args.typing_speed, start=False)
+    display.init_window()
+    t0 = time.time()
+    frame_ms, redraw_ms, saved = [], [], 0
+    cpu_start = time.process_time()
+    for frame in range(int(args.seconds / word.FRAME_INTERVAL)):
+        now = t0 + frame * word.FRAME_INTERVAL
+        while events and events[0][0] <= now - t0:
+            at, kind, text = events.pop(0)
+            if kind == "begin":
+                display.begin_turn()
+            elif kind == "delta":
+                display.update_text(text, t0 + at)
+            else:
+                display.end_turn()
+        pygame.event.pump()
+
+        started = time.perf_counter()
+        drawn = display.step(now)
+        if drawn:
+            gl.glFinish() # 计入 GPU 完成绘制的时间
+            pygame.display.flip()
+        elapsed = (time.perf_counter() - started) * 1000
+        frame_ms.append(elapsed)
+        if drawn:
+            redraw_ms.append(elapsed)
+            if png_dir and saved < args.png_limit:
+                pixels = display.read_pixels()
+                image = pygame.image.frombuffer(pixels.tobytes(), (display.width, display.height), "RGB")
+                pygame.image.save(image, os.path.join(png_dir, f"frame_{frame:05d}.png"))
+                saved += 1
+    cpu = time.process_time() - cpu_start
+
+    stats = display.stats()
+    print(f"帧数 {len(frame_ms)} ({args.seconds:.0f} s) | 重绘 {stats['redraws']} 次, 其中缓存行重绘 {stats['static_redraws']} 次"
+          f" | CPU 合计 {cpu:.2f} s")
+    for name, values in (("全部帧", frame_ms), ("重绘帧", redraw_ms)):
+        print(f"{name:>6}: p50 {quantile(values, 0.5):6.2f} ms p95 {quantile(values, 0.95):6.2f} ms"
+              f" p99 {quantile(values, 0.99):6.2f} ms 最大 {max(values, default=0.0):6.2f} ms")
+    print(f"字形图集: 命中 {stats['atlas_hits']} | 未命中 {stats['atlas_misses']} | 淘汰 {stats['atlas_evictions']}"
+          f" | 显示延迟 p50 {stats['screen_latency_p50_ms']:.0f} ms p95 {stats['screen_latency_p95_ms']:.0f} ms")
+    if png_dir:
+        print(f"已保存 {saved} 帧到 {png_dir}")
+    pygame.quit()
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天记忆基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    db_parser = sub.add_parser("db", help="连接层吞吐量")
+    db_parser.add_argument("-n", type=int, default=2000, help="每项操作次数")
+    db_parser.set_defaults(func=bench_db)
+
+    ids_parser = sub.add_parser("ids", help="校验 ID 分配与旧算法一致")
+    ids_parser.add_argument("-n", type=int, default=3000, help="随机操作步数")
+    ids_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    ids_parser.set_defaults(func=check_ids)
+
+    recall_parser = sub.add_parser("recall", help="长期记忆检索耗时")
+    recall_parser.add_argument("-n", type=int, default=50000, help="已回答记录数")
+    recall_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    recall_parser.set_defaults(func=bench_recall)
+
+    cdist_parser = sub.add_parser("cdist", help="批量分组耗时")
+    cdist_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="记录数")
+    cdist_parser.add_argument("--block-size", type=int, default=1024, help="每次计算的矩阵行数")
+    cdist_parser.add_argument("--pair-limit", type=int, default=10000, help="超过该记录数时跳过逐对路径")
+    cdist_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    cdist_parser.set_defaults(func=bench_cdist)
+
+    scheduler_parser = sub.add_parser("scheduler", help="调度器等待时间模拟")
+    scheduler_parser.add_argument("--duration", type=int, default=1800, help="模拟秒数")
+    scheduler_parser.add_argument("--rate", type=int, default=1, help="普通观众平均每秒消息数")
+    scheduler_parser.add_argument("--spam-rate", type=int, default=2, help="刷屏用户每秒消息数")
+    scheduler_parser.add_argument("--service-time", type=float, default=6.0, help="每条回答耗时 (秒)")
+    scheduler_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    scheduler_parser.set_defaults(func=simulate_scheduler)
+
+    pipeline_parser = sub.add_parser("pipeline", help="聊天记忆全流程合成负载压测")
+    pipeline_parser.add_argument("--duration", type=int, default=600, help="模拟直播秒数")
+    pipeline_parser.add_argument("--rate", type=int, default=10, help="平均每秒弹幕数")
+    pipeline_parser.add_argument("--users", type=int, default=500, help="观众人数")
+    pipeline_parser.add_argument("--duplicate-ratio", type=float, default=0.2, help="重复消息比例")
+    pipeline_parser.add_argument("--gift-ratio", type=float, default=0.05, help="礼物消息比例")
+    pipeline_parser.add_argument("--spam-rate", type=int, default=2, help="刷屏用户每秒消息数")
+    pipeline_parser.add_argument("--stt-burst", type=float, default=0.02, help="每秒出现语音爆发的概率")
+    pipeline_parser.add_argument("--turn-interval", type=int, default=6, help="每隔多少秒回答一个问题")
+    pipeline_parser.add_argument("--sample-interval", type=int, default=30, help="数据库大小采样间隔 (秒)")
+    pipeline_parser.add_argument("--batch", action="store_true", help="按秒批量写入 (ingest 路径)")
+    pipeline_parser.add_argument("--output", help="JSON 结果文件")
+    pipeline_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    pcm_parser = sub.add_parser("pcm", help="音频增量播放路径的 CPU 开销")
+    pcm_parser.add_argument("--seconds", type=int, default=60, help="音频总时长 (秒)")
+    pcm_parser.add_argument("--delta-ms", type=int, default=100, help="每个增量的时长 (毫秒)")
+    pcm_parser.set_defaults(func=bench_pcm)
+
+    prompt_parser = sub.add_parser("prompt", help="每轮请求组装耗时")
+    prompt_parser.add_argument("-n", type=int, default=5000, help="组装次数")
+    prompt_parser.set_defaults(func=bench_prompt)
+
+    vad_parser = sub.add_parser("vad", help="本地语音检测的发送字节和延迟")
+    vad_parser.add_argument("wav", nargs="*", help="单声道 16 位 WAV 文件，不指定时使用合成样本")
+    vad_parser.set_defaults(func=bench_vad)
+
+    realtime_parser = sub.add_parser("realtime", help="对接模拟 Realtime 服务器的端到端轮次测试")
+    realtime_parser.add_argument("--turns", type=int, default=20, help="问题数")
+    realtime_parser.add_argument("--script", help="会话脚本 (JSON)，格式见 mock_realtime.py")
+    realtime_parser.add_argument("--token-ms", type=float, default=30, help="文本增量间隔 (毫秒)")
+    realtime_parser.add_argument("--audio-ms", type=float, default=150, help="每个增量的音频时长 (毫秒)")
+    realtime_parser.add_argument("--first-delay-ms", type=float, default=300, help="首个增量延迟 (毫秒)")
+    realtime_parser.add_argument("--timeout", type=float, default=300, help="最长运行秒数")
+    realtime_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    realtime_parser.set_defaults(func=bench_realtime)
+
+    state_parser = sub.add_parser("state", help="共享状态的空闲 CPU 和唤醒延迟")
+    state_parser.add_argument("--seconds", type=float, default=5, help="空闲采样秒数")
+    state_parser.add_argument("-n", type=int, default=200, help="唤醒次数")
+    state_parser.set_defaults(func=bench_state)
+
+    runtime_parser = sub.add_parser("runtime", help="线程客户端与 asyncio 运行时的线程数和上下文切换")
+    runtime_parser.add_argument("--clients", type=int, default=3, help="WebSocket 连接数")
+    runtime_parser.add_argument("--seconds", type=float, default=5, help="采样秒数")
+    runtime_parser.add_argument("--token-ms", type=float, default=5, help="模拟服务器文本增量间隔 (毫秒)")
+    runtime_parser.set_defaults(func=bench_runtime)
+
+    jitter_parser = sub.add_parser("jitter", help="播放器抖动缓冲的欠载统计")
+    jitter_parser.add_argument("--seconds", type=float, default=10, help="每个种子的音频总时长 (秒)")
+    jitter_parser.add_argument("--delta-ms", type=float, default=50, help="每个增量的音频时长 (毫秒)")
+    jitter_parser.add_argument("--stall-ratio", type=float, default=0.03, help="出现网络停顿的概率")
+    jitter_parser.add_argument("--stall-ms", type=float, default=400, help="网络停顿的最长时长 (毫秒)")
+    jitter_parser.add_argument("--prebuffer-ms", type=float, help="缓冲目标，默认 play.PREBUFFER_MS")
+    jitter_parser.add_argument("--wav-prefix", help="把输出写入 <前缀>_<种子>_<缓冲>ms.wav")
+    jitter_parser.add_argument("--seed", type=int, default=0, help="第一个随机种子")
+    jitter_parser.add_argument("--seeds", type=int, default=5, help="随机种子个数")
+    jitter_parser.set_defaults(func=bench_jitter)
+
+    subtitle_parser = sub.add_parser("subtitle", help="回复文本到字幕窗口进程的延迟和完整性")
+    subtitle_parser.add_argument("-n", type=int, default=500, help="增量数")
+    subtitle_parser.add_argument("--interval-ms", type=float, default=20, help="平均增量间隔 (毫秒)")
+    subtitle_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    subtitle_parser.set_defaults(func=bench_subtitle)
+
+    render_parser = sub.add_parser("render", help="字幕窗口无窗口渲染的每帧耗时")
+    render_parser.add_argument("--font", default="ShanHaiNiuNaiBoBoW-2.ttf", help="字体文件")
+    render_parser.add_argument("--script", help="回复脚本 (文本文件，每行一轮回复)，不指定时使用合成文本")
+    render_parser.add_argument("--seconds", type=float, default=60, help="模拟秒数")
+    render_parser.add_argument("--delta-ms", type=float, default=30, help="文本增量间隔 (毫秒)")
+    render_parser.add_argument("--typing-speed", type=float, default=0.12, help="每个字的显示间隔 (秒)")
+    render_parser.add_argument("--pause", type=float, default=2, help="每轮显示完后的停顿 (秒)")
+    render_parser.add_argument("--png-dir", help="把重绘的帧保存为 PNG")
+    render_parser.add_argument("--png-limit", type=int, default=200, help="最多保存的帧数")
+    render_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    render_parser.set_defaults(func=bench_render)
+
+    reader_parser = sub.add_parser("subtitle-reader") # bench_subtitle 的子进程
+    reader_parser.add_argument("--file")
+    reader_parser.add_argument("--address")
+    reader_parser.set_defaults(func=subtitle_reader)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    finally:
+        database.close_db() # 先关闭连接，Windows 上才能删除数据库文件
+        os.chdir(ORIGINAL_DIR)
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -3,236 +3,270 @@ from dotenv import load_dotenv
 import json
 import base64
 import threading
-import pyaudio
-from common import processing, player, stt_status, mic_status, chat_ids, question_text, delta_text
-import websocket
+from common import state, processing, player, stt_status, mic_status, chat_ids, question_text, delta_text, end_delta
+from connection import RealtimeSupervisor
 import memory
 from pydub import AudioSegment
 import io
 import time
 from vts import send_host_key
+from prompt import Turn
+from vad import VoiceActivityDetector
+from emotion import classify
+from tracing import tracer
+import runtime
 
 load_dotenv() # 加载 .env 文件
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") # OpenAI API 密钥
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "") # OpenAI API 密钥
 
-# WebSocket 配置
-OPENAI_WS_URL = "wss://api.openai.com/v1/realtime?model=gpt-4o-mini-realtime-preview-2024-12-17"
+# WebSocket 配置，OPENAI_WS_URL 可指向 mock_realtime.py 进行离线测试
+OPENAI_WS_URL = os.getenv("OPENAI_WS_URL", "wss://api.openai.com/v1/realtime?model=gpt-4o-mini-realtime-preview-2024-12-17")
 HEADERS = [
     "Authorization: Bearer " + OPENAI_API_KEY,
     "OpenAI-Beta: realtime=v1"
 ]
-ws_global = None # 全局 WebSocket 连接
   
 CHANNELS = 1  
 RATE = 24000
 CHUNK = 1024 
+PCM_PLAYBACK = True # 音频增量直接以 PCM16 播放，False 时走 WAV 兼容路径
+AUDIO_SOURCE = os.getenv("AUDIO_SOURCE", "pyaudio") # 麦克风输入："pyaudio" 或 "none" (测试和基准测试不读取麦克风)
 
-response_create = {
-    "type": "response.create",
-    "response": {
-        "modalities": [],
-        "instructions": "",
-        "conversation": None,
-        "input": []
+EMOTION_MODE = "local" # 情绪识别方式: "local" 本地词典; "refine" 本地先触发，并行请求远端修正; "remote" 等远端识别完才结束本轮
+
+current_turn = None # 当前对话轮次 (不可变 Turn，更新时整体替换)
+turn_number = 0 # 轮次编号，情绪识别结果按它判断是否已过期
+emotion_turns = {} # 情绪识别请求的 response_id -> 轮次编号
+local_emotion = "无" # 本轮本地识别出的情绪
+pending_request = None # 本轮等待回复的请求 ("chat_create" / "emotion_create")
+turn_audio = False # 本轮是否已收到音频
+
+SESSION_UPDATE = {
+    "type": "session.update",
+    "session": {
+        "voice": "coral",
+        "input_audio_transcription": {
+            "model": "whisper-1",
+            "language": "zh"
+        },
+        "turn_detection": {
+            "type": "server_vad", 
+            "create_response": False,
+            "silence_duration_ms": 100
+        },
+        "tools": [{
+            "type": "function",
+            "name": "analyze_conversation",
+            "description": "分析对话内容，并从中识别出具有代表性的情绪和对应的一句话",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "emotion": {
+                        "type": "string",
+                        "description": "识别出的情绪",
+                        "enum": ["嘟嘴", "星星眼", "爱心眼", "脸红", "脸黑", "无"]
+                    },
+                    "text": {
+                        "type": "string",
+                        "description": "与识别出的情绪对应的一句话"
+                    }
+                },
+                "required": ["emotion", "text"]
+            }
+        }],
     }
-}
+} # 初始化配置
 
 def on_message(ws, message):
     """处理 WebSocket 收到的消息"""
+    global current_turn, local_emotion, turn_audio
     data = json.loads(message)  
     event_type = data.get("type") # 获取消息类型
    
-    if event_type == "input_audio_buffer.speech_started":
+    if event_type == "response.created":
+        response = data.get("response") or {}
+        metadata = response.get("metadata") or {}
+        if "turn" in metadata: # 情绪识别请求
+            emotion_turns[response.get("id")] = int(metadata["turn"])
+
+    elif event_type == "input_audio_buffer.speech_started":
+        tracer.mark("speech_started")
         stt_status(True) 
 
     elif event_type == "input_audio_buffer.speech_stopped":
+        tracer.mark("speech_stopped")
         mic_status(False)
 
     elif event_type == "conversation.item.input_audio_transcription.completed": 
         transcript = data.get("transcript", "")
         if transcript and transcript.strip(): # 确保内容不为空
             memory.save_chat_record("Niama78", "stt_message", transcript) 
+            tracer.mark("transcription_completed")
+        else:
+            tracer.discard_speech()
 
         stt_status(False)
 
     elif event_type == "response.audio.delta":
+        tracer.mark("first_audio_delta")
+        turn_audio = True
         delta = base64.b64decode(data.get("delta", ""))
-        audio = AudioSegment.from_raw(io.BytesIO(delta), sample_width=2, frame_rate=RATE, channels=CHANNELS) # 解析音频数据
+        if PCM_PLAYBACK:
+            player.add_pcm(delta) # 服务器输出即 PCM16 24kHz，无需转换
+        else:
+            audio = AudioSegment.from_raw(io.BytesIO(delta), sample_width=2, frame_rate=RATE, channels=CHANNELS) # 解析音频数据
 
-        wav_io = io.BytesIO()
-        audio.export(wav_io, format="wav") # 保存为 WAV 格式
-        audio_bytes = wav_io.getvalue()
+            wav_io = io.BytesIO()
+            audio.export(wav_io, format="wav") # 保存为 WAV 格式
+            audio_bytes = wav_io.getvalue()
 
-        player.add_audio(audio_bytes) 
+            player.add_audio(audio_bytes) 
         
+    elif event_type == "response.audio.done":
+        player.end_stream() # 不再等待缓冲，播完剩余音频
+
     elif event_type == "response.audio_transcript.delta":
         delta = data.get("delta", "")  
         delta_text(delta) # 更新实时流内容
         
     elif event_type == "response.audio_transcript.done":
+        tracer.mark("transcript_done")
+        end_delta() # 字幕窗口的轮次边界
         transcript = data.get("transcript", "")
-        response_create["response"]["input"].append({
-            "type": "message",
-            "role": "assistant",
-            "content": [{"type": "text", "text": transcript}]
-        }) # 添加回复的内容
+        if current_turn:
+            current_turn = current_turn.with_assistant(transcript) # 添加回复的内容
 
         memory.update_chat_response(chat_ids(), transcript) 
-        chat_ws("emotion_create") # 对话情绪检测
+        if EMOTION_MODE == "remote":
+            chat_ws("emotion_create") # 对话情绪检测
+        else:
+            local_emotion = classify(transcript)
+            send_host_key(local_emotion) # 本地识别，播放期间立即触发动画
+            tracer.mark("emotion_done")
+            if EMOTION_MODE == "refine":
+                chat_ws("emotion_create") # 远端识别作为修正，不阻塞下一轮
+            finish_turn()
 
     elif event_type == "response.function_call_arguments.done": 
+        if emotion_turns.pop(data.get("response_id"), None) != turn_number:
+            return # 下一轮已经开始，结果属于之前的轮次，作废
         arguments = data.get("arguments", "")
         arguments = json.loads(arguments) 
-        send_host_key(arguments["emotion"]) # 触发动画
-        
-        response_create["response"]["input"].clear() # 清空聊天记录
-        processing(False)
-        mic_status(True) 
-        
-def on_open(ws):
-    """WebSocket 打开时触发"""
-    try:
-        session_update = {
-            "type": "session.update",
-            "session": {
-                "voice": "coral",
-                "input_audio_transcription": {
-                    "model": "whisper-1",
-                    "language": "zh"
-                },
-                "turn_detection": {
-                    "type": "server_vad", 
-                    "create_response": False,
-                    "silence_duration_ms": 100
-                },
-                "tools": [{
-                    "type": "function",
-                    "name": "analyze_conversation",
-                    "description": "分析对话内容，并从中识别出具有代表性的情绪和对应的一句话",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "emotion": {
-                                "type": "string",
-                                "description": "识别出的情绪",
-                                "enum": ["嘟嘴", "星星眼", "爱心眼", "脸红", "脸黑", "无"]
-                            },
-                            "text": {
-                                "type": "string",
-                                "description": "与识别出的情绪对应的一句话"
-                            }
-                        },
-                        "required": ["emotion", "text"]
-                    }
-                }],
-            }
-        } # 初始化配置
-        ws_global.send(json.dumps(session_update)) 
-        threading.Thread(target=audio_stream, daemon=True).start()
-    except Exception as e:
-        print(f"OpenAI WebSocket 初始化配置错误: {e}")
+        if EMOTION_MODE == "remote":
+            send_host_key(arguments["emotion"]) # 触发动画
+            tracer.mark("emotion_done")
+            finish_turn()
+        elif arguments["emotion"] != local_emotion:
+            send_host_key(arguments["emotion"]) # 远端结果与本地不同时修正动画
 
-def connect_ws():
-    """建立 WebSocket 连接""" 
-    global ws_global
-    try:
-        ws_global = websocket.WebSocketApp(
-            OPENAI_WS_URL,
-            header=HEADERS,
-            on_open=on_open,
-            on_message=on_message,
-            on_close=on_close,
-            on_error=on_error,
-        )
-        threading.Thread(target=ws_global.run_forever, daemon=True).start()
-    except Exception as e:
-        print(f"OpenAI WebSocket 连接失败: {e}")
-
-def on_close(ws, close_status_code, close_msg):
-    """WebSocket 断开时触发"""
-    print(f"OpenAI WebSocket 关闭信息: {close_status_code}, {close_msg}")
-    connect_ws() # 重新连接
+def finish_turn():
+    """结束本轮对话，允许处理下一条提问"""
+    global current_turn
+    current_turn = None # 清空聊天记录
+    tracer.finish()
+    processing(False)
+    mic_status(True) 
 
-def on_error(ws, error):
-    """WebSocket 错误时触发"""
-    print(f"OpenAI WebSocket 错误: {error}")
+def abort_turn():
+    """放弃本轮，问题保持未回答，之后重新调度"""
+    global current_turn
+    current_turn = None
+    end_delta()
+    tracer.abort()
+    processing(False)
+    mic_status(True)
 
+def on_failover(connected):
+    """活动连接断开后：有新连接且本轮尚未收到音频时重发请求，否则放弃本轮"""
+    stt_status(False) # 断开前的语音转录不会再完成
+    if current_turn is None or not processing():
+        return
+    if connected and not (pending_request == "chat_create" and turn_audio):
+        print("OpenAI WebSocket 已切换连接，重发本轮请求")
+        if not chat_ws(pending_request):
+            abort_turn()
+    else:
+        print("OpenAI WebSocket 连接中断，放弃本轮")
+        abort_turn()
+        
 def send_audio_data(pcm16_audio):
     """发送 Base64 编码的音频数据到 WebSocket 服务器"""
+    if not supervisor.connected: # 重连期间丢弃
+        return
     try:
         base64_audio = base64.b64encode(pcm16_audio).decode()
         data = {
             "type": "input_audio_buffer.append",
             "audio": base64_audio
         }
-        ws_global.send(json.dumps(data))
+        supervisor.send(json.dumps(data))
     except Exception as e:
         print(f"发送音频数据到 OpenAI WebSocket 失败: {e}")
 
 def audio_stream():
     """监听麦克风的音频并发送到 WebSocket"""
+    import pyaudio # 不读取麦克风时不需要
     audio = pyaudio.PyAudio()
     stream = audio.open(format=pyaudio.paInt16, channels=CHANNELS, rate=RATE,
                         input=True, input_device_index=audio.get_default_input_device_info()['index'], frames_per_buffer=CHUNK)
+    detector = VoiceActivityDetector(RATE, CHUNK) # 本地语音检测，只发送语音段
+    gate = lambda s: s["mic"] and not s["playing"] # 麦克风启用且无音频播放
     while True:
-        if mic_status() and not player.is_playing: # 麦克风启用和无音频播放
-            pcm_data = stream.read(CHUNK, exception_on_overflow=False)
-            send_audio_data(pcm_data)
-        time.sleep(0.01)
+        if not gate(state.snapshot()[1]):
+            state.wait_for(gate) # 等待麦克风重新开启
+            stream.read(stream.get_read_available(), exception_on_overflow=False) # 丢弃暂停期间录到的音频
+            detector.reset() # 暂停前的预录和拖尾状态作废
+        pcm_data = stream.read(CHUNK, exception_on_overflow=False)
+        for batch in detector.process(pcm_data):
+            send_audio_data(batch)
 
 def construct_message():
-    """访问数据库并构造聊天信息"""
+    """访问数据库并构造聊天信息，返回是否开始了新一轮"""
+    global current_turn, turn_audio, turn_number
+    started = time.time()
     record, id = memory.get_records()
 
     if record: # 如果有待处理记录
-        with open("roleplay.txt") as f:
-            roleplay = f.read()
-
-        response_create["response"]["input"].append({
-            "type": "message",
-            "role": "system",
-            "content": [{"type": "input_text", "text": roleplay}]
-        }) # 添加角色设定
-
-        for rec in record:
-            response_create["response"]["input"].append({
-                "type": "message",
-                "role": "user",
-                "content": [{"type": "input_text", "text": f"{rec["user_id"]}: {rec["question"]}"}]
-            })
-
-            if rec.get("answered", False):
-                response_create["response"]["input"].append({
-                    "type": "message",
-                    "role": "assistant",
-                    "content": [{"type": "text", "text": rec["response"]}]
-                })
-        
+        tracer.begin(id, started)
+        current_turn = Turn.from_records(record) # 角色设定、相关记忆和当前提问
+        turn_number += 1
+        emotion_turns.clear() # 之前轮次的情绪识别结果不再使用
         chat_ids(id)
-        chat_ws("chat_create") # 根据对话内容生成回复
-        processing(True) 
+        turn_audio = False
+        if chat_ws("chat_create"): # 根据对话内容生成回复
+            processing(True) 
+            return True
+        abort_turn()
+    return False
 
 def chat_ws(event_type):
-    """把构造好的信息发送到 WebSocket"""
+    """把构造好的信息发送到 WebSocket，返回是否发送成功"""
+    global pending_request
     try:
+        turn = current_turn
         if event_type == "chat_create":
-            response_create["response"]["modalities"] = ["audio", "text"]
-            response_create["response"]["instructions"] = "根据上下文推理生成精简回复。"
-            input = response_create["response"]["input"]
-            for i in input:
-                if i["role"] == "user":
-                    question_text(i["content"][0]["text"]) # 更新用户提问
-                    break 
+            question_text(turn.question) # 更新用户提问
+            supervisor.send(turn.chat_request())
+            tracer.mark("response_create_sent")
         else:
-            response_create["response"]["modalities"] = ["text"]
-            response_create["response"]["input"].append({
-                "type": "message",
-                "role": "user",
-                "content": [{"type": "input_text", "text": "根据以上对话内容，进行情绪识别。"}]
-            })
-
-        ws_global.send(json.dumps(response_create))
+            supervisor.send(turn.emotion_request(turn_number)) # 追加情绪识别提示，带外请求不写入对话
+        if EMOTION_MODE == "remote" or event_type == "chat_create": # refine 模式的情绪请求不阻塞本轮
+            pending_request = event_type
+        return True
     except Exception as e:
         print(f"发送信息到 OpenAI WebSocket 失败: {e}")
+        return False
+
+if runtime.ENABLED: # 共享事件循环，单连接，断开时放弃进行中的一轮
+    supervisor = runtime.AsyncWebSocket(OPENAI_WS_URL, header=HEADERS, on_open=lambda ws: ws.send(json.dumps(SESSION_UPDATE)),
+                                        on_message=on_message, on_close=lambda ws, code, msg: on_failover(False),
+                                        blocking_handlers=True, name="OpenAI")
+else:
+    supervisor = RealtimeSupervisor(OPENAI_WS_URL, HEADERS, json.dumps(SESSION_UPDATE), on_message, on_failover)
+supervisor.start() # 先赋值再连接，回调中的 supervisor 已可用
 
-connect_ws()
\ No newline at end of file
+if AUDIO_SOURCE != "none":
+    if runtime.ENABLED:
+        runtime.spawn(runtime.run_blocking(audio_stream)) # 麦克风读取是阻塞的，占用线程池一个线程
+    else:
+        threading.Thread(target=audio_stream, daemon=True).start()
\ No newline at end of file
@@ -1,78 +1,98 @@
-from play import AudioPlayer
+from play import AudioPlayer, make_sink
+from state import StateBus
+from subtitle import SubtitleChannel
+import os
 import threading
 import queue
+import database
 
-player = AudioPlayer() # 播放器
+# 共享状态，变化时唤醒等待的线程
+state = StateBus(
+    processing=False, # 处理事件状态
+    stt=False, # 语音转录状态
+    mic=True, # 麦克风状态
+    playing=False, # 音频播放状态
+    chat_ids=[], # 聊天纪录 ID 列表
+    question="", # 提问内容
+    db_version=database.data_version(), # 数据库版本号
+)
 
-is_processing = False # 处理事件状态
-stt = False # 语音转录状态
-mic = True # 麦克风状态
+AUDIO_SINK = os.getenv("AUDIO_SINK", "pyaudio") # 音频输出："pyaudio"、"null" 或 "file:路径.wav" (测试和基准测试用)
 
-id_list = [] # 聊天纪录 ID 列表
-delta_list= [] # 实时流字串列表 
-question = "" # 提问内容
-write_queue = queue.Queue() # 备份队列
+player = AudioPlayer(on_change=lambda playing: state.set("playing", playing), sink=make_sink(AUDIO_SINK)) # 播放器
+database.add_listener(lambda version: state.set("db_version", version)) # 数据库提交时通知
+subtitles = SubtitleChannel() # 发送回复文本给 word.py 字幕窗口
+
+TRANSCRIPT_LOG = "backup.txt" # 回复文本记录文件 (后台写入)，设为 None 关闭
+
+delta_list = [] # 实时流字串列表
+delta_lock = threading.Lock()
+write_queue = queue.Queue() # 记录文件写入队列
 
 def processing(status: bool = None):
     """返回或修改处理事件状态"""
-    global is_processing
     if isinstance(status, bool):
-        is_processing = status
+        state.set("processing", status)
     else:
-        return is_processing
+        return state.get("processing")
 
 def stt_status(status: bool = None):
     """返回或修改语音转录状态"""
-    global stt
     if isinstance(status, bool):
-        stt = status
+        state.set("stt", status)
     else:
-        return stt
+        return state.get("stt")
 
 def mic_status(status: bool = None):
     """返回或修改麦克风状态"""
-    global mic
     if isinstance(status, bool):
-        mic = status
+        state.set("mic", status)
     else:
-       return mic
+       return state.get("mic")
 
 def chat_ids(data=None):
     """返回或修改聊天记录 ID 列表"""
-    global id_list
     if isinstance(data, list):
-        id_list = data
+        state.set("chat_ids", data)
     else:
-        return id_list
+        return state.get("chat_ids")
 
 def question_text(data=None):
     """返回或修改 question 内容"""
-    global question
     if isinstance(data, str):
-        question = data
+        state.set("question", data)
     else:
-        return question
+        return state.get("question")
 
 def delta_text(data=None):
     """返回或添加 delta 字串列表"""
-    global delta_list
     if isinstance(data, str):
-        delta_list.append(data)
-        write_queue.put(data)
+        with delta_lock:
+            delta_list.append(data)
+        subtitles.delta(data)
+        if TRANSCRIPT_LOG:
+            write_queue.put(data)
+        state.touch() # 唤醒 SSE 推送
     else:
-        delta = ''.join(delta_list)
-        delta_list.clear()
+        with delta_lock:
+            delta = ''.join(delta_list)
+            delta_list.clear()
         return delta
 
+def end_delta():
+    """本轮回复文本结束"""
+    subtitles.end()
+    if TRANSCRIPT_LOG:
+        write_queue.put("\n") # 每轮回复占一行
+
 def file_writer():
-    """写入备份文件"""
-    with open("backup.txt", "a", encoding="utf-8") as f:
+    """写入回复文本记录文件，只做记录，字幕窗口不再读取"""
+    with open(TRANSCRIPT_LOG, "a", encoding="utf-8") as f:
         while True:
-            try:
-                data = write_queue.get(timeout=0.01)
-                f.write(data)
+            data = write_queue.get() # 阻塞等待，无需轮询
+            f.write(data)
+            if write_queue.empty(): # 合并连续的增量再刷新
                 f.flush()
-            except queue.Empty:
-                continue  
 
-threading.Thread(target=file_writer, daemon=True).start()
\ No newline at end of file
+if TRANSCRIPT_LOG:
+    threading.Thread(target=file_writer, daemon=True).start()
@@ -0,0 +1,193 @@
+import collections
+import json
+import random
+import threading
+import time
+import websocket
+
+BACKOFF_BASE = 0.5 # 重连退避的初始上限 (秒)
+BACKOFF_MAX = 30.0 # 重连退避的最大上限 (秒)
+STANDBY = True # 是否保持一条已完成 session.update 的备用连接
+READY_EVENT = "session.updated" # 收到该事件后连接才算可用
+
+class RealtimeSupervisor:
+    """OpenAI Realtime 连接管理：一条活动连接 + 一条热备连接
+
+    新连接发送 session.update，收到 session.updated 后才可用；活动连接断开时立即换上备用连接，
+    然后在后台补充新的备用连接。连接失败按指数退避 (全抖动) 重试。
+    """
+
+    def __init__(self, url, headers, session, on_message, on_failover=None, standby=STANDBY):
+        self.url = url
+        self.headers = headers
+        self.session = session # session.update 的 JSON 文本
+        self.on_message = on_message # 活动连接的消息回调 (ws, message)
+        self.on_failover = on_failover # 活动连接断开后回调 (是否已有新的活动连接)
+        self.standby_enabled = standby
+
+        self.active = None # 活动连接
+        self.standby = None # 备用连接
+        self.pending = set() # 正在建立的连接
+        self.attempt = 0 # 连续失败次数
+        self.timer = None # 等待中的重连定时器
+        self.lost_at = None # 活动连接断开的时间
+        self.opened = 0 # 累计建立的连接数
+        self.running = False
+        self.lock = threading.RLock()
+
+        self.counters = {
+            "connects": 0, # 成功可用的连接
+            "reconnects": 0, # 首次之后发起的连接
+            "failovers": 0, # 断开后立即换上备用连接的次数
+            "drops": 0, # 活动连接断开次数
+            "errors": 0, # 连接错误次数
+        }
+        self.failover_ms = collections.deque(maxlen=100) # 最近的切换耗时 (断开到新活动连接可用)
+
+    @property
+    def connected(self):
+        return self.active is not None
+
+    def start(self):
+        """开始建立连接"""
+        with self.lock:
+            self.running = True
+            self._replenish()
+        return self
+
+    def close(self):
+        """关闭所有连接，不再重连"""
+        with self.lock:
+            self.running = False
+            if self.timer:
+                self.timer.cancel()
+            apps = [app for app in (self.active, self.standby) if app] + list(self.pending)
+            self.active = self.standby = None
+            self.pending.clear()
+        for app in apps:
+            app.close()
+
+    def send(self, text):
+        """通过活动连接发送"""
+        app = self.active
+        if app is None:
+            raise ConnectionError("没有可用的 OpenAI WebSocket 连接")
+        app.send(text)
+
+    def stats(self):
+        """返回计数器和切换耗时"""
+        with self.lock:
+            data = dict(self.counters)
+            failovers = list(self.failover_ms)
+            data["standby_ready"] = int(self.standby is not None)
+        data["last_failover_ms"] = failovers[-1] if failovers else 0.0
+        data["max_failover_ms"] = max(failovers, default=0.0)
+        return data
+
+    # ---- 连接生命周期 ----
+
+    def _open(self):
+        """发起一条新连接"""
+        with self.lock:
+            self.timer = None
+            if not self.running:
+                return
+            if self.opened:
+                self.counters["reconnects"] += 1
+            self.opened += 1
+            app = websocket.WebSocketApp(
+                self.url,
+                header=self.headers,
+                on_open=lambda ws: self._on_open(ws),
+                on_message=lambda ws, message: self._on_message(ws, message),
+                on_close=lambda ws, code, msg: self._on_close(ws, code, msg),
+                on_error=lambda ws, error: self._on_error(ws, error),
+            )
+            self.pending.add(app)
+        threading.Thread(target=app.run_forever, daemon=True).start()
+
+    def _needed(self):
+        """还缺几条连接 (活动 + 备用)"""
+        wanted = (self.active is None) + (self.standby_enabled and self.standby is None)
+        return wanted - len(self.pending)
+
+    def _replenish(self):
+        """缺连接时按退避时间安排重连"""
+        if not self.running or self.timer or self._needed() <= 0:
+            return
+        if self.active is None and self.attempt == 0:
+            delay = 0.0 # 没有活动连接时第一次立即重连
+        else:
+            delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** self.attempt))
+        self.attempt += 1
+        self.timer = threading.Timer(delay, self._open)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _on_open(self, app):
+        try:
+            app.send(self.session)
+        except Exception as e:
+            print(f"OpenAI WebSocket 初始化配置错误: {e}")
+
+    def _on_message(self, app, message):
+        if app is self.active:
+            self.on_message(app, message)
+        elif app in self.pending and READY_EVENT in message and json.loads(message).get("type") == READY_EVENT:
+            self._on_ready(app)
+
+    def _on_ready(self, app):
+        """连接可用：没有活动连接时直接启用，否则作为备用"""
+        failover = None
+        with self.lock:
+            self.pending.discard(app)
+            if not self.running:
+                surplus = True
+            elif self.active is None:
+                self.active = app
+                surplus = False
+                if self.lost_at is not None:
+                    failover = (time.perf_counter() - self.lost_at) * 1000
+                    self.failover_ms.append(failover)
+                    self.lost_at = None
+            elif self.standby_enabled and self.standby is None:
+                self.standby = app
+                surplus = False
+            else:
+                surplus = True
+            if not surplus:
+                self.counters["connects"] += 1
+                self.attempt = 0
+            self._replenish()
+        if surplus:
+            app.close()
+        elif failover is not None and self.on_failover:
+            self.on_failover(True) # 断开期间没有备用连接，重连后恢复
+
+    def _on_close(self, app, close_status_code, close_msg):
+        promoted = lost = False
+        with self.lock:
+            self.pending.discard(app)
+            if app is self.active:
+                print(f"OpenAI WebSocket 关闭信息: {close_status_code}, {close_msg}")
+                self.counters["drops"] += 1
+                self.active = None
+                lost_at = time.perf_counter()
+                if self.standby is not None: # 换上备用连接
+                    self.active, self.standby = self.standby, None
+                    self.counters["failovers"] += 1
+                    self.failover_ms.append((time.perf_counter() - lost_at) * 1000)
+                    promoted = True
+                else:
+                    self.lost_at = lost_at
+                    lost = True
+            elif app is self.standby:
+                self.standby = None
+            self._replenish()
+        if self.on_failover and (promoted or lost):
+            self.on_failover(promoted)
+
+    def _on_error(self, app, error):
+        with self.lock:
+            self.counters["errors"] += 1
+        print(f"OpenAI WebSocket 错误: {error}")
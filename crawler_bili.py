@@ -7,10 +7,12 @@ import time
 import requests
 from dotenv import load_dotenv 
 import os
-import memory
+import ingest
+import runtime
 
 load_dotenv() # 加载 .env 文件
 SESSDATA = os.getenv("SESSDATA") # Bilibili 登入 Cookies
+RECONNECT_DELAY = 1.0 # 线程模式下断开后等待多久再重连 (秒)
 
 ws_global = None # 全局 WebSocket 连接
 room_id = "" # Bilibili 直播间 ID
@@ -98,12 +100,15 @@ def decode_message(message_bytes):
 
     return messages
 
+HEARTBEAT_INTERVAL = 30 # 心跳间隔 (秒)
+HEARTBEAT_PACKET = struct.pack('>IHHII', 16, 16, 1, 2, 1) # 心跳包
+
 def send_heartbeat():
     """定时发送心跳包"""
     while True:
         try:
-            ws_global.send(struct.pack('>IHHII', 16, 16, 1, 2, 1))
-            time.sleep(30)
+            ws_global.send(HEARTBEAT_PACKET)
+            time.sleep(HEARTBEAT_INTERVAL)
         except Exception as e:
             print(f"发送心跳包到 Bilibili WebSocket 失败: {e}")
 
@@ -118,6 +123,7 @@ def on_message(ws, message):
                 user = info[2][1]  
                 text = info[1]     
                 message =  text
+                gift_value = 0
 
             elif cmd == "SEND_GIFT": # 送礼消息
                 data = msg['data']
@@ -125,16 +131,18 @@ def on_message(ws, message):
                 gift = data['giftName']
                 num = data['num']
                 message = f"送出 {num} 个 {gift}"
+                gift_value = data.get('total_coin', 0) if data.get('coin_type') == 'gold' else 0 # 金瓜子计价，银瓜子礼物免费
 
             if cmd in ["DANMU_MSG", "SEND_GIFT"]:
-                memory.save_chat_record(user, 'live_message', message) # 添加消息记录
+                ingest.submit(user, 'live_message', message, gift_value) # 加入写入队列
 
 def on_open(ws):
     """WebSocket 打开触发"""
     data = json.dumps(payload).encode("utf-8")
     packet = struct.pack(">IHHII", 16 + len(data), 16, 1, 7, 1) + data
     ws_global.send(packet)
-    threading.Thread(target=send_heartbeat, daemon=True).start()
+    if not runtime.ENABLED: # asyncio 运行时由客户端定时发送心跳
+        threading.Thread(target=send_heartbeat, daemon=True).start()
     
 def on_error(ws, error):
     """WebSocket 错误触发"""
@@ -143,17 +151,26 @@ def on_error(ws, error):
 def on_close(ws, close_status_code, close_msg):
     """WebSocket 关闭触发"""
     print(f"Bilibili WebSocket 连接关闭: {close_status_code} {close_msg}")
+    time.sleep(RECONNECT_DELAY) # 在结束的连接线程中等待，避免连续重连
     connect_ws() # 重新连接
 
-def connect_ws():
-    """建立 WebSocket 连接"""
-    token, ws_url = get_host()
+def prepare():
+    """获取连接地址并填写验证数据，失败返回 None"""
+    host = get_host()
     uid = get_uid()
 
-    if all([token, uid, ws_url]):
+    if host and uid:
+        token, ws_url = host
         payload['uid'] = uid
         payload['key'] = token
-        
+        return ws_url
+    return None
+
+def connect_ws():
+    """建立 WebSocket 连接"""
+    ws_url = prepare()
+
+    if ws_url:
         global ws_global
         try:
             ws_global = websocket.WebSocketApp(
@@ -167,4 +184,9 @@ def connect_ws():
         except Exception as e:
             print(f"Bilibili WebSocket 连接失败: {e}")
 
-connect_ws()
\ No newline at end of file
+if runtime.ENABLED:
+    ws_global = runtime.AsyncWebSocket(prepare, on_open=on_open, on_message=on_message, on_error=on_error,
+                                       ping=(HEARTBEAT_INTERVAL, HEARTBEAT_PACKET), name="Bilibili") # 每次连接前在线程池获取地址
+    ws_global.start() # 先赋值再连接，回调中的 ws_global 已是当前连接
+else:
+    connect_ws()
\ No newline at end of file
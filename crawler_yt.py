@@ -3,7 +3,7 @@ import time
 import requests
 import threading
 from dotenv import load_dotenv 
-import memory
+import ingest
 
 load_dotenv()  # 加载 .env 文件
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY") # YouTube API 密钥
@@ -65,7 +65,7 @@ def crawl_youtube_messages():
                         display_message = message['snippet']['displayMessage'] # 获取消息
                         author_channel_id = message['snippet']['authorChannelId'] # 频道 ID
                         display_name = get_channel_info(author_channel_id)  # 获取频道名称
-                        memory.save_chat_record(display_name, 'live_message', display_message) # 添加消息记录
+                        ingest.submit(display_name, 'live_message', display_message) # 加入写入队列
    
                     next_page_token = data['nextPageToken'] # 获取下一页令牌
             except Exception as e:
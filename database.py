@@ -0,0 +1,228 @@
+import sqlite3
+import threading
+import queue
+import atexit
+import pathlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+DATABASE = "chat_memory.db" # 数据库文件路径
+READER_POOL_SIZE = 4 # 只读连接池大小
+WRITE_BATCH_SIZE = 64 # 单个事务内最多合并的写任务数
+STATEMENT_CACHE_SIZE = 256 # 每个连接缓存的预编译语句数量
+
+db_path = None # 当前打开的数据库路径
+attachments = {} # 附加数据库：别名 -> 文件路径
+write_queue = None # 写任务队列
+writer_thread = None # 写线程
+reader_pool = None # 只读连接池
+version = 0 # 数据版本号，每次提交后递增
+listeners = [] # 提交后回调 func(version)，在写线程中执行，应尽快返回
+commit_hooks = [] # 当前批次提交成功后执行的回调，只在写线程中使用
+rollback_hooks = [] # 当前批次或任务回滚时倒序执行的撤销回调，只在写线程中使用
+open_lock = threading.Lock()
+
+def _connect(path, readonly=False):
+    """创建连接并设置 PRAGMA"""
+    if readonly:
+        uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL") # 读写互不阻塞
+        conn.execute("PRAGMA synchronous=NORMAL") # WAL 模式下只在检查点 fsync
+    conn.execute("PRAGMA busy_timeout=5000")
+
+    for alias, attach_path in attachments.items():
+        if readonly:
+            conn.execute("ATTACH DATABASE ? AS " + alias, (pathlib.Path(attach_path).resolve().as_uri() + "?mode=ro",))
+        else:
+            conn.execute("ATTACH DATABASE ? AS " + alias, (attach_path,))
+            conn.execute(f"PRAGMA {alias}.journal_mode=WAL")
+    return conn
+
+def _notify():
+    """通知提交监听者"""
+    for listener in listeners:
+        try:
+            listener(version)
+        except Exception as e:
+            print(f"数据库提交回调失败: {e}")
+
+def after_commit(func):
+    """写任务内调用：事务提交成功后在写线程中执行 func()，任务或事务回滚时丢弃
+
+    用于更新内存索引，避免回滚后索引指向不存在的记录。
+    """
+    commit_hooks.append(func)
+
+def on_rollback(func):
+    """写任务内调用：任务或事务回滚时执行 func()，撤销任务中已做的内存修改"""
+    rollback_hooks.append(func)
+
+def _run_hooks(hooks, mark=0, reverse=False):
+    """执行 mark 之后登记的回调并移除，回调出错不影响其他回调"""
+    pending = hooks[mark:]
+    del hooks[mark:]
+    for func in reversed(pending) if reverse else pending:
+        try:
+            func()
+        except Exception as e:
+            print(f"数据库事务回调失败: {e}")
+
+def _committed():
+    """事务已提交：执行提交回调，丢弃撤销回调"""
+    global version
+    version += 1
+    rollback_hooks.clear()
+    _run_hooks(commit_hooks)
+    _notify()
+
+def _rolled_back(marks=(0, 0)):
+    """事务 (或 marks 之后的任务) 已回滚：倒序执行撤销回调，丢弃提交回调"""
+    del commit_hooks[marks[0]:]
+    _run_hooks(rollback_hooks, marks[1], reverse=True)
+
+def _run_maintenance(conn, func, future):
+    """在事务外执行维护任务 (VACUUM 等)"""
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        result = func(conn)
+    except Exception as e:
+        _rolled_back()
+        future.set_exception(e)
+        return
+    _committed()
+    future.set_result(result)
+
+def _writer_loop(conn, tasks):
+    """写线程：合并排队的写任务，一个事务提交"""
+    pending = None # 打断合并的维护任务，下一轮单独执行
+    while True:
+        task = pending or tasks.get()
+        pending = None
+        if task is None:
+            break
+
+        func, future, transactional = task
+        if not transactional:
+            _run_maintenance(conn, func, future)
+            continue
+
+        batch = [task]
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                task = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is None or not task[2]:
+                pending = task # 本批处理完后再处理
+                break
+            batch.append(task)
+
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, future, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                marks = (len(commit_hooks), len(rollback_hooks))
+                conn.execute("SAVEPOINT task")
+                try:
+                    results.append((future, func(conn), None))
+                    conn.execute("RELEASE task")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO task") # 只回滚出错的任务
+                    conn.execute("RELEASE task")
+                    _rolled_back(marks)
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            _rolled_back()
+            for func, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        _committed() # 先更新内存索引再返回结果
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    conn.close()
+
+def submit_write(func, transactional=True):
+    """提交写任务，返回 Future，func(conn) 在写线程的事务中执行
+
+    transactional 为 False 时在事务外单独执行，用于 VACUUM 等维护语句。
+    """
+    future = Future()
+    if threading.current_thread() is writer_thread:
+        raise RuntimeError("写线程内不能再提交写任务")
+    write_queue.put((func, future, transactional))
+    return future
+
+def execute_write(func):
+    """提交写任务并等待结果"""
+    return submit_write(func).result()
+
+@contextmanager
+def reader():
+    """从连接池借出只读连接"""
+    conn = reader_pool.get()
+    try:
+        yield conn
+    finally:
+        reader_pool.put(conn)
+
+def read(sql, params=()):
+    """执行只读查询并返回全部结果"""
+    with reader() as conn:
+        return conn.execute(sql, params).fetchall()
+
+def data_version():
+    """返回数据版本号，用于检测数据库变化"""
+    return version
+
+def add_listener(func):
+    """注册提交后回调 func(version)"""
+    listeners.append(func)
+
+def open_db(path=DATABASE, attach=None):
+    """打开数据库：启动写线程和只读连接池，attach 为 {别名: 文件路径}"""
+    global db_path, write_queue, writer_thread, reader_pool, attachments
+    with open_lock:
+        if db_path is not None:
+            close_db()
+        attachments = dict(attach or {})
+
+        writer_conn = _connect(path) # 先建立写连接，确保文件和 WAL 存在
+        write_queue = queue.Queue()
+        writer_thread = threading.Thread(target=_writer_loop, args=(writer_conn, write_queue), daemon=True)
+        writer_thread.start()
+
+        reader_pool = queue.Queue()
+        for _ in range(READER_POOL_SIZE):
+            reader_pool.put(_connect(path, readonly=True))
+        db_path = path
+
+def close_db():
+    """关闭写线程和只读连接"""
+    global db_path, writer_thread
+    if db_path is None:
+        return
+
+    write_queue.put(None)
+    writer_thread.join()
+    writer_thread = None
+
+    while not reader_pool.empty():
+        reader_pool.get_nowait().close()
+    db_path = None
+
+atexit.register(close_db)
@@ -0,0 +1,25 @@
+import re
+
+# 情绪词典：情绪 (与 vts.hostkeys_list 对应) -> [(关键词, 权重)]
+EMOTION_LEXICON = {
+    "嘟嘴": [("哼", 2), ("才不", 2), ("笨蛋", 2), ("讨厌", 1), ("不理你", 2), ("生气", 1), ("不准", 1), ("凭什么", 1)],
+    "星星眼": [("哇", 2), ("好厉害", 2), ("厉害", 1), ("太棒", 2), ("期待", 2), ("好想", 1), ("好酷", 2), ("惊喜", 2)],
+    "爱心眼": [("喜欢", 2), ("爱", 1), ("蛋糕", 2), ("马卡龙", 2), ("甜", 1), ("最好", 1), ("宝贝", 2), ("好吃", 2)],
+    "脸红": [("害羞", 2), ("脸红", 2), ("才没有", 2), ("不是因为", 2), ("谢谢", 1), ("夸", 1), ("可爱", 1), ("别这样", 2)],
+    "脸黑": [("烦", 2), ("无聊", 2), ("可恶", 2), ("闭嘴", 2), ("无语", 2), ("愚蠢", 2), ("失望", 2), ("滚", 2)],
+}
+MIN_SCORE = 2 # 低于该分数视为无明显情绪
+
+PATTERNS = {
+    emotion: [(re.compile(re.escape(word)), weight) for word, weight in words]
+    for emotion, words in EMOTION_LEXICON.items()
+}
+
+def classify(text):
+    """按词典给回复打分，返回得分最高的情绪，没有明显情绪时返回 无"""
+    scores = {
+        emotion: sum(len(pattern.findall(text or "")) * weight for pattern, weight in patterns)
+        for emotion, patterns in PATTERNS.items()
+    }
+    emotion, score = max(scores.items(), key=lambda item: item[1]) # 同分时按词典顺序
+    return emotion if score >= MIN_SCORE else "无"
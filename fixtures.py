@@ -0,0 +1,25 @@
+import numpy as np
+
+VAD_SEGMENTS = [(1.0, 2.5), (4.0, 6.0), (8.0, 8.8)] # 合成音频中的语音段 (秒)
+
+def legacy_next_id(used_ids):
+    """旧实现：扫描全部 ID (升序) 找第一个空缺，用来校验 memory.IdAllocator"""
+    new_id = 1
+    for uid in used_ids:
+        if uid != new_id:
+            break # 找到空缺 ID
+        new_id += 1
+    return new_id
+
+def vad_audio(rate=24000, seconds=10):
+    """合成 PCM16 音频：底噪 + 嘶声 + VAD_SEGMENTS 中的类语音段"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(rate * seconds)) / rate
+    audio = rng.normal(0, 60, t.size) # 底噪
+    hiss = (t > 3.0) & (t < 3.5)
+    audio[hiss] += np.diff(rng.normal(0, 400, hiss.sum() + 1)) # 高频嘶声，过零率高
+    for start, end in VAD_SEGMENTS:
+        mask = (t >= start) & (t < end)
+        voice = sum(np.sin(2 * np.pi * 160 * k * t[mask]) / k for k in range(1, 6)) # 谐波
+        audio[mask] += 2500 * voice * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t[mask])) # 音节包络
+    return np.clip(audio, -32768, 32767).astype(np.int16).tobytes()
@@ -0,0 +1,66 @@
+import queue
+import threading
+import time
+import memory
+
+QUEUE_SIZE = 5000 # 队列容量
+BATCH_SIZE = 200 # 每批最多条数 (M)
+FLUSH_INTERVAL = 0.05 # 每批最长等待时间，秒 (N ms)
+PUT_TIMEOUT = 0.005 # 队列满时生产者最多等待的时间，超时丢弃
+
+message_queue = queue.Queue(maxsize=QUEUE_SIZE) # 待写入的 (user_id, event_type, question, gift_value)
+stats_lock = threading.Lock()
+counters = {
+    "received": 0, # 收到的消息
+    "dropped": 0, # 队列饱和丢弃的消息
+    "saved": 0, # 写入数据库的消息
+    "duplicates": 0, # 重复过滤掉的消息
+    "failed": 0, # 写入失败的消息
+    "batches": 0, # 提交的批次
+}
+
+def _count(name, value=1):
+    with stats_lock:
+        counters[name] += value
+
+def submit(user_id, event_type, question, gift_value=0):
+    """加入写入队列，队列饱和时短暂等待后丢弃，返回是否入队"""
+    _count("received")
+    try:
+        message_queue.put((user_id, event_type, question, gift_value), timeout=PUT_TIMEOUT)
+        return True
+    except queue.Full:
+        _count("dropped")
+        return False
+
+def stats():
+    """返回计数器和当前队列深度"""
+    with stats_lock:
+        data = dict(counters)
+    data["queue_depth"] = message_queue.qsize()
+    return data
+
+def ingest_loop():
+    """按批次取出消息写入数据库：凑满 BATCH_SIZE 或等待 FLUSH_INTERVAL 后提交"""
+    while True:
+        batch = [message_queue.get()]
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(message_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            saved = memory.save_chat_records(batch)
+            _count("saved", saved)
+            _count("duplicates", len(batch) - saved)
+        except Exception as e:
+            _count("failed", len(batch))
+            print(f"批量写入聊天记录失败: {e}")
+        _count("batches")
+
+threading.Thread(target=ingest_loop, daemon=True).start()
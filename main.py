@@ -1,28 +1,39 @@
-import app
 from chat import construct_message
-from common import processing, player, stt_status
+from common import state, subtitles
 import time
 import subprocess
 import signal
 #import crawler_bili
 #import crawler_yt
 
-word_process = subprocess.Popen(["python", "word.py"]) # 启动子进程
-
-def cleanup():
-    """清理进程"""
-    word_process.terminate()
-    word_process.wait()
-
-# 捕捉退出信号
-signal.signal(signal.SIGINT, lambda s, f: (cleanup()))
-signal.signal(signal.SIGTERM, lambda s, f: (cleanup()))
-time.sleep(2)
-
-while True:
-    if word_process.poll() != None: # 子进程结束
-        break
-    if not processing() and not player.is_playing:
-        if not stt_status(): # 无语音转录事件
-            construct_message()
-    time.sleep(0.01)
\ No newline at end of file
+WAIT_TIMEOUT = 1.0 # 等待状态变化的最长时间，到时检查是否继续运行
+
+def idle(s):
+    """没有处理中的回复、没有播放中的音频、没有语音转录事件"""
+    return not s["processing"] and not s["playing"] and not s["stt"]
+
+def answer_loop(running=lambda: True):
+    """主循环：空闲时回答下一条问题，running() 返回 False 时退出 (最多延迟 WAIT_TIMEOUT 秒)"""
+    while running():
+        if not state.wait_for(idle, WAIT_TIMEOUT):
+            continue
+        version = state.snapshot()[0]
+        if not construct_message(): # 没有待处理记录，等到状态变化 (新记录写入等) 再试
+            state.wait_change(version, WAIT_TIMEOUT)
+
+if __name__ == "__main__":
+    import app # 启动 Flask 服务器
+
+    word_process = subprocess.Popen(["python", "word.py"], env=subtitles.env()) # 启动子进程，通过本地通道接收回复文本
+
+    def cleanup():
+        """清理进程"""
+        word_process.terminate()
+        word_process.wait()
+
+    # 捕捉退出信号
+    signal.signal(signal.SIGINT, lambda s, f: (cleanup()))
+    signal.signal(signal.SIGTERM, lambda s, f: (cleanup()))
+    time.sleep(2)
+
+    answer_loop(lambda: word_process.poll() is None) # 子进程结束时退出
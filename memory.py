@@ -1,12 +1,67 @@
-import sqlite3
-from rapidfuzz import fuzz
+import database
+from similarity import CharIndex
+from recall import RecallIndex
+from scheduler import QuestionScheduler
+from rapidfuzz import fuzz, process
+import numpy as np
 import random
+import heapq
+import threading
+import time
 
-def init_db():
-    """初始化数据库"""
-    conn = sqlite3.connect("chat_memory.db")
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS chat_records (
+class IdAllocator:
+    """分配最小的空缺 ID，空缺 ID 保存在最小堆中"""
+
+    def __init__(self):
+        self.free_heap = [] # 已释放且小于 next_id 的 ID
+        self.free_set = set()
+        self.next_id = 1 # 当前最大 ID + 1
+
+    def reset(self, used_ids):
+        """根据已使用的 ID (升序) 重建空缺堆"""
+        self.free_heap = []
+        expected = 1
+        for uid in used_ids:
+            self.free_heap.extend(range(expected, uid)) # 两个 ID 之间的空缺
+            expected = uid + 1
+        self.next_id = expected
+        self.free_set = set(self.free_heap)
+        heapq.heapify(self.free_heap)
+
+    def allocate(self):
+        """分配 ID，O(log n)"""
+        if self.free_heap:
+            new_id = heapq.heappop(self.free_heap)
+            self.free_set.discard(new_id)
+            return new_id
+        self.next_id += 1
+        return self.next_id - 1
+
+    def release(self, record_id):
+        """释放 ID 以便复用"""
+        if record_id < self.next_id and record_id not in self.free_set:
+            heapq.heappush(self.free_heap, record_id)
+            self.free_set.add(record_id)
+
+pending_index = CharIndex() # 未回答问题的近似重复索引，按用户分组
+cluster_index = CharIndex() # 问题簇代表问题索引，按事件类型分组
+id_allocator = IdAllocator() # 聊天记录 ID 分配器
+recall_index = RecallIndex() # 已回答问答对的长期记忆索引
+question_scheduler = QuestionScheduler() # 下一条回答哪个问题
+
+RECALL_TOP_K = 3 # 每轮注入的记忆条数
+ARCHIVE_AFTER_SECONDS = 7 * 24 * 3600 # 已回答记录超过该时长后移入归档表
+ARCHIVE_DATABASE = None # 归档数据库文件，None 表示与主库同一文件
+COMPACT_INTERVAL = 3600 # 归档和压缩的间隔 (秒)
+VACUUM_FREE_RATIO = 0.25 # 空闲页超过总页数该比例时才 VACUUM
+
+RECORD_COLUMNS = "id, user_id, event_type, question, response, answered"
+ARCHIVE_COLUMNS = "id, user_id, event_type, question, response, 1"
+archive_table = "chat_records_archive" # 归档表名，附加数据库时带 archive. 前缀
+
+def _create_tables(conn):
+    """建表和索引"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS chat_records (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         user_id TEXT,
                         event_type TEXT,
@@ -14,64 +69,285 @@ def init_db():
                         response TEXT,
                         answered BOOLEAN
                     )''')
-    conn.commit()
-    conn.close()
+    conn.execute('''CREATE TABLE IF NOT EXISTS question_clusters (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        event_type TEXT,
+                        representative TEXT
+                    )''')
+
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {archive_table} (
+                        id INTEGER PRIMARY KEY,
+                        user_id TEXT,
+                        event_type TEXT,
+                        question TEXT,
+                        response TEXT,
+                        created_at REAL,
+                        answered_at REAL,
+                        archived_at REAL
+                    )''')
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(chat_records)")]
+    if "cluster_id" not in columns: # 旧数据库迁移
+        conn.execute("ALTER TABLE chat_records ADD COLUMN cluster_id INTEGER")
+    if "created_at" not in columns:
+        conn.execute("ALTER TABLE chat_records ADD COLUMN created_at REAL")
+        conn.execute("ALTER TABLE chat_records ADD COLUMN answered_at REAL")
+        conn.execute("UPDATE chat_records SET created_at = ?", (time.time(),)) # 旧记录从迁移时开始计时
+        conn.execute("UPDATE chat_records SET answered_at = ? WHERE answered = 1", (time.time(),))
+    if "gift_value" not in columns:
+        conn.execute("ALTER TABLE chat_records ADD COLUMN gift_value REAL DEFAULT 0")
+
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_chat_records_answered_type
+                    ON chat_records (answered, event_type)''') # 未回答/已回答按类型查询
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_chat_records_cluster
+                    ON chat_records (cluster_id)''') # 按簇取成员
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_chat_records_answered_at
+                    ON chat_records (answered, answered_at)''') # 按回答时间归档
+
+def _assign_cluster(conn, event_type, question):
+    """为问题分配问题簇，没有相似的簇则以该问题为代表新建"""
+    for cluster_id in cluster_index.candidates(event_type, question):
+        if fuzz.ratio(cluster_index.text(cluster_id), question) >= 50:
+            return cluster_id # 最早的相似簇
+
+    cursor = conn.execute("INSERT INTO question_clusters (event_type, representative) VALUES (?, ?)",
+                          (event_type, question))
+    cluster_index.add(event_type, cursor.lastrowid, question)
+    database.on_rollback(lambda cluster_id=cursor.lastrowid: cluster_index.remove(cluster_id)) # 簇已随事务回滚
+    return cursor.lastrowid
+
+def _release_clusters(conn, cluster_ids):
+    """删除没有未回答成员的问题簇"""
+    for cluster_id in cluster_ids:
+        if not conn.execute("SELECT 1 FROM chat_records WHERE cluster_id = ? AND answered = 0 LIMIT 1",
+                            (cluster_id,)).fetchone():
+            conn.execute("DELETE FROM question_clusters WHERE id = ?", (cluster_id,))
+            entry = cluster_index.items.get(cluster_id) # 代表问题为 None 的簇不在索引中
+            if entry:
+                cluster_index.remove(cluster_id)
+                database.on_rollback(lambda cluster_id=cluster_id, entry=entry: cluster_index.add(entry[0], cluster_id, entry[1]))
+
+def _cluster_unassigned(conn):
+    """为没有问题簇的未回答记录补分配 (旧数据迁移)"""
+    for record_id, event_type, question in conn.execute(
+        "SELECT id, event_type, question FROM chat_records WHERE answered = 0 AND cluster_id IS NULL ORDER BY id"
+    ).fetchall():
+        conn.execute("UPDATE chat_records SET cluster_id = ? WHERE id = ?",
+                     (_assign_cluster(conn, event_type, question), record_id))
+
+def _rebuild_pending_index():
+    """从数据库重建未回答问题索引"""
+    pending_index.clear()
+    for record_id, user_id, question in database.read(
+        "SELECT id, user_id, question FROM chat_records WHERE answered = 0 ORDER BY id"
+    ):
+        pending_index.add(user_id, record_id, question)
+
+def group_questions(questions, block_size=1024):
+    """批量分组：按行块用 cdist 计算相似度矩阵，分组结果与逐条插入时的分配一致
+
+    按顺序处理，尚未分组的问题成为新簇代表，并带走其后所有相似且未分组的问题。
+    返回每个簇的成员下标列表，第一个为代表。
+    """
+    count = len(questions)
+    assigned = np.zeros(count, dtype=bool)
+    valid = [i for i, q in enumerate(questions) if q is not None] # fuzz.ratio 对 None 恒为 0
+    choices = [questions[i] for i in valid]
+    groups = []
+
+    for i in range(count):
+        if questions[i] is None:
+            assigned[i] = True
+            groups.append([i])
+
+    for start in range(0, len(valid), block_size):
+        block = valid[start:start + block_size]
+        scores = process.cdist([questions[i] for i in block], choices, scorer=fuzz.ratio,
+                               score_cutoff=50, dtype=np.uint8, workers=-1) # 低于阈值记为 0
+        for row, i in enumerate(block):
+            if assigned[i]:
+                continue
+            members = [valid[col] for col in np.flatnonzero(scores[row]) if valid[col] >= i and not assigned[valid[col]]]
+            assigned[members] = True
+            groups.append(members)
+
+    groups.sort(key=lambda members: members[0])
+    return groups
+
+def _apply_clusters(conn, clusters):
+    """用批量分组结果替换全部未回答问题簇"""
+    conn.execute("UPDATE chat_records SET cluster_id = NULL WHERE answered = 0")
+    conn.execute("DELETE FROM question_clusters")
+    snapshot = dict(cluster_index.items)
+    database.on_rollback(lambda: _restore_cluster_index(snapshot)) # 回滚时恢复原来的簇
+    cluster_index.clear()
+
+    cluster_ids = []
+    for event_type, representative, member_ids in clusters:
+        cursor = conn.execute("INSERT INTO question_clusters (event_type, representative) VALUES (?, ?)",
+                              (event_type, representative))
+        cluster_index.add(event_type, cursor.lastrowid, representative)
+        cluster_ids.append(cursor.lastrowid)
+        conn.executemany("UPDATE chat_records SET cluster_id = ? WHERE id = ? AND answered = 0",
+                         [(cursor.lastrowid, record_id) for record_id in member_ids])
+
+    _release_clusters(conn, cluster_ids) # 快照之后成员已全部回答的簇
+    _cluster_unassigned(conn) # 快照之后新插入的问题
+
+def _restore_cluster_index(items):
+    """用快照 {簇 ID: (事件类型, 代表问题)} 恢复问题簇索引"""
+    cluster_index.clear()
+    for cluster_id, (event_type, representative) in sorted(items.items()):
+        cluster_index.add(event_type, cluster_id, representative)
+
+def rebuild_clusters(block_size=1024):
+    """维护任务：用批量相似度矩阵重建全部未回答问题的分组，返回簇数量
+
+    必须在持有问题簇索引的进程内执行：应用运行时通过 POST /maintenance/rebuild 调用，
+    从另一个进程重建会让应用的索引指向已删除的簇 ID。
+    """
+    rows = database.read("SELECT id, event_type, question FROM chat_records WHERE answered = 0 ORDER BY id")
+    by_type = {}
+    for record_id, event_type, question in rows:
+        by_type.setdefault(event_type, []).append((record_id, question))
+
+    clusters = []
+    for event_type, records in by_type.items():
+        questions = [question for _, question in records]
+        for members in group_questions(questions, block_size): # 在写线程之外计算，不阻塞写入
+            clusters.append((event_type, questions[members[0]], [records[i][0] for i in members]))
+    clusters.sort(key=lambda cluster: cluster[2][0]) # 簇 ID 顺序与代表问题的先后一致
+
+    database.execute_write(lambda conn: _apply_clusters(conn, clusters))
+    return len(clusters)
+
+def _rebuild_cluster_index():
+    """从数据库重建问题簇索引"""
+    cluster_index.clear()
+    for cluster_id, event_type, representative in database.read(
+        "SELECT id, event_type, representative FROM question_clusters ORDER BY id"
+    ):
+        cluster_index.add(event_type, cluster_id, representative)
 
-def save_chat_record(user_id, event_type, question):
+def _rebuild_recall_index():
+    """从数据库重建长期记忆索引"""
+    recall_index.clear()
+    for record_id, event_type, question, response in database.read(
+        f'''SELECT id, event_type, question, response FROM chat_records WHERE answered = 1
+            UNION ALL SELECT id, event_type, question, response FROM {archive_table}'''
+    ):
+        recall_index.add(record_id, event_type, question, response)
+
+def _rebuild_scheduler():
+    """从数据库重建问题调度器"""
+    question_scheduler.clear()
+    for record_id, user_id, event_type, gift_value, created_at in database.read(
+        "SELECT id, user_id, event_type, gift_value, created_at FROM chat_records WHERE answered = 0 ORDER BY id"
+    ):
+        question_scheduler.add(record_id, user_id, event_type, gift_value, created_at)
+
+def init_db(path=database.DATABASE, archive_path=ARCHIVE_DATABASE):
+    """初始化数据库"""
+    global archive_table
+    if archive_path:
+        database.open_db(path, attach={"archive": archive_path})
+        archive_table = "archive.chat_records_archive"
+    else:
+        database.open_db(path)
+        archive_table = "chat_records_archive"
+
+    database.execute_write(_create_tables)
+    _rebuild_pending_index()
+    _rebuild_cluster_index()
+    _rebuild_recall_index()
+    _rebuild_scheduler()
+    id_allocator.reset(row[0] for row in database.read(
+        f"SELECT id FROM chat_records UNION SELECT id FROM {archive_table} ORDER BY id")) # 归档 ID 不复用
+    database.execute_write(_cluster_unassigned)
+
+def _remove_pending(record_id):
+    """在写线程内从未回答问题索引移除，事务回滚时恢复"""
+    entry = pending_index.items.get(record_id)
+    if entry:
+        pending_index.remove(record_id)
+        database.on_rollback(lambda: pending_index.add(entry[0], record_id, entry[1]))
+
+def _save_chat_records(conn, records):
+    """在写线程内批量保存用户问题，重复过滤后用 executemany 一次插入，返回保存条数
+
+    ID 和未回答问题索引在事务中立即更新 (同一批次内去重需要)，回滚时撤销；调度器在提交后才更新。
+    """
+    rows = []
+    for user_id, event_type, question, *extra in records:
+        if event_type != "stt_message": # stt 直接保存
+            if any(fuzz.ratio(question, pending_index.text(record_id)) >= 50
+                   for record_id in pending_index.candidates(user_id, question)):
+                continue # 相同用户重复问题 (包括同一批次中较早的问题)
+
+        new_id = id_allocator.allocate() # 复用最小的空缺 ID
+        database.on_rollback(lambda record_id=new_id: id_allocator.release(record_id)) # 插入失败，归还 ID
+        gift_value = extra[0] if extra else 0 # 礼物价值
+        rows.append((new_id, user_id, event_type, question, False,
+                     _assign_cluster(conn, event_type, question), time.time(), gift_value))
+        pending_index.add(user_id, new_id, question)
+        database.on_rollback(lambda record_id=new_id: pending_index.remove(record_id))
+
+    conn.executemany('''INSERT INTO chat_records (id, user_id, event_type, question, answered, cluster_id, created_at, gift_value)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+
+    def schedule(): # 提交成功后才可以被调度
+        for row in rows:
+            question_scheduler.add(row[0], row[1], row[2], row[7], row[6])
+    database.after_commit(schedule)
+    return len(rows)
+
+def save_chat_records(records):
+    """批量保存用户问题，records 为 (user_id, event_type, question[, gift_value]) 列表，返回保存条数"""
+    return database.execute_write(lambda conn: _save_chat_records(conn, records))
+
+def save_chat_record(user_id, event_type, question, gift_value=0):
     """保存用户问题"""
-    conn = sqlite3.connect("chat_memory.db")
-    cursor = conn.cursor()
-
-    cursor.execute('''SELECT user_id, question FROM chat_records 
-                      WHERE answered = 0''') 
-    records = cursor.fetchall() # 所有未回答问题
-    for rec in records:
-        if event_type == "stt_message":
-            break # stt 直接保存
-        if user_id == rec[0]  and fuzz.ratio(question, rec[1]) >= 50:
-            conn.close()
-            return # 相同用户重复问题
-
-    cursor.execute("SELECT id FROM chat_records ORDER BY id")
-    used_ids = [row[0] for row in cursor.fetchall()]
-    new_id = 1
-    for uid in used_ids:
-        if uid != new_id: 
-            break # 找到空缺 ID
-        new_id += 1
-
-    cursor.execute('''INSERT INTO chat_records (id, user_id, event_type, question, answered)
-                      VALUES (?, ?, ?, ?, ?)''', (new_id, user_id, event_type, question, False))
-    conn.commit()
-    conn.close()
+    save_chat_records([(user_id, event_type, question, gift_value)])
 
-def update_chat_response(record_id_list, response):
-    """更新问题回复"""
-    conn = sqlite3.connect("chat_memory.db")
-    cursor = conn.cursor()
+def _update_chat_response(conn, record_id_list, response):
+    """在写线程内更新问题回复，记忆索引、ID 和调度器在提交后才更新"""
+    placeholders = ",".join("?" * len(record_id_list))
+    cluster_ids = {row[0] for row in conn.execute(
+        f"SELECT DISTINCT cluster_id FROM chat_records WHERE cluster_id IS NOT NULL AND id IN ({placeholders})",
+        record_id_list)}
 
     chosen_id = random.choice(record_id_list)
-    cursor.execute("UPDATE chat_records SET response = ?, answered = ? WHERE id = ?", (response, True, chosen_id))
+    conn.execute("UPDATE chat_records SET response = ?, answered = ?, cluster_id = NULL, answered_at = ? WHERE id = ?",
+                 (response, True, time.time(), chosen_id))
 
-    for record_id in record_id_list: 
+    deleted = []
+    for record_id in record_id_list:
         if record_id != chosen_id: # chosen_id 以外
-            cursor.execute("DELETE FROM chat_records WHERE id = ?", (record_id,))
+            if conn.execute("DELETE FROM chat_records WHERE id = ?", (record_id,)).rowcount:
+                deleted.append(record_id)
+        _remove_pending(record_id) # 已回答或已删除
 
-    conn.commit()
-    conn.close()
+    chosen = conn.execute("SELECT event_type, question FROM chat_records WHERE id = ?", (chosen_id,)).fetchone()
+    _release_clusters(conn, cluster_ids)
 
-def get_records():
-    """获取过滤过的纪录"""
-    conn = sqlite3.connect("chat_memory.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, user_id, event_type, question, response, answered FROM chat_records")
-    records = cursor.fetchall()
-    conn.close()
+    def apply():
+        for record_id in record_id_list:
+            if record_id != chosen_id:
+                recall_index.remove(record_id)
+        for record_id in deleted:
+            id_allocator.release(record_id)
+        if chosen:
+            recall_index.add(chosen_id, chosen[0], chosen[1], response) # 加入长期记忆
+        question_scheduler.complete(record_id_list) # 这些用户的下一条问题推后
+    database.after_commit(apply)
 
-    if not records:
-        return None, None
+def update_chat_response(record_id_list, response):
+    """更新问题回复"""
+    database.execute_write(lambda conn: _update_chat_response(conn, record_id_list, response))
 
-    formatted_records = [
+def _format_records(rows):
+    """数据格式"""
+    return [
         {
             "id": rec[0],
             "user_id": rec[1],
@@ -80,49 +356,141 @@ def get_records():
             "response": rec[4],
             "answered": bool(rec[5]),
         }
-        for rec in records
-    ] # 数据格式
+        for rec in rows
+    ]
 
-    records_list = []
-    id_list = []
+def fetch_records(descending=False, archive=False):
+    """读取全部聊天记录，archive 为 True 时读取归档表"""
+    order = "DESC" if descending else "ASC"
+    if archive:
+        return _format_records(database.read(f"SELECT {ARCHIVE_COLUMNS} FROM {archive_table} ORDER BY id {order}"))
+    return _format_records(database.read(f"SELECT {RECORD_COLUMNS} FROM chat_records ORDER BY id {order}"))
+
+def _copy_to_archive(conn, cutoff):
+    """在写线程内把早于 cutoff 回答的记录复制到归档表，已归档的 ID 跳过"""
+    conn.execute(f'''INSERT OR IGNORE INTO {archive_table}
+                     (id, user_id, event_type, question, response, created_at, answered_at, archived_at)
+                     SELECT id, user_id, event_type, question, response, created_at, answered_at, ?
+                     FROM chat_records WHERE answered = 1 AND answered_at < ?''', (time.time(), cutoff))
+
+def _delete_archived(conn, cutoff):
+    """在写线程内删除早于 cutoff 回答且已在归档表中的记录，返回删除条数"""
+    return conn.execute(f'''DELETE FROM chat_records WHERE answered = 1 AND answered_at < ?
+                             AND id IN (SELECT id FROM {archive_table})''', (cutoff,)).rowcount
+
+def _archive_records(conn, cutoff):
+    """在写线程内把早于 cutoff 回答的记录移入归档表"""
+    _copy_to_archive(conn, cutoff)
+    return _delete_archived(conn, cutoff)
 
-    for event_type_priority in ["stt_message", "live_message"]:
-        for record in formatted_records:
-            if not record.get("answered", False) and record["event_type"] == event_type_priority:
-                similar_records = [
-                    rec for rec in formatted_records
-                    if not rec.get("answered", False)
-                    and rec["id"] != record["id"]
-                    and rec["event_type"] == record["event_type"]
-                    and fuzz.ratio(record.get("question", ""), rec.get("question", "")) >= 50
-                ]
-                similar_records.append(record) # 加入目前纪录
+def archive_records(max_age=ARCHIVE_AFTER_SECONDS):
+    """归档超过 max_age 秒的已回答记录，返回归档条数 (ID 保留不复用，记忆索引不变)
 
-                for rec in similar_records:
-                    id_list.append(rec["id"])
+    归档表在同一文件时复制和删除在一个事务中完成。归档为附加的独立文件时，WAL 模式下跨文件的事务
+    不是原子的，所以分两个事务：先复制 (按 ID 跳过已归档的)，提交后再删除已在归档表中的记录。
+    中途崩溃时记录会暂时同时出现在两张表中，下一次归档继续完成，不会重复或丢失。
+    """
+    cutoff = time.time() - max_age
+    if archive_table.startswith("archive."):
+        database.execute_write(lambda conn: _copy_to_archive(conn, cutoff))
+        return database.execute_write(lambda conn: _delete_archived(conn, cutoff))
+    return database.execute_write(lambda conn: _archive_records(conn, cutoff))
 
-                chosen_record = random.choice(similar_records)
-                records_list.append(chosen_record) # 用户提问
-                break  
+def _vacuum(conn, force=False):
+    """在事务外压缩空闲页较多的数据库，返回压缩了的库名
 
-        if records_list:
-            break  
+    VACUUM 会重写整个文件并阻塞所有写入，所以只在空闲页超过 VACUUM_FREE_RATIO 时执行。
+    """
+    vacuumed = []
+    for schema in ["main"] + (["archive"] if archive_table.startswith("archive.") else []):
+        free = conn.execute(f"PRAGMA {schema}.freelist_count").fetchone()[0]
+        pages = conn.execute(f"PRAGMA {schema}.page_count").fetchone()[0]
+        if force or free > pages * VACUUM_FREE_RATIO:
+            conn.execute(f"VACUUM {schema}")
+            vacuumed.append(schema)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return vacuumed
+
+def compact(vacuum=True, force=False):
+    """归档并更新统计信息，空闲页较多 (或 force) 时 VACUUM，返回归档条数"""
+    archived = archive_records()
+    database.execute_write(lambda conn: conn.execute("ANALYZE"))
+    if vacuum:
+        database.submit_write(lambda conn: _vacuum(conn, force), transactional=False).result()
+    return archived
+
+def retention_loop():
+    """后台定期归档和压缩，不阻塞主循环"""
+    while True:
+        time.sleep(COMPACT_INTERVAL)
+        try:
+            compact()
+        except Exception as e:
+            print(f"聊天记录归档压缩失败: {e}")
+
+def get_records():
+    """获取过滤过的纪录"""
+    records_list = []
+    id_list = []
+
+    next_id = question_scheduler.peek() # 优先级最高的问题
+    if next_id is not None:
+        cluster_records = _format_records(database.read(
+            f'''SELECT {RECORD_COLUMNS} FROM chat_records
+                WHERE answered = 0 AND cluster_id = (
+                    SELECT cluster_id FROM chat_records WHERE id = ?
+                ) ORDER BY id''', (next_id,))) # 该问题所在的簇
+
+        if cluster_records:
+            id_list = [rec["id"] for rec in cluster_records]
+            records_list.append(random.choice(cluster_records)) # 用户提问
 
     if not records_list:
         return None, None
 
-    similar_answered = [
-        rec for rec in formatted_records
-        if rec.get("answered", False)
-        and rec["event_type"] == records_list[0]["event_type"]
-        and fuzz.ratio(records_list[0]["question"], rec.get("question", "")) >= 50
-    ] 
-
-    if similar_answered:
-        for rec in similar_answered:
-            id_list.append(rec["id"])
-        records_list.append(random.choice(similar_answered)) # 相似回复（记忆）
+    memories = recall_index.search(records_list[0]["question"], RECALL_TOP_K, records_list[0]["event_type"])
+    if memories:
+        memory_ids = [record_id for record_id, _ in memories]
+        placeholders = ",".join("?" * len(memory_ids))
+        rows = {rec["id"]: rec for rec in _format_records(database.read(
+            f'''SELECT {RECORD_COLUMNS} FROM chat_records WHERE id IN ({placeholders})
+                UNION ALL SELECT {ARCHIVE_COLUMNS} FROM {archive_table} WHERE id IN ({placeholders})''',
+            memory_ids + memory_ids))} # 记忆可能已归档
+        records_list.extend(rows[record_id] for record_id in memory_ids if record_id in rows) # 相关回复（记忆），按相关度排序
 
     return records_list, id_list
 
-init_db()
\ No newline at end of file
+init_db()
+threading.Thread(target=retention_loop, daemon=True).start()
+
+APP_URL = "http://127.0.0.1:5000" # 运行中的应用 (app.py)，rebuild 命令优先交给它执行
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import urllib.request
+    import urllib.error
+
+    parser = argparse.ArgumentParser(description="聊天记忆维护工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = sub.add_parser("rebuild", help="批量重建未回答问题的分组 (应用运行时由应用进程执行)")
+    rebuild_parser.add_argument("--block-size", type=int, default=1024, help="每次计算的相似度矩阵行数")
+    compact_parser = sub.add_parser("compact", help="归档旧记录并压缩数据库")
+    compact_parser.add_argument("--no-vacuum", action="store_true", help="跳过 VACUUM")
+    compact_parser.add_argument("--force-vacuum", action="store_true", help="空闲页不多时也 VACUUM")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        request = urllib.request.Request(f"{APP_URL}/maintenance/rebuild?block_size={args.block_size}", method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=600) as resp:
+                print(f"应用已重建完成，共 {json.load(resp)['clusters']} 个问题簇")
+        except urllib.error.HTTPError as e:
+            print(f"应用重建失败: {e.read().decode('utf-8', 'replace')}")
+        except urllib.error.URLError as e:
+            if not isinstance(e.reason, ConnectionRefusedError):
+                print(f"无法确认应用是否在运行，未重建: {e.reason}")
+            else: # 应用没有运行，没有其他进程持有问题簇索引
+                print(f"重建完成，共 {rebuild_clusters(args.block_size)} 个问题簇")
+    elif args.command == "compact":
+        print(f"压缩完成，归档 {compact(not args.no_vacuum, args.force_vacuum)} 条记录")
@@ -0,0 +1,307 @@
+import json
+import time
+import base64
+import struct
+import hashlib
+import threading
+import itertools
+import socket
+import socketserver
+import argparse
+import numpy as np
+
+# 模拟 OpenAI Realtime API 的本地 WebSocket 服务器，只实现本项目用到的事件，用于离线端到端测试
+HOST = "127.0.0.1"
+PORT = 8765
+RATE = 24000
+TOKEN_MS = 30 # 每个文本增量的间隔
+TOKEN_CHARS = 2 # 每个文本增量的字数
+AUDIO_MS_PER_TOKEN = 150 # 每个文本增量附带的音频时长
+FIRST_DELAY_MS = 300 # response.create 到第一个增量的延迟
+SILENCE_MS = 500 # 多久没有收到音频视为说话结束
+TRANSCRIBE_MS = 200 # 说话结束到转录完成的延迟
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# 默认脚本：turns 依次作为回复 (循环使用)，transcripts 依次作为语音转录结果
+DEFAULT_SCRIPT = {
+    "turns": [
+        {"reply": "大家晚上好，今天也要开开心心的哦！", "emotion": "星星眼"},
+        {"reply": "哼，才不告诉你呢，笨蛋。", "emotion": "嘟嘴"},
+        {"reply": "谢谢你的礼物，人家有点害羞啦。", "emotion": "脸红"},
+    ],
+    "transcripts": ["你好呀", "今天唱什么歌"],
+}
+
+def load_script(path=None):
+    """读取会话脚本 (JSON)，不指定时使用默认脚本
+
+    turns 中的条目可以用 {"events": [{"delay_ms": 毫秒, "event": {...}}]} 原样回放录制的服务器事件。
+    """
+    if not path:
+        return DEFAULT_SCRIPT
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def tone(ms, rate=RATE):
+    """生成指定时长的 PCM16 提示音"""
+    t = np.arange(int(rate * ms / 1000)) / rate
+    return (np.sin(2 * np.pi * 220 * t) * 3000).astype(np.int16).tobytes()
+
+class RealtimeHandler(socketserver.BaseRequestHandler):
+    """一个 WebSocket 连接：握手、收发帧、按脚本生成服务器事件"""
+
+    def setup(self):
+        self.server.handlers.add(self)
+        self.send_lock = threading.Lock()
+        self.closed = False
+        self.last_append = None # 最后一次收到音频的时间，None 表示没有在说话
+        self.audio_bytes = 0
+        self.event_ids = itertools.count(1)
+
+    def handle(self):
+        if not self._handshake():
+            return
+        threading.Thread(target=self._silence_loop, daemon=True).start()
+        try:
+            while not self.closed:
+                message = self._recv_message()
+                if message is None:
+                    break
+                self._on_event(json.loads(message))
+        except ConnectionError:
+            pass # 客户端断开
+        except (OSError, ValueError) as e:
+            print(f"模拟服务器连接错误: {e}")
+        finally:
+            self.closed = True
+
+    def finish(self):
+        self.server.handlers.discard(self)
+
+    def drop(self):
+        """不发送关闭帧直接断开，模拟网络中断"""
+        self.closed = True
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # ---- WebSocket 协议 ----
+
+    def _recv_exact(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("连接已关闭")
+            data.extend(chunk)
+        return bytes(data)
+
+    def _handshake(self):
+        """HTTP 升级握手"""
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return False
+            request += chunk
+        headers = {}
+        for line in request.decode("latin-1").split("\r\n")[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key:
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.request.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return True
+
+    def _recv_message(self):
+        """读取一条完整消息 (合并分片)，收到关闭帧时返回 None"""
+        payload = bytearray()
+        while True:
+            first, second = self._recv_exact(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self._recv_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self._recv_exact(8))[0]
+            mask = self._recv_exact(4) if second & 0x80 else None
+            data = self._recv_exact(length)
+            if mask and length:
+                repeated = (mask * (length // 4 + 1))[:length]
+                data = (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(length, "big")
+
+            if opcode == 0x8: # 关闭
+                self._send_frame(0x8, data[:2])
+                return None
+            if opcode == 0x9: # ping
+                self._send_frame(0xA, data)
+                continue
+            if opcode == 0xA: # pong
+                continue
+            payload.extend(data)
+            if first & 0x80: # FIN
+                return payload.decode("utf-8")
+
+    def _send_frame(self, opcode, data):
+        header = bytes([0x80 | opcode])
+        if len(data) < 126:
+            header += bytes([len(data)])
+        elif len(data) < 65536:
+            header += bytes([126]) + struct.pack("!H", len(data))
+        else:
+            header += bytes([127]) + struct.pack("!Q", len(data))
+        with self.send_lock:
+            self.request.sendall(header + data)
+
+    def send_event(self, event):
+        """发送一个服务器事件"""
+        if self.closed:
+            return
+        event.setdefault("event_id", f"event_{next(self.event_ids)}")
+        try:
+            self._send_frame(0x1, json.dumps(event, ensure_ascii=False).encode("utf-8"))
+        except OSError:
+            self.closed = True
+
+    # ---- Realtime 事件 ----
+
+    def _on_event(self, event):
+        event_type = event.get("type")
+        if event_type == "session.update":
+            self.send_event({"type": "session.updated", "session": event.get("session", {})})
+        elif event_type == "input_audio_buffer.append":
+            if self.last_append is None:
+                self.send_event({"type": "input_audio_buffer.speech_started", "audio_start_ms": 0})
+            self.audio_bytes += len(base64.b64decode(event.get("audio", "")))
+            self.last_append = time.monotonic()
+        elif event_type == "response.create":
+            threading.Thread(target=self.server.respond, args=(self, event.get("response", {})), daemon=True).start()
+
+    def _silence_loop(self):
+        """一段时间没有音频后依次发送说话结束、提交和转录完成事件"""
+        while not self.closed:
+            time.sleep(0.02)
+            if self.last_append is None or time.monotonic() - self.last_append < self.server.silence_ms / 1000:
+                continue
+            audio_ms = self.audio_bytes / 2 * 1000 / RATE
+            self.last_append = None
+            self.audio_bytes = 0
+            item_id = f"item_{next(self.event_ids)}"
+            self.send_event({"type": "input_audio_buffer.speech_stopped", "audio_end_ms": int(audio_ms), "item_id": item_id})
+            self.send_event({"type": "input_audio_buffer.committed", "item_id": item_id})
+            time.sleep(self.server.transcribe_ms / 1000)
+            self.send_event({"type": "conversation.item.input_audio_transcription.completed",
+                             "item_id": item_id, "content_index": 0, "transcript": self.server.next_transcript()})
+
+class MockRealtimeServer(socketserver.ThreadingTCPServer):
+    """模拟服务器，回复内容和节奏来自脚本与参数"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host=HOST, port=PORT, script=None, token_ms=TOKEN_MS, token_chars=TOKEN_CHARS,
+                 audio_ms_per_token=AUDIO_MS_PER_TOKEN, first_delay_ms=FIRST_DELAY_MS,
+                 silence_ms=SILENCE_MS, transcribe_ms=TRANSCRIBE_MS):
+        super().__init__((host, port), RealtimeHandler)
+        self.script = script or DEFAULT_SCRIPT
+        self.token_ms = token_ms
+        self.token_chars = token_chars
+        self.audio_ms_per_token = audio_ms_per_token
+        self.first_delay_ms = first_delay_ms
+        self.silence_ms = silence_ms
+        self.transcribe_ms = transcribe_ms
+        self.turn_counter = itertools.count()
+        self.transcript_counter = itertools.count()
+        self.last_turn = {}
+        self.responses = 0 # 已完成的回复数
+        self.handlers = set() # 当前的连接
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"ws://{host}:{port}/v1/realtime"
+
+    def start(self):
+        """在后台线程运行，返回自身"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def drop(self, client_address=None):
+        """断开来自 client_address (客户端的 (主机, 端口)) 的连接，不指定时断开全部，返回断开数"""
+        handlers = [handler for handler in list(self.handlers)
+                    if client_address is None or tuple(handler.client_address[:2]) == tuple(client_address[:2])]
+        for handler in handlers:
+            handler.drop()
+        return len(handlers)
+
+    def next_transcript(self):
+        transcripts = self.script.get("transcripts") or ["你好"]
+        return transcripts[next(self.transcript_counter) % len(transcripts)]
+
+    def respond(self, handler, response):
+        """按请求类型生成回复：带音频的对话回复，或纯文本的情绪识别函数调用"""
+        response_id = f"resp_{next(handler.event_ids)}"
+        handler.send_event({"type": "response.created", "response": {"id": response_id, "status": "in_progress",
+                                                                     "metadata": response.get("metadata")}})
+        time.sleep(self.first_delay_ms / 1000)
+
+        if "audio" in response.get("modalities", ["audio", "text"]):
+            turns = self.script.get("turns") or [{"reply": "收到。"}]
+            turn = turns[next(self.turn_counter) % len(turns)]
+            with self.lock:
+                self.last_turn = turn
+            if "events" in turn:
+                self._replay(handler, turn["events"])
+            else:
+                self._stream_reply(handler, response_id, turn.get("reply", ""))
+        else:
+            with self.lock:
+                turn = self.last_turn
+            arguments = json.dumps({"emotion": turn.get("emotion", "无"), "text": turn.get("reply", "")}, ensure_ascii=False)
+            handler.send_event({"type": "response.function_call_arguments.done", "response_id": response_id,
+                                "name": "analyze_conversation", "arguments": arguments})
+
+        handler.send_event({"type": "response.done", "response": {"id": response_id, "status": "completed"}})
+        with self.lock:
+            self.responses += 1
+
+    def _stream_reply(self, handler, response_id, reply):
+        """按节奏发送音频增量和文本增量"""
+        audio = base64.b64encode(tone(self.audio_ms_per_token)).decode()
+        for i in range(0, len(reply), self.token_chars):
+            handler.send_event({"type": "response.audio.delta", "response_id": response_id, "delta": audio})
+            handler.send_event({"type": "response.audio_transcript.delta", "response_id": response_id,
+                                "delta": reply[i:i + self.token_chars]})
+            time.sleep(self.token_ms / 1000)
+        handler.send_event({"type": "response.audio.done", "response_id": response_id})
+        handler.send_event({"type": "response.audio_transcript.done", "response_id": response_id, "transcript": reply})
+
+    def _replay(self, handler, events):
+        """原样回放录制的事件"""
+        for item in events:
+            time.sleep(item.get("delay_ms", 0) / 1000)
+            handler.send_event(dict(item["event"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模拟 OpenAI Realtime 服务器")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--script", help="会话脚本 (JSON)")
+    parser.add_argument("--token-ms", type=float, default=TOKEN_MS, help="文本增量间隔 (毫秒)")
+    parser.add_argument("--audio-ms", type=float, default=AUDIO_MS_PER_TOKEN, help="每个增量的音频时长 (毫秒)")
+    parser.add_argument("--first-delay-ms", type=float, default=FIRST_DELAY_MS, help="首个增量延迟 (毫秒)")
+    args = parser.parse_args()
+
+    server = MockRealtimeServer(args.host, args.port, load_script(args.script), token_ms=args.token_ms,
+                                audio_ms_per_token=args.audio_ms, first_delay_ms=args.first_delay_ms)
+    print(f"模拟服务器运行在 {server.url}，设置环境变量 OPENAI_WS_URL 指向该地址")
+    server.serve_forever()
@@ -1,54 +1,278 @@
-import queue
 import threading
-import pyaudio
+import time
 import wave
 import io
+from tracing import tracer
 
-class AudioPlayer:
-    def __init__(self):
-        self.audio_queue = queue.Queue()
-        self._is_playing = False  
-        self.running = True  
+RATE = 24000 # 采样率 (单声道 PCM16)
+SAMPLE_WIDTH = 2
+PERIOD_MS = 20 # 每次写入输出设备的时长
+PREBUFFER_MS = 100 # 开始播放前的缓冲目标
+MAX_PREBUFFER_MS = 500 # 自适应缓冲目标的上限
+DEPTH_STEP_MS = 40 # 每次欠载后缓冲目标增加的时长
+DEPTH_DECAY_S = 10 # 多久没有欠载后缓冲目标回落一步
+END_TIMEOUT_MS = 500 # 未调用 end_stream 时，多久没有新音频视为流结束 (播完剩余音频后停止)
+
+def ms_to_bytes(ms, rate=RATE):
+    return int(rate * ms / 1000) * SAMPLE_WIDTH
+
+class PyAudioSink:
+    """PyAudio 输出设备"""
+
+    def __init__(self, rate=RATE):
+        import pyaudio # 测试和基准测试使用其他输出时不需要
         self.p = pyaudio.PyAudio()
-        
         self.stream = self.p.open(
             format=pyaudio.paInt16,
             channels=1,
-            rate=24000,
+            rate=rate,
             output=True,
-        ) 
+        )
+
+    def write(self, data):
+        self.stream.write(data)
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.p.terminate()
+
+class NullSink:
+    """丢弃音频，realtime 为 True 时按实时速度消耗，用于测试和基准测试"""
+
+    def __init__(self, rate=RATE, realtime=True):
+        self.rate = rate
+        self.realtime = realtime
+        self.bytes_written = 0
+        self.next_time = None # 模拟设备播放到的时间
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        if self.realtime:
+            now = time.monotonic()
+            if self.next_time is None or self.next_time < now:
+                self.next_time = now
+            self.next_time += len(data) / SAMPLE_WIDTH / self.rate
+            time.sleep(max(0.0, self.next_time - now))
+
+    def close(self):
+        pass
+
+class FileSink(NullSink):
+    """把播放的音频 (包括补的静音) 写入 WAV 文件"""
+
+    def __init__(self, path, rate=RATE, realtime=False):
+        super().__init__(rate, realtime)
+        self.wav = wave.open(path, "wb")
+        self.wav.setnchannels(1)
+        self.wav.setsampwidth(SAMPLE_WIDTH)
+        self.wav.setframerate(rate)
+
+    def write(self, data):
+        self.wav.writeframes(data)
+        super().write(data)
+
+    def close(self):
+        self.wav.close()
+
+def make_sink(spec):
+    """按配置创建输出：pyaudio (默认)、null 或 file:路径.wav"""
+    if spec == "null":
+        return NullSink()
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):], realtime=True)
+    return PyAudioSink()
+
+class RingBuffer:
+    """字节环形缓冲，写满时容量翻倍"""
+
+    def __init__(self, capacity=ms_to_bytes(10000)):
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        capacity = len(self.buffer)
+        while capacity < needed:
+            capacity *= 2
+        data = self.read(self.size)
+        self.buffer = bytearray(capacity)
+        self.buffer[:len(data)] = data
+        self.start, self.size = 0, len(data)
+
+    def write(self, data):
+        if self.size + len(data) > len(self.buffer):
+            self._grow(self.size + len(data))
+        capacity = len(self.buffer)
+        end = (self.start + self.size) % capacity
+        first = min(len(data), capacity - end)
+        self.buffer[end:end + first] = data[:first]
+        self.buffer[:len(data) - first] = data[first:]
+        self.size += len(data)
+
+    def read(self, n):
+        n = min(n, self.size)
+        capacity = len(self.buffer)
+        first = min(n, capacity - self.start)
+        data = bytes(self.buffer[self.start:self.start + first]) + bytes(self.buffer[:n - first])
+        self.start = (self.start + n) % capacity
+        self.size -= n
+        return data
+
+    def clear(self):
+        self.start = self.size = 0
+
+class AudioPlayer:
+    """带抖动缓冲的播放器
+
+    音频先进入环形缓冲，缓冲达到目标深度后才开始播放；播放中缓冲耗尽 (欠载) 时补静音，
+    直到重新缓冲到目标深度，同时提高目标深度，长时间没有欠载后再逐步回落。
+    """
+
+    def __init__(self, on_change=None, sink=None, prebuffer_ms=PREBUFFER_MS, max_prebuffer_ms=MAX_PREBUFFER_MS):
+        self.sink = sink if sink is not None else PyAudioSink()
+        self.on_change = on_change # 播放状态变化回调 func(is_playing)
+        self.prebuffer_ms = prebuffer_ms
+        self.max_prebuffer_ms = max(prebuffer_ms, max_prebuffer_ms)
+        self.target_ms = prebuffer_ms # 当前缓冲目标 (自适应)
+        self.period = ms_to_bytes(PERIOD_MS)
+
+        self.ring = RingBuffer()
+        self.condition = threading.Condition()
+        self._is_playing = False
+        self.mode = "idle" # idle 空闲 / prebuffer 首次缓冲 / rebuffer 欠载补静音 / play 播放
+        self.ended = False # 当前音频流已结束 (end_stream)
+        self.last_data = 0.0 # 最后一次收到音频的时间
+        self.last_underrun = 0.0
+        self.counters = {
+            "underruns": 0, # 欠载次数
+            "silence_ms": 0.0, # 补的静音时长
+            "played_ms": 0.0, # 播放的音频时长
+            "streams": 0, # 播放的音频流数
+        }
+        self.running = True
         self.thread = threading.Thread(target=self._play_loop, daemon=True)
         self.thread.start()
 
     def add_audio(self, audio: bytes):
-        """添加音频到播放队列"""
-        self.audio_queue.put(audio)
-    
+        """添加 WAV 音频 (兼容模式)"""
+        wf = wave.open(io.BytesIO(audio), 'rb')
+        self.add_pcm(wf.readframes(wf.getnframes()))
+
+    def add_pcm(self, pcm):
+        """添加原始 PCM16 音频 (单声道 24kHz) 到缓冲"""
+        with self.condition:
+            self.ring.write(pcm)
+            self.ended = False
+            self.last_data = time.monotonic()
+            if self.mode == "idle":
+                self.mode = "prebuffer"
+                self.counters["streams"] += 1
+                self.is_playing = True # 缓冲中还有音频也算播放中
+            self.condition.notify()
+
+    def end_stream(self):
+        """标记当前音频流结束：不再等待缓冲目标，播完剩余音频即停止"""
+        with self.condition:
+            self.ended = True
+            self.condition.notify()
+
     @property
     def is_playing(self):
         return self._is_playing
-    
+
     @is_playing.setter
     def is_playing(self, value):
-        self._is_playing = value
+        if value != self._is_playing:
+            self._is_playing = value
+            if self.on_change:
+                self.on_change(value)
+
+    def stats(self):
+        """返回计数器、当前缓冲时长、缓冲目标和缓冲的周期数"""
+        with self.condition:
+            data = dict(self.counters)
+            data["buffered_ms"] = self._buffered_ms()
+            data["target_ms"] = self.target_ms
+            data["queue_depth"] = -(-len(self.ring) // self.period)
+        return data
+
+    def stop(self):
+        """停止播放线程并关闭输出"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+        self.sink.close()
+
+    def _buffered_ms(self):
+        return len(self.ring) / SAMPLE_WIDTH * 1000 / RATE
+
+    def _finish(self):
+        """当前音频流播放完毕"""
+        self.mode = "idle"
+        self.ring.clear()
+        self.is_playing = False
+
+    def _next_chunk(self):
+        """取下一段要写入设备的数据，没有音频时阻塞；返回 (数据, 是否为静音)"""
+        with self.condition:
+            while self.running:
+                now = time.monotonic()
+                if self.mode == "idle":
+                    self.condition.wait()
+                    continue
+
+                if self.mode == "prebuffer": # 首次缓冲不写设备，等待达到目标或流结束
+                    deadline = self.last_data + max(self.target_ms, END_TIMEOUT_MS) / 1000
+                    if self._buffered_ms() < self.target_ms and not self.ended and now < deadline:
+                        self.condition.wait(min(deadline - now, PERIOD_MS / 1000))
+                        continue
+                    self.mode = "play"
+
+                if self.mode == "rebuffer":
+                    if now - self.last_data > END_TIMEOUT_MS / 1000:
+                        self.ended = True # 长时间没有新音频，视为流结束，播完缓冲中剩余的音频
+                    if self._buffered_ms() >= self.target_ms or (self.ended and len(self.ring)):
+                        self.mode = "play"
+                    elif self.ended:
+                        self._finish()
+                        continue
+                    else:
+                        self.counters["silence_ms"] += PERIOD_MS
+                        return bytes(self.period), True # 补静音，保持设备时钟
+
+                if len(self.ring) >= self.period or (self.ended and len(self.ring)):
+                    if now - self.last_underrun > DEPTH_DECAY_S and self.target_ms > self.prebuffer_ms:
+                        self.target_ms = max(self.prebuffer_ms, self.target_ms - DEPTH_STEP_MS) # 长时间平稳，降低延迟
+                        self.last_underrun = now
+                    data = self.ring.read(self.period)
+                    self.counters["played_ms"] += len(data) / SAMPLE_WIDTH * 1000 / RATE
+                    return data, False
+                if self.ended:
+                    self._finish()
+                    continue
+
+                # 欠载：缓冲不足一个周期，补齐静音后进入重新缓冲
+                self.counters["underruns"] += 1
+                self.last_underrun = now
+                self.target_ms = min(self.max_prebuffer_ms, self.target_ms + DEPTH_STEP_MS)
+                self.mode = "rebuffer"
+                data = self.ring.read(len(self.ring))
+                self.counters["played_ms"] += len(data) / SAMPLE_WIDTH * 1000 / RATE
+                self.counters["silence_ms"] += (self.period - len(data)) / SAMPLE_WIDTH * 1000 / RATE
+                return data + bytes(self.period - len(data)), False
+            return None, True
 
     def _play_loop(self):
-        """循环播放队列中的音频"""
-        while self.running:
-            try:
-                audio = self.audio_queue.get(timeout=0.01) 
-                self.is_playing = True 
-                self._play_audio(audio)
-                self.is_playing = False 
-            except queue.Empty:
-                continue  
-
-    def _play_audio(self, audio: bytes):
-        """持续播放音频，不关闭 stream"""
-        wf = wave.open(io.BytesIO(audio), 'rb')
-        
-        chunk_size = 1024
-        data = wf.readframes(chunk_size)
-        while data:
-            self.stream.write(data)
-            data = wf.readframes(chunk_size)
\ No newline at end of file
+        """循环把缓冲中的音频写入输出设备"""
+        while True:
+            data, silent = self._next_chunk()
+            if data is None:
+                break
+            if not silent:
+                tracer.mark("first_sample_written") # 每轮只记录第一次
+            self.sink.write(data)
@@ -0,0 +1,71 @@
+import os
+import json
+import threading
+from typing import NamedTuple
+
+ROLEPLAY_FILE = "roleplay.txt" # 角色设定文件
+CHAT_INSTRUCTIONS = "根据上下文推理生成精简回复。"
+EMOTION_PROMPT = "根据以上对话内容，进行情绪识别。"
+
+roleplay_cache = (None, None) # (文件状态, system 消息)
+cache_lock = threading.Lock()
+
+def message(role, text):
+    """构造单条对话消息"""
+    content_type = "text" if role == "assistant" else "input_text"
+    return {
+        "type": "message",
+        "role": role,
+        "content": [{"type": content_type, "text": text}]
+    }
+
+def response_create(modalities, messages, conversation=None, metadata=None):
+    """序列化 response.create 请求，conversation 为 "none" 时是带外请求，不写入默认对话"""
+    response = {
+        "modalities": modalities,
+        "instructions": CHAT_INSTRUCTIONS,
+        "conversation": conversation,
+        "input": messages
+    }
+    if metadata:
+        response["metadata"] = metadata # 服务器在 response.created 中原样返回
+    return json.dumps({"type": "response.create", "response": response}, ensure_ascii=False)
+
+def roleplay_message():
+    """返回角色设定的 system 消息，文件修改时间或大小变化时才重新读取"""
+    global roleplay_cache
+    stat = os.stat(ROLEPLAY_FILE)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with cache_lock:
+        if roleplay_cache[0] != key:
+            with open(ROLEPLAY_FILE) as f:
+                roleplay_cache = (key, message("system", f.read()))
+        return roleplay_cache[1]
+
+class Turn(NamedTuple):
+    """一轮对话的请求内容，不可变，追加消息时返回新对象"""
+    question: str # 当前用户提问
+    messages: tuple # 对话消息，构造后不再修改
+
+    @classmethod
+    def from_records(cls, records):
+        """由 memory.get_records 的结果构造：角色设定、相关记忆、当前提问"""
+        messages = [roleplay_message()]
+        for rec in records[1:] + records[:1]: # 相关记忆在前，当前提问放在最后
+            messages.append(message("user", f"{rec['user_id']}: {rec['question']}"))
+            if rec.get("answered", False):
+                messages.append(message("assistant", rec["response"]))
+        return cls(f"{records[0]['user_id']}: {records[0]['question']}", tuple(messages))
+
+    def with_assistant(self, text):
+        """追加助手回复"""
+        return self._replace(messages=self.messages + (message("assistant", text),))
+
+    def chat_request(self):
+        """生成回复的请求 JSON"""
+        return response_create(["audio", "text"], list(self.messages))
+
+    def emotion_request(self, turn_number):
+        """情绪识别的请求 JSON：带外请求，可以和下一轮回复同时进行，metadata 记录所属轮次"""
+        return response_create(["text"], list(self.messages) + [message("user", EMOTION_PROMPT)],
+                               conversation="none", metadata={"turn": str(turn_number)})
@@ -0,0 +1,94 @@
+import math
+import heapq
+import threading
+from collections import Counter
+
+def char_ngrams(text, sizes=(2, 3)):
+    """提取字符二元/三元组，短文本退化为单字"""
+    text = "".join((text or "").split()).lower()
+    grams = Counter()
+    for n in sizes:
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    if not grams and text:
+        grams.update(text)
+    return grams
+
+class RecallIndex:
+    """已回答问答对的 TF-IDF 倒排索引，用于长期记忆检索"""
+
+    MAX_DF_RATIO = 0.05 # 出现在超过该比例文档中的词项区分度太低，检索时跳过
+    MIN_DF_SKIP = 200 # 文档数少于该值时不跳过任何词项
+    MIN_RELATIVE_SCORE = 0.5 # 低于最高分该比例的结果视为不相关
+    MIN_COVERAGE = 0.3 # 命中的查询词项 IDF 权重占查询总权重低于该比例的结果视为不相关，与其他结果无关
+
+    def __init__(self):
+        self.postings = {} # 词项 -> {id: 词频}
+        self.docs = {} # id -> (事件类型, 词项集合, 长度归一化系数)
+        self.lock = threading.Lock()
+
+    def add(self, record_id, event_type, question, response):
+        """加入或替换一条问答对"""
+        grams = char_ngrams(question) + char_ngrams(response)
+        with self.lock:
+            self._remove(record_id)
+            if not grams:
+                return
+            for gram, tf in grams.items():
+                self.postings.setdefault(gram, {})[record_id] = tf
+            self.docs[record_id] = (event_type, set(grams), 1 / math.sqrt(sum(grams.values())))
+
+    def remove(self, record_id):
+        """移除一条问答对"""
+        with self.lock:
+            self._remove(record_id)
+
+    def _remove(self, record_id):
+        doc = self.docs.pop(record_id, None)
+        if doc is None:
+            return
+        for gram in doc[1]:
+            posting = self.postings[gram]
+            posting.pop(record_id, None)
+            if not posting:
+                del self.postings[gram]
+
+    def search(self, text, k=3, event_type=None):
+        """返回与文本最相关的 k 条 (id, 分数)，分数降序"""
+        query = char_ngrams(text)
+        scores = {}
+        matched = {} # id -> 命中的查询词项权重
+        query_weight = 0.0
+        with self.lock:
+            total = len(self.docs)
+            max_df = max(self.MIN_DF_SKIP, total * self.MAX_DF_RATIO)
+            for gram, query_tf in query.items():
+                posting = self.postings.get(gram)
+                if posting and len(posting) > max_df:
+                    continue
+                idf = math.log(1 + total / len(posting)) if posting else math.log(1 + total) # 没出现过的词项按最高权重计入查询
+                query_weight += query_tf * idf
+                if not posting:
+                    continue
+                weight = query_tf * idf * idf
+                for record_id, tf in posting.items():
+                    scores[record_id] = scores.get(record_id, 0.0) + weight * tf
+                    matched[record_id] = matched.get(record_id, 0.0) + query_tf * idf
+
+            results = [
+                (record_id, score * self.docs[record_id][2])
+                for record_id, score in scores.items()
+                if (event_type is None or self.docs[record_id][0] == event_type)
+                and matched[record_id] >= query_weight * self.MIN_COVERAGE
+            ]
+        top = heapq.nlargest(k, results, key=lambda item: item[1])
+        return [item for item in top if item[1] >= top[0][1] * self.MIN_RELATIVE_SCORE]
+
+    def clear(self):
+        """清空索引"""
+        with self.lock:
+            self.postings.clear()
+            self.docs.clear()
+
+    def __len__(self):
+        return len(self.docs)
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ENABLED = os.getenv("VTUBER_RUNTIME", "thread") == "asyncio" # 设置 VTUBER_RUNTIME=asyncio 时所有 WebSocket 客户端共用一个事件循环
+EXECUTOR_WORKERS = 4 # 阻塞任务 (PyAudio、SQLite、HTTP) 的线程池大小
+BACKOFF_BASE = 0.5 # 重连退避的初始上限 (秒)
+BACKOFF_MAX = 30.0 # 重连退避的最大上限 (秒)
+
+loop = None # 共享事件循环
+executor = None # 阻塞任务线程池
+start_lock = threading.Lock()
+
+def get_loop():
+    """返回共享事件循环，首次调用时在后台线程启动"""
+    global loop, executor
+    with start_lock:
+        if loop is None:
+            executor = ThreadPoolExecutor(EXECUTOR_WORKERS, thread_name_prefix="runtime")
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(executor)
+            threading.Thread(target=loop.run_forever, name="runtime-loop", daemon=True).start()
+    return loop
+
+def spawn(coro):
+    """在事件循环中运行协程 (线程安全)，返回 concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+def headers_arg():
+    """websockets 14 起请求头参数改名为 additional_headers，旧版本使用 extra_headers"""
+    import websockets
+    major = int(websockets.__version__.split(".")[0])
+    return "additional_headers" if major >= 14 else "extra_headers"
+
+async def run_blocking(func, *args):
+    """在线程池中执行阻塞函数"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+class AsyncWebSocket:
+    """事件循环中的 WebSocket 客户端，send / 回调签名与 websocket.WebSocketApp 相同，可直接替换 ws_global
+
+    断开后按指数退避 (全抖动) 自动重连，不需要在 on_close 中重连。
+    url 可以是返回地址的阻塞函数，每次连接前在线程池调用，返回 None 时稍后重试。
+    blocking_handlers 为 True 时回调在专用的单线程中按顺序执行，避免数据库写入等阻塞事件循环。
+    """
+
+    def __init__(self, url, header=None, on_open=None, on_message=None, on_close=None, on_error=None,
+                 ping=None, blocking_handlers=False, name="WebSocket"):
+        self.url = url
+        self.header = [tuple(part.strip() for part in line.split(":", 1)) for line in header or []]
+        self.on_open = on_open
+        self.on_message = on_message
+        self.on_close = on_close
+        self.on_error = on_error
+        self.ping = ping # (间隔秒数, 数据)：连接期间定时发送的心跳
+        self.name = name
+        self.handler_executor = ThreadPoolExecutor(1, thread_name_prefix=name) if blocking_handlers else None
+
+        self.connection = None # 当前连接
+        self.outgoing = None # 当前连接的发送队列
+        self.task = None
+        self.counters = {
+            "connects": 0, # 成功建立的连接
+            "reconnects": 0, # 断开或失败后的重连
+            "drops": 0, # 连接断开次数
+            "errors": 0, # 连接错误次数
+        }
+
+    @property
+    def connected(self):
+        return self.connection is not None
+
+    def start(self):
+        """在共享事件循环中开始连接，返回自身"""
+        self.task = spawn(self._run())
+        return self
+
+    def send(self, data):
+        """线程安全地发送，未连接时抛出 ConnectionError"""
+        outgoing = self.outgoing
+        if self.connection is None or outgoing is None:
+            raise ConnectionError(f"{self.name} WebSocket 未连接")
+        loop.call_soon_threadsafe(outgoing.put_nowait, data)
+
+    def stats(self):
+        """返回计数器"""
+        return dict(self.counters)
+
+    def _callback(self, callback, *args):
+        """执行回调，异常只打印"""
+        try:
+            callback(self, *args)
+        except Exception as e:
+            print(f"{self.name} WebSocket 回调错误: {e}")
+
+    def _dispatch(self, callback, *args):
+        if callback is None:
+            return
+        if self.handler_executor:
+            self.handler_executor.submit(self._callback, callback, *args)
+        else:
+            self._callback(callback, *args)
+
+    async def _run(self):
+        """连接循环：断开或失败后退避重连"""
+        import websockets # 只有启用 asyncio 运行时才需要
+        attempt = 0
+        while True:
+            try:
+                url = self.url if isinstance(self.url, str) else await run_blocking(self.url)
+                if url:
+                    async with websockets.connect(url, max_size=None, **{headers_arg(): self.header}) as connection:
+                        attempt = 0
+                        await self._serve(connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.counters["errors"] += 1
+                if self.on_error:
+                    self._dispatch(self.on_error, e)
+                else:
+                    print(f"{self.name} WebSocket 错误: {e}")
+            self.counters["reconnects"] += 1
+            await asyncio.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+            attempt += 1
+
+    async def _serve(self, connection):
+        """收发一条连接上的消息，直到断开"""
+        import websockets
+        outgoing = asyncio.Queue()
+        self.connection, self.outgoing = connection, outgoing
+        self.counters["connects"] += 1
+        tasks = [asyncio.create_task(self._writer(connection, outgoing))]
+        if self.ping:
+            tasks.append(asyncio.create_task(self._pinger(outgoing, *self.ping)))
+        self._dispatch(self.on_open)
+        try:
+            async for message in connection:
+                self._dispatch(self.on_message, message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.connection = self.outgoing = None
+            for task in tasks:
+                task.cancel()
+            self.counters["drops"] += 1
+            self._dispatch(self.on_close, connection.close_code, connection.close_reason)
+
+    async def _writer(self, connection, outgoing):
+        """按顺序发送队列中的数据"""
+        import websockets
+        try:
+            while True:
+                await connection.send(await outgoing.get())
+        except websockets.ConnectionClosed:
+            pass # 断开由接收循环处理
+
+    async def _pinger(self, outgoing, interval, data):
+        """定时发送心跳"""
+        while True:
+            outgoing.put_nowait(data)
+            await asyncio.sleep(interval)
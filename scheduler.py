@@ -0,0 +1,125 @@
+import heapq
+import itertools
+import threading
+import time
+
+# 权重配置：分数 = AGE_WEIGHT * 等待秒数 + 来源加分 + GIFT_WEIGHT * 礼物价值
+SOURCE_WEIGHTS = {
+    "stt_message": 1e6, # 语音输入始终优先于弹幕
+    "live_message": 0.0,
+}
+GIFT_WEIGHT = 0.01 # 每单位礼物价值 (Bilibili 金瓜子) 的加分
+AGE_WEIGHT = 1.0 # 每等待一秒的加分
+FAIRNESS_DELAY = 30.0 # 同一用户相邻两次被回答的问题，虚拟到达时间至少相隔的秒数，防止刷屏独占
+
+class QuestionScheduler:
+    """未回答问题的优先级调度器
+
+    每个用户一个按优先级排序的小堆，全局堆只放每个用户的队首，取下一条为 O(log n)。
+    年龄加分对所有问题同速增长，所以排序键可以写成与当前时间无关的"虚拟到达时间"：
+    到达时间 - 加分 / AGE_WEIGHT；公平性通过推迟刚被回答过的用户的虚拟时间实现。
+    """
+
+    def __init__(self, source_weights=None, gift_weight=None, age_weight=None, fairness_delay=None):
+        self.source_weights = dict(SOURCE_WEIGHTS if source_weights is None else source_weights)
+        self.gift_weight = GIFT_WEIGHT if gift_weight is None else gift_weight
+        self.age_weight = AGE_WEIGHT if age_weight is None else age_weight
+        self.fairness_delay = FAIRNESS_DELAY if fairness_delay is None else fairness_delay
+
+        self.items = {} # id -> (用户, 到达时间, 加分秒数)
+        self.user_queues = {} # 用户 -> [(到达时间 - 加分秒数, id)]
+        self.user_vtime = {} # 用户 -> 下一条问题的最早虚拟到达时间，过期且没有排队问题时删除
+        self.vtime_heap = [] # [(虚拟时间, 用户)]，按到期顺序清理 user_vtime
+        self.user_heads = {} # 用户 -> 全局堆中有效条目的序号
+        self.heap = [] # [(排序键, 序号, 用户)]
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def _bonus(self, event_type, gift_value):
+        """加分换算为秒"""
+        bonus = self.source_weights.get(event_type, 0.0) + self.gift_weight * (gift_value or 0)
+        return bonus / self.age_weight
+
+    def _head(self, user):
+        """返回用户队首 id，顺便清理已移除的条目"""
+        queue = self.user_queues.get(user)
+        while queue and queue[0][1] not in self.items:
+            heapq.heappop(queue)
+        if not queue:
+            self.user_queues.pop(user, None)
+            self.user_heads.pop(user, None)
+            return None
+        return queue[0][1]
+
+    def _expire(self, now):
+        """删除已到期且没有排队问题的用户的虚拟时间，之后的新问题不受影响，不必保留"""
+        while self.vtime_heap and self.vtime_heap[0][0] <= now:
+            vtime, user = heapq.heappop(self.vtime_heap)
+            if self.user_vtime.get(user) == vtime and user not in self.user_queues:
+                del self.user_vtime[user]
+
+    def _push_head(self, user):
+        """按用户当前队首重新放入全局堆，旧条目作废"""
+        record_id = self._head(user)
+        if record_id is None:
+            return
+        _, created_at, bonus = self.items[record_id]
+        arrival = max(created_at, self.user_vtime.get(user, created_at))
+        seq = next(self.counter)
+        self.user_heads[user] = seq
+        heapq.heappush(self.heap, (arrival - bonus, seq, user))
+
+    def add(self, record_id, user_id, event_type, gift_value=0, created_at=None):
+        """加入一条未回答问题"""
+        created_at = time.time() if created_at is None else created_at
+        with self.lock:
+            self._expire(created_at)
+            bonus = self._bonus(event_type, gift_value)
+            old_head = self._head(user_id)
+            self.items[record_id] = (user_id, created_at, bonus)
+            heapq.heappush(self.user_queues.setdefault(user_id, []), (created_at - bonus, record_id))
+            if self._head(user_id) != old_head:
+                self._push_head(user_id)
+
+    def complete(self, record_ids, now=None):
+        """问题已回答：移除，并把这些用户下一条问题的虚拟到达时间推迟到本次之后 fairness_delay 秒"""
+        now = time.time() if now is None else now
+        with self.lock:
+            served = {} # 用户 -> 被回答问题的最晚虚拟到达时间
+            for record_id in record_ids:
+                item = self.items.pop(record_id, None)
+                if item:
+                    user, created_at, _ = item
+                    arrival = max(created_at, self.user_vtime.get(user, created_at))
+                    served[user] = max(served.get(user, arrival), arrival)
+            for user, arrival in served.items():
+                self.user_vtime[user] = min(arrival, now) + self.fairness_delay
+                heapq.heappush(self.vtime_heap, (self.user_vtime[user], user))
+                self._push_head(user)
+            self._expire(now)
+
+    def peek(self):
+        """返回下一条应回答的问题 id，没有则返回 None"""
+        with self.lock:
+            while self.heap:
+                _, seq, user = self.heap[0]
+                if self.user_heads.get(user) != seq:
+                    heapq.heappop(self.heap) # 作废条目
+                    continue
+                record_id = self._head(user)
+                if record_id is None:
+                    heapq.heappop(self.heap)
+                    continue
+                return record_id
+            return None
+
+    def clear(self):
+        """清空调度器 (保留用户公平性状态)"""
+        with self.lock:
+            self.items.clear()
+            self.user_queues.clear()
+            self.user_heads.clear()
+            self.heap.clear()
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,74 @@
+from collections import Counter
+
+class CharIndex:
+    """按分组维护的字符倒排索引，为 fuzz.ratio 阈值判断预筛候选
+
+    fuzz.ratio = 200 * LCS / (len1 + len2)，而 LCS 不超过两段文本字符多重集的交集大小，
+    所以交集不足的文本一定达不到阈值，可以安全跳过，不会漏掉任何匹配。
+    """
+
+    def __init__(self):
+        self.groups = {} # 分组 -> {"postings": {字符: {id: 次数}}, "empty": {空文本 id}}
+        self.items = {} # id -> (分组, 文本)
+
+    def add(self, key, item_id, text):
+        """加入一条文本"""
+        if text is None:
+            return # fuzz.ratio 对 None 恒为 0，不参与匹配
+        if item_id in self.items:
+            self.remove(item_id)
+
+        group = self.groups.setdefault(key, {"postings": {}, "empty": set()})
+        if not text:
+            group["empty"].add(item_id)
+        for char, count in Counter(text).items():
+            group["postings"].setdefault(char, {})[item_id] = count
+        self.items[item_id] = (key, text)
+
+    def remove(self, item_id):
+        """移除一条文本"""
+        entry = self.items.pop(item_id, None)
+        if entry is None:
+            return
+
+        key, text = entry
+        group = self.groups[key]
+        group["empty"].discard(item_id)
+        for char in set(text):
+            posting = group["postings"][char]
+            posting.pop(item_id, None)
+            if not posting:
+                del group["postings"][char]
+        if not group["postings"] and not group["empty"]:
+            del self.groups[key]
+
+    def text(self, item_id):
+        """返回已索引的文本"""
+        return self.items[item_id][1]
+
+    def candidates(self, key, text, threshold=50):
+        """返回可能达到阈值的 id，按 id 升序"""
+        group = self.groups.get(key)
+        if group is None or text is None:
+            return []
+        if not text:
+            return sorted(group["empty"]) # 只有空文本与空文本相似
+
+        overlap = {}
+        for char, count in Counter(text).items():
+            for item_id, item_count in group["postings"].get(char, {}).items():
+                overlap[item_id] = overlap.get(item_id, 0) + min(count, item_count)
+
+        length = len(text)
+        return sorted(
+            item_id for item_id, shared in overlap.items()
+            if 200 * shared >= threshold * (length + len(self.items[item_id][1]))
+        )
+
+    def clear(self):
+        """清空索引"""
+        self.groups.clear()
+        self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
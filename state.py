@@ -0,0 +1,47 @@
+import threading
+
+class StateBus:
+    """线程安全的共享状态：值真正变化时版本号加一，并唤醒等待的线程
+
+    取代轮询：线程用 wait_for 等待条件成立，或用 wait_change 等待任意变化。
+    """
+
+    def __init__(self, **values):
+        self.values = values
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def get(self, key):
+        with self.condition:
+            return self.values[key]
+
+    def set(self, key, value):
+        """修改状态，值不变时不通知"""
+        with self.condition:
+            if key in self.values and self.values[key] == value:
+                return
+            self.values[key] = value
+            self.version += 1
+            self.condition.notify_all()
+
+    def touch(self):
+        """状态值不变但需要唤醒等待者 (有新的实时文本等)"""
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def snapshot(self):
+        """返回 (版本号, 状态副本)"""
+        with self.condition:
+            return self.version, dict(self.values)
+
+    def wait_for(self, predicate, timeout=None):
+        """等待 predicate(状态) 为真，超时返回 False"""
+        with self.condition:
+            return self.condition.wait_for(lambda: predicate(self.values), timeout)
+
+    def wait_change(self, version, timeout=None):
+        """等待版本号不同于 version，返回 (版本号, 状态副本)"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version, dict(self.values)
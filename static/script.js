@@ -15,6 +15,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const nextPageButton = document.getElementById('nextPageButton');
     const pageInput = document.getElementById('pageInput');
     const jumpPageButton = document.getElementById('jumpPageButton');
+    const archiveToggle = document.getElementById('archiveToggle');
     const themeToggleButton = document.getElementById('themeToggleButton');
 
     const chatInterface = document.getElementById('chatInterface');
@@ -375,7 +376,8 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         try {
-            const res = await fetch('/records');
+            const showArchive = archiveToggle && archiveToggle.checked;
+            const res = await fetch(showArchive ? '/records?archive=1' : '/records');
             if (!res.ok) {
                 let errorMsg = `HTTP 错误! 状态: ${res.status}`;
                 try {
@@ -595,6 +597,12 @@ document.addEventListener('DOMContentLoaded', () => {
     if (prevPageButton) prevPageButton.addEventListener('click', () => changePage(-1));
     if (nextPageButton) nextPageButton.addEventListener('click', () => changePage(1));
     if (jumpPageButton) jumpPageButton.addEventListener('click', jumpToPage);
+    if (archiveToggle) {
+        archiveToggle.addEventListener('change', () => {
+            currentPage = 1; // 切换数据源后回到第一页
+            fetchRecords();
+        });
+    }
     if (pageInput) {
         pageInput.addEventListener('keypress', (event) => {
             if (event.key === 'Enter') {
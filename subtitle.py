@@ -0,0 +1,121 @@
+import json
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+
+ADDRESS_ENV = "VTUBER_SUBTITLE_ADDRESS" # word.py 子进程从这个环境变量读取通道地址
+QUEUE_SIZE = 10000 # 字幕窗口未连接时最多暂存的消息数
+
+# 主进程发送的消息类型：begin 一轮回复开始，delta 回复文本增量，end 一轮回复结束
+# 字幕窗口发送的消息类型：stats 帧数、重绘次数和延迟统计
+
+class SubtitleChannel:
+    """主进程一侧的字幕通道：本地监听 (Unix 套接字 / Windows 命名管道)，按顺序把带长度前缀的消息发给字幕窗口
+
+    取代 backup.txt 轮询：消息不会丢失或重复，并带有轮次边界和发送时间戳。
+    字幕窗口断开后等待重新连接，期间的消息暂存在有界队列中，队列满时丢弃并计数。
+    """
+
+    def __init__(self, address=None):
+        self.listener = Listener(address) # 默认地址：Unix 上为临时目录中的套接字，Windows 上为命名管道
+        self.address = self.listener.address
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.turn = 0 # 当前轮次编号
+        self.in_turn = False # 是否在一轮回复中
+        self.connected = False
+        self.window_stats = {} # 字幕窗口最近一次上报的统计
+        self.counters = {
+            "sent": 0, # 已发送的消息
+            "dropped": 0, # 队列满时丢弃的消息
+            "connects": 0, # 字幕窗口连接次数
+        }
+        threading.Thread(target=self._sender, daemon=True).start()
+
+    def env(self):
+        """返回带有通道地址的环境变量，用于启动 word.py"""
+        return {**os.environ, ADDRESS_ENV: self.address}
+
+    def delta(self, text):
+        """发送回复文本增量，本轮的第一个增量前先发送 begin"""
+        with self.lock:
+            if not self.in_turn:
+                self.turn += 1
+                self.in_turn = True
+                self._put("begin")
+            self._put("delta", text)
+
+    def end(self):
+        """本轮回复结束"""
+        with self.lock:
+            if self.in_turn:
+                self.in_turn = False
+                self._put("end")
+
+    def stats(self):
+        """返回计数器和队列中等待发送的消息数"""
+        data = dict(self.counters)
+        data["queued"] = self.queue.qsize()
+        data["connected"] = int(self.connected)
+        return data
+
+    def _put(self, kind, text=""):
+        message = {"type": kind, "turn": self.turn, "text": text, "ts": time.time()}
+        try:
+            self.queue.put_nowait(json.dumps(message, ensure_ascii=False).encode("utf-8"))
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    def _sender(self):
+        """等待字幕窗口连接，按顺序发送队列中的消息"""
+        conn = None
+        while True:
+            data = self.queue.get() # 阻塞等待，无需轮询
+            while True:
+                if conn is None:
+                    conn = self.listener.accept()
+                    self.connected = True
+                    self.counters["connects"] += 1
+                    threading.Thread(target=self._reader, args=(conn,), daemon=True).start()
+                try:
+                    conn.send_bytes(data)
+                    self.counters["sent"] += 1
+                    break
+                except OSError: # 字幕窗口已退出，等待重新连接后重发这条消息
+                    conn.close()
+                    conn = None
+                    self.connected = False
+
+    def _reader(self, conn):
+        """接收字幕窗口上报的统计，连接断开时结束"""
+        try:
+            while True:
+                message = json.loads(conn.recv_bytes())
+                if message.get("type") == "stats":
+                    self.window_stats = message["stats"]
+        except (EOFError, OSError):
+            pass
+
+def connect(address=None):
+    """字幕窗口一侧：连接主进程的通道"""
+    return Client(address or os.environ[ADDRESS_ENV])
+
+def receive(conn):
+    """逐条返回主进程发送的消息 (附加接收时间 received)，主进程退出时结束"""
+    try:
+        while True:
+            message = json.loads(conn.recv_bytes())
+            message["received"] = time.time()
+            yield message
+    except (EOFError, OSError):
+        return
+
+def report(conn, stats):
+    """字幕窗口上报统计，返回是否发送成功"""
+    try:
+        conn.send_bytes(json.dumps({"type": "stats", "stats": stats}).encode("utf-8"))
+        return True
+    except OSError:
+        return False
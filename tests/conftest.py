@@ -0,0 +1,56 @@
+import os
+import sys
+import shutil
+import sqlite3
+import atexit
+import tempfile
+import pytest
+
+# 测试在临时目录中运行：memory.py 导入时会在当前目录打开 chat_memory.db
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="vtuber_test_")
+os.chdir(WORK_DIR)
+atexit.register(shutil.rmtree, WORK_DIR, True) # 在 database.close_db 之后执行
+sys.path.insert(0, ROOT)
+os.environ.setdefault("AUDIO_SINK", "null") # 不使用音频设备
+os.environ.setdefault("AUDIO_SOURCE", "none")
+
+import database
+import memory
+from scheduler import QuestionScheduler
+
+class CommitFailure:
+    """fail_commit 设为 True 时，下一次 COMMIT 失败"""
+    fail_commit = False
+
+class FailingConnection:
+    """包装写连接，按 CommitFailure 让 COMMIT 失败"""
+
+    def __init__(self, conn, failure):
+        self.conn = conn
+        self.failure = failure
+
+    def execute(self, sql, *args):
+        if sql == "COMMIT" and self.failure.fail_commit:
+            self.failure.fail_commit = False
+            raise sqlite3.OperationalError("disk I/O error")
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """每个测试一个新数据库，返回 CommitFailure (对测试中重新打开的数据库同样有效)"""
+    failure = CommitFailure()
+    connect = database._connect
+
+    def failing_connect(path, readonly=False):
+        conn = connect(path, readonly)
+        return conn if readonly else FailingConnection(conn, failure)
+
+    monkeypatch.setattr(database, "_connect", failing_connect)
+    monkeypatch.setattr(memory, "question_scheduler", QuestionScheduler()) # 不带上一个测试的公平性状态
+    memory.init_db(str(tmp_path / "chat_memory.db"))
+    yield failure
+    database.close_db()
@@ -0,0 +1,107 @@
+import os
+import json
+import sys
+import time
+import pytest
+import database
+import memory
+import prompt
+from mock_realtime import MockRealtimeServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+@pytest.fixture(scope="module")
+def server():
+    """chat.py 导入时连接模拟服务器，整个模块共用"""
+    server = MockRealtimeServer(port=0, token_ms=5, first_delay_ms=300, audio_ms_per_token=20).start()
+    os.environ["OPENAI_WS_URL"] = server.url
+    prompt.ROLEPLAY_FILE = os.path.join(ROOT, "roleplay.txt")
+    import chat
+    yield server
+    chat.supervisor.close()
+    server.shutdown()
+
+@pytest.fixture
+def chat(server, db):
+    """已连接且有备用连接的 chat 模块"""
+    chat = sys.modules["chat"]
+    assert wait_until(lambda: chat.supervisor.connected and chat.supervisor.standby is not None)
+    return chat
+
+def answers():
+    return database.read("SELECT answered, response FROM chat_records ORDER BY id")
+
+def drop_active(server, chat):
+    """断开当前活动连接"""
+    return server.drop(chat.supervisor.active.sock.sock.getsockname())
+
+def test_turn_is_answered(chat, server):
+    from tracing import tracer
+    turns = tracer.turns
+    memory.save_chat_record("观众", "live_message", "主播晚上好")
+    assert chat.construct_message()
+    assert chat.processing()
+    assert wait_until(lambda: not chat.processing())
+
+    assert answers() == [(1, server.last_turn["reply"])]
+    assert tracer.turns == turns + 1
+    assert chat.current_turn is None and chat.mic_status()
+    assert not chat.construct_message() # 没有待回答的问题
+
+def test_failover_before_audio_resends_turn(chat, server):
+    failovers = chat.supervisor.stats()["failovers"]
+    memory.save_chat_record("观众", "live_message", "今天播什么")
+    assert chat.construct_message()
+    assert drop_active(server, chat) == 1 # 回复还没开始 (first_delay_ms)
+    assert wait_until(lambda: not chat.processing())
+
+    assert chat.supervisor.stats()["failovers"] == failovers + 1
+    assert answers() == [(1, server.last_turn["reply"])] # chat.on_failover 在备用连接上重发了请求
+
+def test_failover_after_audio_aborts_turn(chat, server, monkeypatch):
+    from tracing import tracer
+    monkeypatch.setattr(server, "token_ms", 100) # 放慢回复，确保断开时还在播放本轮
+    turns = tracer.turns
+    memory.save_chat_record("观众", "live_message", "唱首歌吧")
+    assert chat.construct_message()
+    assert wait_until(lambda: chat.turn_audio)
+    assert drop_active(server, chat) == 1
+    assert wait_until(lambda: not chat.processing())
+
+    assert answers() == [(0, None)] # 已播放部分音频，不重发，问题保持未回答
+    assert chat.current_turn is None and chat.mic_status()
+    assert tracer.turns == turns
+    assert memory.get_records()[0][0]["question"] == "唱首歌吧" # 之后重新调度
+
+def test_emotion_request_is_out_of_band(server):
+    records = [{"user_id": "观众", "question": "主播晚上好", "answered": False}]
+    request = json.loads(prompt.Turn.from_records(records).with_assistant("晚上好").emotion_request(7))["response"]
+    assert request["conversation"] == "none" # 不占用默认对话，也不写入对话历史
+    assert request["metadata"] == {"turn": "7"}
+    assert request["input"][-1]["content"][0]["text"] == prompt.EMOTION_PROMPT
+
+def test_stale_emotion_refinement_is_dropped(chat, server, monkeypatch):
+    monkeypatch.setattr(chat, "EMOTION_MODE", "refine")
+    monkeypatch.setattr(server, "script", {"turns": [{"reply": "好的。", "emotion": "脸黑"}]}) # 本地识别为 "无"
+    hostkeys = []
+    monkeypatch.setattr(chat, "send_host_key", lambda key: hostkeys.append((chat.turn_number, key)))
+    memory.save_chat_records([("观众1", "live_message", "主播晚上好"), ("观众2", "live_message", "唱首歌吧")])
+
+    assert chat.construct_message()
+    assert wait_until(lambda: not chat.processing())
+    first = chat.turn_number
+    assert chat.construct_message() # 第一轮的远端识别还没返回 (first_delay_ms) 就开始下一轮
+    assert wait_until(lambda: not chat.processing())
+    assert wait_until(lambda: (first + 1, "脸黑") in hostkeys) # 第二轮自己的修正
+    time.sleep(0.4)
+
+    assert [key for key in hostkeys if key[1] == "脸黑"] == [(first + 1, "脸黑")] # 第一轮的修正已过期，没有触发
+    assert [row[0] for row in answers()] == [1, 1]
@@ -0,0 +1,67 @@
+import json
+import threading
+import time
+from connection import RealtimeSupervisor
+from mock_realtime import MockRealtimeServer
+
+SESSION = json.dumps({"type": "session.update", "session": {}})
+CHAT_REQUEST = json.dumps({"type": "response.create", "response": {"modalities": ["audio", "text"]}})
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_failover_replays_turn_on_standby():
+    server = MockRealtimeServer(port=0, token_ms=1, first_delay_ms=0, audio_ms_per_token=10).start()
+    done = threading.Event()
+    transcripts = []
+    failovers = []
+
+    def on_message(ws, message):
+        event = json.loads(message)
+        if event["type"] == "response.audio_transcript.done":
+            transcripts.append((ws, event["transcript"]))
+            done.set()
+
+    def on_failover(connected): # 与 chat.on_failover 相同：有新连接时重发本轮请求
+        failovers.append(connected)
+        if connected:
+            supervisor.send(CHAT_REQUEST)
+
+    supervisor = RealtimeSupervisor(server.url, [], SESSION, on_message, on_failover).start()
+    try:
+        assert wait_until(lambda: supervisor.connected and supervisor.standby is not None)
+        first, standby = supervisor.active, supervisor.standby
+
+        assert server.drop(first.sock.sock.getsockname()) == 1 # 活动连接中断，本轮回复还没有收到
+        assert wait_until(lambda: failovers)
+        assert failovers == [True]
+        assert supervisor.active is standby
+        assert done.wait(5)
+        assert transcripts[0][0] is standby and transcripts[0][1]
+
+        stats = supervisor.stats()
+        assert stats["failovers"] == 1 and stats["drops"] == 1
+        assert wait_until(lambda: supervisor.standby is not None) # 在后台补充新的备用连接
+        assert supervisor.stats()["connects"] == 3
+    finally:
+        supervisor.close()
+        server.shutdown()
+
+def test_reconnects_without_standby():
+    server = MockRealtimeServer(port=0, token_ms=1, first_delay_ms=0, audio_ms_per_token=10).start()
+    failovers = []
+    supervisor = RealtimeSupervisor(server.url, [], SESSION, lambda ws, message: None, failovers.append, standby=False).start()
+    try:
+        assert wait_until(lambda: supervisor.connected)
+        assert server.drop() == 1
+        assert wait_until(lambda: len(failovers) == 2) # 先报告断开，重连后再报告恢复
+        assert failovers == [False, True]
+        assert supervisor.connected and supervisor.stats()["reconnects"] == 1
+    finally:
+        supervisor.close()
+        server.shutdown()
@@ -0,0 +1,147 @@
+import random
+import sqlite3
+import time
+import pytest
+import memory
+from fixtures import legacy_next_id
+
+def test_commit_failure_keeps_indexes(db):
+    memory.save_chat_records([("观众1", "live_message", "主播晚上好")])
+    first = memory.question_scheduler.peek()
+
+    db.fail_commit = True
+    with pytest.raises(sqlite3.OperationalError):
+        memory.save_chat_records([("观众2", "stt_message", "今天唱什么歌"), ("观众3", "live_message", "这个游戏叫什么")])
+
+    records, ids = memory.get_records() # 回滚的语音问题优先级更高，不能留在调度器里
+    assert ids == [first]
+    assert records[0]["question"] == "主播晚上好"
+    assert len(memory.question_scheduler) == 1
+    assert len(memory.pending_index) == 1
+
+    memory.save_chat_records([("观众2", "live_message", "今天唱什么歌")]) # 回滚的 ID 和去重索引已撤销
+    assert [rec["id"] for rec in memory.fetch_records()] == [1, 2]
+
+def test_commit_failure_keeps_answered_question(db):
+    memory.save_chat_records([("观众1", "live_message", "主播晚上好"), ("观众2", "live_message", "唱首歌吧")])
+    records, ids = memory.get_records()
+
+    db.fail_commit = True
+    with pytest.raises(sqlite3.OperationalError):
+        memory.update_chat_response(ids, "晚上好呀")
+
+    assert memory.get_records()[1] == ids # 回答没有保存，问题仍然待回答
+    assert len(memory.recall_index) == 0
+    memory.update_chat_response(ids, "晚上好呀")
+    assert len(memory.recall_index) == 1
+    assert memory.get_records()[1] != ids
+
+def test_failed_task_rolls_back_alone(db):
+    def broken(conn):
+        memory._save_chat_records(conn, [("观众2", "stt_message", "今天唱什么歌")])
+        raise ValueError("任务出错")
+
+    future = memory.database.submit_write(broken)
+    memory.save_chat_records([("观众1", "live_message", "主播晚上好")])
+    with pytest.raises(ValueError):
+        future.result()
+
+    assert [rec["question"] for rec in memory.fetch_records()] == ["主播晚上好"]
+    assert memory.get_records()[0][0]["question"] == "主播晚上好"
+
+def cluster_rows():
+    return memory.database.read("SELECT id, representative FROM question_clusters ORDER BY id")
+
+def test_commit_failure_keeps_cluster_index(db):
+    memory.save_chat_records([("观众1", "live_message", "主播晚上好")])
+
+    db.fail_commit = True
+    with pytest.raises(sqlite3.OperationalError):
+        memory.save_chat_records([("观众2", "live_message", "这个游戏叫什么")]) # 新建的簇随事务回滚
+    assert sorted(memory.cluster_index.items) == [row[0] for row in cluster_rows()]
+
+    memory.save_chat_records([("观众3", "live_message", "这个游戏叫什么呀")])
+    records, ids = memory.get_records()
+    memory.update_chat_response(ids, "晚上好呀")
+    assert memory.get_records()[1] == [2] # 与回滚的问题相似，但必须分到真实存在的簇
+    assert sorted(memory.cluster_index.items) == [row[0] for row in cluster_rows()]
+
+def test_commit_failure_restores_released_cluster(db):
+    memory.save_chat_records([("观众1", "live_message", "主播晚上好"), ("观众2", "live_message", "唱首歌吧")])
+    records, ids = memory.get_records()
+
+    db.fail_commit = True
+    with pytest.raises(sqlite3.OperationalError):
+        memory.update_chat_response(ids, "晚上好呀") # 删除的簇随事务回滚
+    assert sorted(memory.cluster_index.items) == [row[0] for row in cluster_rows()]
+
+    memory.save_chat_records([("观众3", "live_message", records[0]["question"] + "呀")])
+    assert len(memory.get_records()[1]) == 2 # 重复问题并入原来的簇
+
+def test_rebuild_rollback_restores_cluster_index(db):
+    memory.save_chat_records([("观众1", "live_message", "主播晚上好"), ("观众2", "live_message", "唱首歌吧")])
+    before = dict(memory.cluster_index.items)
+
+    db.fail_commit = True
+    with pytest.raises(sqlite3.OperationalError):
+        memory.rebuild_clusters()
+    assert memory.cluster_index.items == before
+
+def answer_all(count, response=""):
+    questions = ["".join(chr(0x4E00 + i * 8 + k) for k in range(8)) for i in range(count)] # 互不相似
+    memory.save_chat_records([(f"观众{i}", "live_message", question) for i, question in enumerate(questions)])
+    while True:
+        records, ids = memory.get_records()
+        if not ids:
+            break
+        memory.update_chat_response(ids, response)
+
+def test_archive_resumes_after_partial_move(db, tmp_path):
+    memory.init_db(str(tmp_path / "live.db"), str(tmp_path / "archive.db"))
+    answer_all(5)
+    cutoff = time.time() + 1
+    memory.database.execute_write(lambda conn: memory._copy_to_archive(conn, cutoff)) # 复制后、删除前崩溃
+
+    assert memory.archive_records(max_age=-1) == 5
+    assert sorted(rec["id"] for rec in memory.fetch_records(archive=True)) == [1, 2, 3, 4, 5]
+    assert memory.fetch_records() == []
+    assert memory.archive_records(max_age=-1) == 0
+
+def test_vacuum_only_with_free_pages(db, tmp_path):
+    memory.init_db(str(tmp_path / "live.db"), str(tmp_path / "archive.db"))
+    answer_all(50, "回复" * 2000)
+    vacuum = lambda: memory.database.submit_write(memory._vacuum, transactional=False).result()
+    assert vacuum() == []
+
+    memory.archive_records(max_age=-1) # 主库空出大量页
+    assert vacuum() == ["main"]
+    assert vacuum() == []
+
+def test_id_allocator_reuses_smallest_gap():
+    allocator = memory.IdAllocator()
+    allocator.reset([1, 2, 5, 7])
+    assert [allocator.allocate() for _ in range(4)] == [3, 4, 6, 8]
+    allocator.release(2)
+    allocator.release(2)
+    assert [allocator.allocate() for _ in range(2)] == [2, 9]
+
+@pytest.mark.parametrize("seed", range(3))
+def test_ids_match_gap_scan(db, tmp_path, seed):
+    rng = random.Random(seed)
+    path = str(tmp_path / "chat_memory.db")
+    for step in range(400):
+        used_ids = [row[0] for row in memory.database.read("SELECT id FROM chat_records ORDER BY id")]
+        if used_ids and rng.random() < 0.4:
+            memory.update_chat_response(rng.sample(used_ids, rng.randint(1, min(5, len(used_ids)))), "回复") # 保留一条，删除其余
+            continue
+        if step % 97 == 0:
+            memory.init_db(path) # 模拟重启，从表恢复分配器
+        if rng.random() < 0.05:
+            db.fail_commit = True
+            with pytest.raises(sqlite3.OperationalError):
+                memory.save_chat_record("user", "stt_message", f"失败{step}") # 回滚后 ID 归还
+
+        question = f"问题{step}"
+        expected = legacy_next_id(used_ids)
+        memory.save_chat_record("user", "stt_message", question)
+        assert memory.database.read("SELECT id FROM chat_records WHERE question = ?", (question,))[0][0] == expected
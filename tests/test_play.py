@@ -0,0 +1,76 @@
+import time
+from play import RingBuffer, AudioPlayer, NullSink, ms_to_bytes
+
+def pcm(ms, value=1):
+    return bytes([value, 0]) * (ms_to_bytes(ms) // 2)
+
+def play(player, parts, timeout=5):
+    """按 (音频, 之后等待的秒数) 送入音频，播放完后返回统计"""
+    for data, pause in parts:
+        player.add_pcm(data)
+        time.sleep(pause)
+    player.end_stream()
+    deadline = time.monotonic() + timeout
+    while player.is_playing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = player.stats()
+    player.stop()
+    return stats
+
+def test_ring_buffer_wraps():
+    ring = RingBuffer(8)
+    ring.write(b"abcdef")
+    assert ring.read(4) == b"abcd"
+    ring.write(b"ghijk") # 跨过末尾写回开头
+    assert ring.start + len(ring) > len(ring.buffer)
+    assert len(ring.buffer) == 8
+    assert ring.read(100) == b"efghijk"
+    assert len(ring) == 0
+
+def test_ring_buffer_grows_and_keeps_order():
+    ring = RingBuffer(8)
+    ring.write(b"012345")
+    ring.read(5)
+    ring.write(b"abcdefghijklmnopqrst") # 环绕状态下扩容
+    assert len(ring.buffer) == 32
+    assert ring.read(3) == b"5ab"
+    ring.write(b"uv")
+    assert ring.read(100) == b"cdefghijklmnopqrstuv"
+
+def test_steady_stream_has_no_underruns():
+    stats = play(AudioPlayer(sink=NullSink(), prebuffer_ms=40), [(pcm(300), 0)])
+    assert stats["underruns"] == 0
+    assert stats["silence_ms"] == 0
+    assert stats["played_ms"] == 300
+    assert stats["streams"] == 1
+
+def test_stall_counts_underrun_and_raises_target():
+    sink = NullSink()
+    player = AudioPlayer(sink=sink, prebuffer_ms=40, max_prebuffer_ms=200)
+    stats = play(player, [(pcm(60), 0.25), (pcm(200), 0)]) # 第一段播完后停顿
+    assert stats["underruns"] == 1
+    assert stats["silence_ms"] >= 100 # 停顿期间补静音
+    assert stats["played_ms"] == 260
+    assert stats["target_ms"] == 80
+    assert sink.bytes_written >= ms_to_bytes(260 + 100)
+
+def test_zero_target_never_adapts():
+    player = AudioPlayer(sink=NullSink(), prebuffer_ms=0, max_prebuffer_ms=0)
+    stats = play(player, [(pcm(40), 0.15)] * 3)
+    assert stats["underruns"] >= 2
+    assert stats["target_ms"] == 0
+    assert stats["played_ms"] == 120
+
+def test_timeout_plays_remaining_audio():
+    player = AudioPlayer(sink=NullSink(), prebuffer_ms=100)
+    player.add_pcm(pcm(150))
+    time.sleep(0.4) # 第一段播完后停顿
+    player.add_pcm(pcm(80)) # 不足缓冲目标，且不调用 end_stream
+    deadline = time.monotonic() + 5
+    while player.is_playing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = player.stats()
+    player.stop()
+    assert stats["underruns"] == 1
+    assert stats["played_ms"] == 230
+    assert stats["buffered_ms"] == 0
@@ -0,0 +1,33 @@
+from recall import RecallIndex
+
+PAIRS = [
+    ("主播晚上好", "晚上好呀，欢迎来到直播间"),
+    ("今天播什么游戏", "今天玩恐怖游戏"),
+    ("唱首歌吧", "那就唱一首小星星"),
+    ("主播吃饭了吗", "刚吃完晚饭"),
+]
+
+def build():
+    index = RecallIndex()
+    for record_id, (question, response) in enumerate(PAIRS):
+        index.add(record_id, "live_message", question, response)
+    index.add(len(PAIRS), "gift", "谢谢礼物", "谢谢老板的礼物")
+    return index
+
+def test_finds_related_pair_first():
+    index = build()
+    assert index.search("主播晚上好呀")[0][0] == 0
+    assert index.search("今天玩什么游戏")[0][0] == 1
+
+def test_unrelated_query_returns_nothing():
+    index = build()
+    assert index.search("量子计算机的纠错码原理") == []
+    assert index.search("晚饭吃的什么量子计算机纠错码原理研究") == [] # 只有少量词项偶然相同
+
+def test_event_type_and_remove():
+    index = build()
+    assert index.search("谢谢礼物", event_type="live_message") == []
+    assert [record_id for record_id, _ in index.search("谢谢礼物", event_type="gift")] == [len(PAIRS)]
+    index.remove(0)
+    assert all(record_id != 0 for record_id, _ in index.search("主播晚上好"))
+    assert len(index) == len(PAIRS)
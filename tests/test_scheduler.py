@@ -0,0 +1,100 @@
+import random
+from scheduler import QuestionScheduler
+from tracing import quantile
+
+def answer_all(scheduler, now=0.0, service_time=1.0):
+    """依次回答全部问题，返回回答顺序"""
+    order = []
+    while (record_id := scheduler.peek()) is not None:
+        order.append(record_id)
+        now += service_time
+        scheduler.complete([record_id], now)
+    return order
+
+def test_voice_before_chat():
+    scheduler = QuestionScheduler()
+    scheduler.add(1, "观众1", "live_message", 0, created_at=0)
+    scheduler.add(2, "Niama78", "stt_message", 0, created_at=500)
+    assert scheduler.peek() == 2
+
+def test_gift_jumps_ahead_by_value():
+    scheduler = QuestionScheduler(gift_weight=0.01)
+    scheduler.add(1, "观众1", "live_message", 0, created_at=0)
+    scheduler.add(2, "观众2", "live_message", 5200, created_at=40) # 加分 52 秒
+    scheduler.add(3, "观众3", "live_message", 1000, created_at=20) # 加分 10 秒，仍晚于观众1
+    assert answer_all(scheduler, now=60) == [2, 1, 3]
+
+def test_spammer_does_not_take_over():
+    scheduler = QuestionScheduler(fairness_delay=30)
+    for i in range(10):
+        scheduler.add(i + 1, "刷屏用户", "live_message", 0, created_at=i)
+    scheduler.add(11, "观众1", "live_message", 0, created_at=5)
+    scheduler.add(12, "观众2", "live_message", 0, created_at=8)
+    assert answer_all(scheduler, now=10)[:4] == [1, 11, 12, 2]
+
+def test_fifo_without_weights():
+    scheduler = QuestionScheduler(gift_weight=0, fairness_delay=0)
+    for record_id, created_at in [(3, 2), (1, 0), (2, 1)]:
+        scheduler.add(record_id, "刷屏用户", "live_message", 1000, created_at=created_at)
+    assert answer_all(scheduler, now=3) == [1, 2, 3]
+
+def simulate(scheduler, seed, duration=3600, service_time=6.0):
+    """普通观众 (平均每 10 秒 1 条，其中 1/5 带礼物) 和刷屏用户 (每秒 2 条) 混合负载，返回 {类别: [等待秒数]}"""
+    rng = random.Random(seed)
+    arrivals = []
+    for second in range(duration):
+        if rng.random() < 0.1:
+            kind, gift = ("礼物", 5200) if rng.random() < 0.2 else ("普通", 0)
+            arrivals.append((second + rng.random(), f"观众{rng.randint(1, 300)}", gift, kind))
+        for _ in range(2):
+            arrivals.append((second + rng.random(), "刷屏用户", 0, "刷屏"))
+    arrivals.sort()
+
+    waits, pending, index, now = {}, {}, 0, 0.0
+    while now < duration:
+        while index < len(arrivals) and arrivals[index][0] <= now:
+            created_at, user_id, gift, kind = arrivals[index]
+            index += 1
+            scheduler.add(index, user_id, "live_message", gift, created_at)
+            pending[index] = (created_at, kind)
+        record_id = scheduler.peek()
+        if record_id is None:
+            now = arrivals[index][0]
+            continue
+        created_at, kind = pending.pop(record_id)
+        waits.setdefault(kind, []).append(now - created_at)
+        now += service_time
+        scheduler.complete([record_id], now)
+    return waits
+
+def median(values):
+    return quantile(values, 0.5)
+
+def test_wait_distribution_under_load():
+    for seed in range(3):
+        fifo = simulate(QuestionScheduler(gift_weight=0, fairness_delay=0), seed)
+        fair = simulate(QuestionScheduler(), seed)
+        assert len(fair["普通"]) > 5 * len(fifo["普通"]) # 刷屏用户只用剩余的回答时间
+        assert median(fair["普通"]) < 30 # 其他观众不被刷屏挤占
+        assert median(fifo["普通"]) > 10 * median(fair["普通"])
+        assert median(fair["礼物"]) <= median(fair["普通"])
+
+def test_fairness_state_stays_bounded():
+    scheduler = QuestionScheduler(fairness_delay=30)
+    for i in range(1000): # 每 10 秒一个新用户，问一次后不再出现
+        scheduler.add(i, f"观众{i}", "live_message", 0, created_at=i * 10)
+        assert scheduler.peek() == i
+        scheduler.complete([i], now=i * 10 + 1)
+    assert len(scheduler.user_vtime) <= 4 # 只剩最近 fairness_delay 秒内被回答的用户
+    assert len(scheduler.vtime_heap) <= 4
+
+def test_fairness_state_kept_while_user_has_questions():
+    scheduler = QuestionScheduler(fairness_delay=30)
+    scheduler.add(1, "刷屏用户", "live_message", 0, created_at=0)
+    scheduler.add(2, "刷屏用户", "live_message", 0, created_at=1)
+    scheduler.complete([scheduler.peek()], now=2)
+    scheduler.add(3, "观众1", "live_message", 0, created_at=100) # 虚拟时间已到期，但刷屏用户还有问题排队
+    assert "刷屏用户" in scheduler.user_vtime
+    scheduler.complete([2], now=101)
+    scheduler.add(4, "观众2", "live_message", 0, created_at=200)
+    assert "刷屏用户" not in scheduler.user_vtime
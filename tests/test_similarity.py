@@ -0,0 +1,37 @@
+import random
+import pytest
+from rapidfuzz import fuzz
+from similarity import CharIndex
+
+ALPHABET = "主播晚上好今天唱什么歌吧可爱游戏"
+
+def random_text(rng):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 8)))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_candidates_match_linear_scan(seed):
+    rng = random.Random(seed)
+    index = CharIndex()
+    texts = {}
+    for item_id in range(300):
+        key = rng.choice(["a", "b"])
+        texts[item_id] = (key, random_text(rng))
+        index.add(key, item_id, texts[item_id][1])
+    for item_id in rng.sample(sorted(texts), 50):
+        index.remove(item_id)
+        del texts[item_id]
+
+    for _ in range(200):
+        key, query = rng.choice(["a", "b"]), random_text(rng)
+        expected = [item_id for item_id, (item_key, text) in sorted(texts.items())
+                    if item_key == key and fuzz.ratio(query, text) >= 50]
+        candidates = index.candidates(key, query)
+        assert [item_id for item_id in candidates if fuzz.ratio(query, index.text(item_id)) >= 50] == expected
+
+def test_none_text_is_not_indexed():
+    index = CharIndex()
+    index.add("a", 1, None)
+    index.add("a", 2, "")
+    assert len(index) == 1
+    assert index.candidates("a", None) == []
+    assert index.candidates("a", "") == [2]
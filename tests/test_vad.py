@@ -0,0 +1,63 @@
+from vad import VoiceActivityDetector, EVENT_HISTORY
+from fixtures import vad_audio, VAD_SEGMENTS as SEGMENTS
+
+RATE = 24000
+CHUNK = 1024
+
+def fixture_audio():
+    return vad_audio(RATE)
+
+def chunks(pcm):
+    return [pcm[i:i + CHUNK * 2] for i in range(0, len(pcm), CHUNK * 2)]
+
+def chunk_time(index):
+    return index * CHUNK / RATE
+
+def run(detector, pcm):
+    return b"".join(b"".join(detector.process(chunk)) for chunk in chunks(pcm))
+
+def test_keeps_speech_and_drops_silence():
+    detector = VoiceActivityDetector(RATE, CHUNK)
+    pcm = fixture_audio()
+    sent = run(detector, pcm)
+
+    for index, chunk in enumerate(chunks(pcm)):
+        start, end = chunk_time(index), chunk_time(index + 1)
+        if any(seg_start <= start and end <= seg_end for seg_start, seg_end in SEGMENTS):
+            assert chunk in sent, f"{start:.2f}s 的语音没有发送"
+        elif all(end + 0.5 < seg_start or start > seg_end + 0.5 for seg_start, seg_end in SEGMENTS):
+            assert chunk not in sent, f"{start:.2f}s 的静音被发送" # 离语音段 0.5 秒以外 (含嘶声)
+    assert detector.bytes_sent == len(sent) < 0.7 * detector.bytes_in
+
+    starts = [ms for event, ms in detector.events if event == "speech_start"]
+    assert len(starts) == len(SEGMENTS)
+    assert all(0 <= ms - start * 1000 < 200 for ms, (start, _) in zip(starts, SEGMENTS))
+    assert [event for event, _ in detector.events].count("speech_stop") == len(SEGMENTS)
+
+def test_batches_are_larger_than_chunks():
+    detector = VoiceActivityDetector(RATE, CHUNK, batch_ms=200)
+    batches = [batch for chunk in chunks(fixture_audio()) for batch in detector.process(chunk)]
+    assert max(len(batch) for batch in batches) == int(RATE * 0.2) * 2
+    assert len(batches) < detector.bytes_sent / (CHUNK * 2)
+
+def test_reset_discards_audio_from_before_the_pause():
+    detector = VoiceActivityDetector(RATE, CHUNK)
+    pcm = fixture_audio()
+    before = pcm[int(RATE * 1.0) * 2:int(RATE * 1.3) * 2] # 语音开始，进入说话状态但还不满一批
+    run(detector, before)
+    assert detector.speaking
+
+    detector.reset() # 麦克风暂停 (播放中)，之后重新开启
+    assert not detector.speaking and not detector.preroll and not detector.pending
+    assert detector.events[-1][0] == "speech_stop"
+
+    after = run(detector, pcm[int(RATE * 4.0) * 2:int(RATE * 7.0) * 2])
+    assert after
+    assert not any(chunk in after for chunk in chunks(before))
+
+def test_event_history_is_bounded():
+    detector = VoiceActivityDetector(RATE, CHUNK)
+    pcm = fixture_audio()
+    for _ in range(EVENT_HISTORY):
+        run(detector, pcm)
+    assert len(detector.events) == EVENT_HISTORY
@@ -0,0 +1,154 @@
+import collections
+import json
+import logging
+import logging.handlers
+import threading
+import time
+
+TRACE_CAPACITY = 500 # 内存中保留的最近轮次数
+TRACE_LOG = "trace.log" # 轮次日志文件，按大小轮转
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 一轮对话的时间点，按发生顺序排列
+SPEECH_STAGES = ("speech_started", "speech_stopped", "transcription_completed") # 语音输入阶段，发生在轮次开始前
+STAGES = SPEECH_STAGES + (
+    "construct_message", # 开始构造请求 (轮次开始)
+    "response_create_sent", # response.create 已发送
+    "first_audio_delta", # 收到第一个音频增量
+    "first_sample_written", # 播放器写入第一个音频样本
+    "transcript_done", # 回复转录完成
+    "emotion_done", # 情绪动画已触发
+)
+
+logger = logging.getLogger("trace")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+handler = logging.handlers.RotatingFileHandler(TRACE_LOG, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                               encoding="utf-8", delay=True) # 首次写入时才创建文件
+handler.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(handler)
+
+def quantile(values, q):
+    """分位数 (最近秩)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+class TurnTracer:
+    """按轮次记录各阶段时间点，轮次以 chat_ids() 的记录 ID 标识
+
+    语音阶段发生在问题入库前，先暂存，下一轮开始时并入 (语音提问优先级最高，下一轮即是它)。
+    每个阶段只记录第一次出现的时间，结束的轮次进入环形缓冲并写入日志。
+    """
+
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.current = None # 进行中的轮次 {"ids", "started", "stamps"}
+        self.speech = {} # 暂存的语音阶段时间点
+        self.finished = collections.deque(maxlen=capacity)
+        self.turns = 0 # 累计结束的轮次
+        self.lock = threading.Lock()
+
+    def mark(self, stage, timestamp=None):
+        """记录阶段时间点，没有进行中的轮次时忽略 (语音阶段除外)"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if stage in SPEECH_STAGES:
+                self.speech.setdefault(stage, timestamp)
+            elif self.current is not None:
+                self.current["stamps"].setdefault(stage, timestamp)
+
+    def discard_speech(self):
+        """丢弃暂存的语音阶段 (转录为空等)"""
+        with self.lock:
+            self.speech.clear()
+
+    def begin(self, ids, timestamp=None):
+        """开始新一轮，未结束的上一轮直接丢弃"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            stamps = {}
+            if "transcription_completed" in self.speech: # 语音输入已完成才并入
+                stamps.update(self.speech)
+                self.speech.clear()
+            stamps["construct_message"] = timestamp
+            self.current = {"ids": list(ids), "started": timestamp, "stamps": stamps}
+
+    def abort(self):
+        """丢弃当前轮次 (连接中断等)"""
+        with self.lock:
+            self.current = None
+
+    def finish(self):
+        """结束当前轮次，返回其记录"""
+        with self.lock:
+            turn, self.current = self.current, None
+            if turn is None:
+                return None
+            record = self._record(turn)
+            self.finished.append(record)
+            self.turns += 1
+        logger.info(json.dumps(record, ensure_ascii=False))
+        return record
+
+    def _record(self, turn):
+        """轮次记录：各阶段相对最早时间点的毫秒数"""
+        stamps = turn["stamps"]
+        origin = min(stamps.values())
+        return {
+            "ids": turn["ids"],
+            "time": origin,
+            "stages": {stage: round((stamps[stage] - origin) * 1000, 3) for stage in STAGES if stage in stamps},
+            "total_ms": round((max(stamps.values()) - origin) * 1000, 3),
+        }
+
+    def traces(self, limit=None):
+        """最近结束的轮次，新的在前"""
+        with self.lock:
+            records = list(self.finished)
+        records.reverse()
+        return records[:limit] if limit else records
+
+    def summary(self):
+        """每个阶段 (及总耗时) 的样本数、总和与分位数，单位毫秒"""
+        with self.lock:
+            records = list(self.finished)
+        samples = {stage: [] for stage in STAGES + ("total",)}
+        for record in records:
+            for stage, value in record["stages"].items():
+                samples[stage].append(value)
+            samples["total"].append(record["total_ms"])
+        return {
+            stage: {
+                "count": len(values),
+                "sum": sum(values),
+                "quantiles": {q: quantile(values, q) for q in QUANTILES},
+            }
+            for stage, values in samples.items()
+        }
+
+    def prometheus(self, extra=None):
+        """Prometheus 文本格式：阶段耗时 summary，extra 为附加的 {指标名: (类型, 说明, {标签值: 数值})}"""
+        lines = [
+            "# HELP vtuber_turn_stage_seconds Time from the start of a turn to each stage.",
+            "# TYPE vtuber_turn_stage_seconds summary",
+        ]
+        for stage, data in self.summary().items():
+            for q, value in data["quantiles"].items():
+                lines.append(f'vtuber_turn_stage_seconds{{stage="{stage}",quantile="{q}"}} {value / 1000:.6f}')
+            lines.append(f'vtuber_turn_stage_seconds_sum{{stage="{stage}"}} {data["sum"] / 1000:.6f}')
+            lines.append(f'vtuber_turn_stage_seconds_count{{stage="{stage}"}} {data["count"]}')
+        lines += [
+            "# HELP vtuber_turns_total Finished turns.",
+            "# TYPE vtuber_turns_total counter",
+            f"vtuber_turns_total {self.turns}",
+        ]
+        for name, (kind, help_text, values) in (extra or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for label, value in values.items():
+                lines.append(f'{name}{{name="{label}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+tracer = TurnTracer() # 全局追踪器
@@ -0,0 +1,95 @@
+import collections
+import numpy as np
+
+EVENT_HISTORY = 100 # 保留的最近语音开始/结束事件数 (基准测试和测试统计检测延迟)
+
+class VoiceActivityDetector:
+    """本地语音活动检测：能量 + 过零率判断，带预录缓冲、拖尾和批量发送
+
+    process() 输入麦克风 PCM16 块，返回需要发送的音频块列表；静音段不发送。
+    """
+
+    def __init__(self, rate=24000, chunk=1024, preroll_ms=300, hangover_ms=400, batch_ms=200,
+                 start_chunks=2, min_energy=300.0, energy_ratio=3.0, max_zcr=0.35):
+        self.rate = rate
+        self.chunk_ms = chunk * 1000 / rate
+        self.preroll = collections.deque(maxlen=max(1, int(preroll_ms / self.chunk_ms))) # 语音开始前的音频
+        self.hangover_chunks = max(1, int(hangover_ms / self.chunk_ms)) # 语音结束后继续发送的块数
+        self.batch_bytes = int(rate * batch_ms / 1000) * 2 # 每次发送的字节数
+        self.start_chunks = start_chunks # 连续多少块判定为语音才开始
+        self.min_energy = min_energy # 最低能量阈值 (RMS)
+        self.energy_ratio = energy_ratio # 阈值为噪声基底的倍数
+        self.max_zcr = max_zcr # 过零率高于该值且能量不高时视为噪声
+
+        self.noise_floor = min_energy / energy_ratio
+        self.speaking = False
+        self.voiced_run = 0 # 连续语音块数
+        self.silent_run = 0 # 语音中连续静音块数
+        self.pending = bytearray() # 等待批量发送的音频
+        self.bytes_in = 0
+        self.bytes_sent = 0
+        self.events = collections.deque(maxlen=EVENT_HISTORY) # 最近的 (事件, 输入音频时间 ms)
+
+    def is_speech(self, pcm):
+        """单块判断：能量超过自适应阈值，且过零率不像噪声 (能量很高时忽略过零率)"""
+        samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+        if samples.size == 0:
+            return False
+        energy = float(np.sqrt(np.mean(samples * samples)))
+        zcr = float(np.count_nonzero(np.diff(np.signbit(samples)))) / samples.size
+        threshold = max(self.min_energy, self.noise_floor * self.energy_ratio)
+
+        speech = energy > threshold and (zcr < self.max_zcr or energy > threshold * 4)
+        if not speech and not self.speaking:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * energy # 只在静音时更新噪声基底
+        return speech
+
+    def reset(self):
+        """丢弃语音状态、预录缓冲和待发送音频，麦克风暂停后重新开始时调用 (保留噪声基底)"""
+        if self.speaking:
+            self._emit("speech_stop")
+        self.speaking = False
+        self.voiced_run = 0
+        self.silent_run = 0
+        self.preroll.clear()
+        self.pending.clear()
+
+    def _emit(self, event):
+        self.events.append((event, self.bytes_in / 2 * 1000 / self.rate))
+
+    def _flush(self, out, force=False):
+        """把满一批 (或强制) 的待发送音频放入输出"""
+        while len(self.pending) >= self.batch_bytes or (force and self.pending):
+            size = min(len(self.pending), self.batch_bytes)
+            out.append(bytes(self.pending[:size]))
+            del self.pending[:size]
+            self.bytes_sent += size
+
+    def process(self, pcm):
+        """处理一块麦克风音频，返回需要发送的音频块列表"""
+        self.bytes_in += len(pcm)
+        out = []
+        speech = self.is_speech(pcm)
+
+        if not self.speaking:
+            self.voiced_run = self.voiced_run + 1 if speech else 0
+            self.preroll.append(pcm)
+            if self.voiced_run >= self.start_chunks:
+                self.speaking = True
+                self.silent_run = 0
+                self._emit("speech_start")
+                for buffered in self.preroll: # 连同预录缓冲一起发送
+                    self.pending.extend(buffered)
+                self.preroll.clear()
+        else:
+            self.pending.extend(pcm)
+            self.silent_run = 0 if speech else self.silent_run + 1
+            if self.silent_run >= self.hangover_chunks: # 拖尾结束
+                self.speaking = False
+                self.voiced_run = 0
+                self._emit("speech_stop")
+                self._flush(out, force=True)
+                return out
+
+        self._flush(out)
+        return out
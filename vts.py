@@ -5,9 +5,14 @@ import threading
 import noise
 import random
 import time
+import asyncio
+import runtime
 
+VTS_URL = "ws://localhost:8001" # VTube Studio API 地址
+RECONNECT_DELAY = 1.0 # 线程模式下断开后等待多久再重连 (秒)
 ws_global = None # WebSocket 连接 
 token_global = None # 验证令牌
+parameter_task = None # asyncio 运行时下的参数循环
 
 current_angles = {"x": 0.0, "y": 0.0, "z": 0.0} 
 velocities = {"x": 0.0, "y": 0.0, "z": 0.0}  
@@ -84,20 +89,29 @@ def control_movement():
         {"id": "FaceAngleZ", "value": current_angles["z"]}
     ]
 
+def inject_parameters(parameter):
+    """注入 Live 2D 参数"""
+    send_request("InjectParameterDataRequest", "SomeID", {
+        "pluginName": "AI_Chat_Vtuber",
+        "pluginDeveloper": "Niama78",
+        "authenticationToken": token_global,
+        "faceFound": True,
+        "mode": "set",
+        "parameterValues": parameter
+    })
+
 def change_parameters():
     """修改 Live 2D 参数"""
     while True:
-        parameter = control_movement()
-        send_request("InjectParameterDataRequest", "SomeID", {
-            "pluginName": "AI_Chat_Vtuber",
-            "pluginDeveloper": "Niama78",
-            "authenticationToken": token_global,
-            "faceFound": True,
-            "mode": "set",
-            "parameterValues": parameter
-        })
+        inject_parameters(control_movement())
         time.sleep(0.1)
 
+async def change_parameters_async():
+    """change_parameters 的协程版本 (asyncio 运行时)"""
+    while True:
+        inject_parameters(await runtime.run_blocking(control_movement)) # control_movement 偶尔会停顿，放到线程池
+        await asyncio.sleep(0.1)
+
 def send_host_key(hostkey):
     """触发热键动画"""
     if hostkey == "无":
@@ -166,7 +180,7 @@ def on_message(ws, message):
       
     elif message_type == "AuthenticationResponse":
         if response["data"].get("authenticated") is True:
-            threading.Thread(target=change_parameters, daemon=True).start() 
+            start_parameters()
         else:
             print("身份验证失败，重新请求令牌...") 
             request_authentication_token() # 请求新的令牌
@@ -174,9 +188,18 @@ def on_message(ws, message):
     elif message_type == "APIError":
         print(f"Vtuber Studio API 错误: {response['data']['errorMessage']}")
 
+def start_parameters():
+    """认证成功后开始参数循环，asyncio 运行时下重连不会重复启动"""
+    global parameter_task
+    if not runtime.ENABLED:
+        threading.Thread(target=change_parameters, daemon=True).start() 
+    elif parameter_task is None or parameter_task.done():
+        parameter_task = runtime.spawn(change_parameters_async())
+
 def on_close(ws, close_status_code, close_msg):
     """WebSocket 连接关闭时"""
     print(f"Vtuber Studio 关闭信息: {close_status_code}, {close_msg}")
+    time.sleep(RECONNECT_DELAY) # 在结束的连接线程中等待，VTube Studio 未启动时不会连续重连
     connect_ws() # 重新连接
 
 def on_error(ws, error):
@@ -188,7 +211,7 @@ def connect_ws():
     global ws_global
     try:
         ws_global = websocket.WebSocketApp(
-            "ws://localhost:8001",
+            VTS_URL,
             on_open=on_open, 
             on_message=on_message,
             on_close=on_close,
@@ -198,4 +221,9 @@ def connect_ws():
     except Exception as e:
         print(f"连接 Vtuber Studio WebSocket 失败: {e}")
 
-connect_ws()
\ No newline at end of file
+if runtime.ENABLED:
+    ws_global = runtime.AsyncWebSocket(VTS_URL, on_open=on_open, on_message=on_message, on_error=on_error,
+                                       name="Vtuber Studio") # 断开后自动重连
+    ws_global.start() # 先赋值再连接，回调中的 ws_global 已是当前连接
+else:
+    connect_ws()
\ No newline at end of file
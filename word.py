@@ -1,14 +1,212 @@
 import os
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "1"
+HEADLESS = os.getenv("WORD_HEADLESS") == "1" # 无窗口模式：离屏渲染，用于 Linux 上的测试和基准测试
+if HEADLESS: # 必须在导入 pygame 和 OpenGL 之前设置
+    os.environ.setdefault("SDL_VIDEODRIVER", "offscreen") # SDL 离屏驱动，通过 EGL 创建 OpenGL 上下文
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+import sys
 import pygame
 import threading
 import time
 import OpenGL.GL as gl
 import freetype
 import ctypes
+import numpy as np
+from collections import OrderedDict, deque
+import subtitle
+
+TEXT_COLOR = (255, 191, 204) # 文字颜色 (RGB)
+ATLAS_SIZE = 2048 # 字形图集纹理边长 (像素)
+LATENCY_SAMPLES = 1000 # 保留最近多少条延迟样本
+FRAME_INTERVAL = 1 / 30 # 两次重绘的最短间隔 (秒)
+CLEAR_AFTER = 8 # 一轮回复完全显示后多久清屏 (秒)
+STATS_INTERVAL = 5 # 向主进程上报统计的间隔 (秒)
+
+class GlyphAtlas:
+    """字形图集：每个字形只光栅化一次，放进一张纹理中固定大小的格子，格子用完时淘汰最久未使用的字形"""
+
+    def __init__(self, face, font_size, size=ATLAS_SIZE):
+        self.face = face
+        self.size = size
+        # 格子大小取字体包围盒 (最多两倍字号)，四周各留 1 像素复制边缘，线性过滤时与原来逐字纹理的 CLAMP_TO_EDGE 一致
+        bbox = face.bbox
+        scale = font_size / face.units_per_EM
+        self.cell_w = min(int((bbox.xMax - bbox.xMin) * scale) + 1, font_size * 2)
+        self.cell_h = min(int((bbox.yMax - bbox.yMin) * scale) + 1, font_size * 2)
+        self.columns = size // (self.cell_w + 2)
+        capacity = self.columns * (size // (self.cell_h + 2))
+
+        self.glyphs = OrderedDict() # 字符 -> 格子编号，按最近使用排序
+        self.blank = set() # 没有位图的字符 (空格等)
+        self.free = list(range(capacity - 1, -1, -1)) # 空闲格子
+        self.rects = np.zeros((capacity, 6), dtype=np.float32) # 每个格子：宽、高、u0、v0、u1、v1
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+        self.texture_id = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGBA, size, size, 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE,
+                        np.zeros((size, size, 4), dtype=np.uint8))
+
+    def lookup(self, char):
+        """返回字符所在的格子编号，没有位图时返回 -1"""
+        slot = self.glyphs.get(char)
+        if slot is not None:
+            self.glyphs.move_to_end(char)
+            self.counters["hits"] += 1
+            return slot
+        if char in self.blank:
+            return -1
+        return self._rasterize(char)
+
+    def _rasterize(self, char):
+        """光栅化字符并上传到一个格子"""
+        self.counters["misses"] += 1
+        self.face.load_char(char, freetype.FT_LOAD_RENDER)
+        bitmap = self.face.glyph.bitmap
+        width, height = min(bitmap.width, self.cell_w), min(bitmap.rows, self.cell_h)
+        if width == 0 or height == 0:
+            self.blank.add(char)
+            return -1
+
+        if self.free:
+            slot = self.free.pop()
+        else: # 图集已满，淘汰最久未使用的字形 (多为少见的汉字)
+            _, slot = self.glyphs.popitem(last=False)
+            self.counters["evictions"] += 1
+        self.glyphs[char] = slot
+
+        alpha = np.array(bitmap.buffer, dtype=np.uint8).reshape(bitmap.rows, bitmap.pitch)[:height, :width]
+        rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        rgba[..., 3] = alpha
+        rgba[alpha > 0, :3] = TEXT_COLOR
+        cell = np.zeros((self.cell_h + 2, self.cell_w + 2, 4), dtype=np.uint8) # 整格上传，清掉被淘汰字形的残留
+        cell[:height + 2, :width + 2] = np.pad(rgba, ((1, 1), (1, 1), (0, 0)), mode="edge")
+
+        x = slot % self.columns * (self.cell_w + 2)
+        y = slot // self.columns * (self.cell_h + 2)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, x, y, self.cell_w + 2, self.cell_h + 2, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, cell)
+        x, y = x + 1, y + 1 # 字形本身在边缘内侧
+        self.rects[slot] = (width, height, x / self.size, y / self.size, (x + width) / self.size, (y + height) / self.size)
+        return slot
+
+    def draw(self, chars, xs, ys):
+        """一次绘制调用画出所有字符，(xs[i], ys[i]) 为 chars[i] 的左上角"""
+        slots = np.fromiter((self.lookup(char) for char in chars), dtype=np.int32, count=len(chars))
+        visible = slots >= 0
+        if not visible.any():
+            return
+        rects = self.rects[slots[visible]]
+        x0 = np.asarray(xs, dtype=np.float32)[visible]
+        y0 = np.asarray(ys, dtype=np.float32)[visible]
+        x1, y1 = x0 + rects[:, 0], y0 + rects[:, 1]
+        u0, v0, u1, v1 = rects[:, 2], rects[:, 3], rects[:, 4], rects[:, 5]
+
+        # 每个字符一个四边形，顶点顺序：左上、右上、右下、左下
+        vertices = np.stack([x0, y0, x1, y0, x1, y1, x0, y1], axis=1).reshape(-1, 2)
+        texcoords = np.stack([u0, v0, u1, v0, u1, v1, u0, v1], axis=1).reshape(-1, 2)
+
+        gl.glEnable(gl.GL_BLEND)
+        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+        gl.glEnable(gl.GL_TEXTURE_2D)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glEnableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glVertexPointer(2, gl.GL_FLOAT, 0, vertices)
+        gl.glTexCoordPointer(2, gl.GL_FLOAT, 0, texcoords)
+        gl.glDrawArrays(gl.GL_QUADS, 0, len(vertices))
+        gl.glDisableClientState(gl.GL_TEXTURE_COORD_ARRAY)
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glDisable(gl.GL_TEXTURE_2D)
+        gl.glDisable(gl.GL_BLEND)
+
+class TextLayout:
+    """增量换行排版：逐字追加时只累加当前行的宽度 (含字距调整)，已排好的行宽度和居中偏移都缓存，清空时才重新开始"""
+
+    def __init__(self, face, width, max_width, line_height, max_lines):
+        self.face = face
+        self.width = width # 窗口宽度，用于居中
+        self.max_width = max_width # 超过此宽度换行
+        self.line_height = line_height
+        self.max_lines = max_lines # 只保留屏幕内能显示的行数
+        self.use_kerning = face.has_kerning
+        self.advances = {} # 字符 -> 水平步进 (像素)
+        self.kernings = {} # (前一字符, 字符) -> 字距调整 (像素)
+        self.version = 0 # 显示内容变化时加一
+        self.static_version = 0 # 已写完的行 (除最后一行外) 变化时加一
+        self.reset()
+
+    def reset(self):
+        """清空所有行"""
+        self.lines = [] # 每行的文字
+        self.positions = [] # 每行各字符相对行首的 x
+        self.widths = [] # 每行宽度
+        self.offsets = [] # 每行居中后的起始 x
+        self.line_break = False # 下一个字符另起一行
+        self.version += 1
+        self.static_version += 1
+
+    def advance(self, char):
+        """字符的水平步进，利用缓存减少重复计算"""
+        advance = self.advances.get(char)
+        if advance is None:
+            self.face.load_char(char, freetype.FT_LOAD_DEFAULT) # 只需要度量，不光栅化
+            advance = self.advances[char] = self.face.glyph.linearHoriAdvance / 65536.0
+        return advance
+
+    def kerning(self, left, right):
+        """两个相邻字符之间的字距调整"""
+        if not self.use_kerning:
+            return 0.0
+        kerning = self.kernings.get((left, right))
+        if kerning is None:
+            kerning = self.kernings[(left, right)] = self.face.get_kerning(left, right, freetype.FT_KERNING_UNFITTED).x / 64.0
+        return kerning
+
+    def append(self, char):
+        """追加一个字符，放不下或遇到换行符时换到新的一行"""
+        if char == "\n":
+            self.line_break = bool(self.lines)
+            return
+        advance = self.advance(char)
+        self.version += 1
+        if self.lines and not self.line_break:
+            x = self.widths[-1] + self.kerning(self.lines[-1][-1], char)
+            if x + advance <= self.max_width:
+                self.lines[-1] += char
+                self.positions[-1].append(x)
+                self.widths[-1] = x + advance
+                self.offsets[-1] = (self.width - self.widths[-1]) / 2 # 居中对齐
+                return
+
+        self.line_break = False
+        self.static_version += 1 # 上一行写完了
+        self.lines.append(char)
+        self.positions.append([0.0])
+        self.widths.append(advance)
+        self.offsets.append((self.width - advance) / 2)
+        if len(self.lines) > self.max_lines: # 保持屏幕内显示的行数
+            for rows in (self.lines, self.positions, self.widths, self.offsets):
+                del rows[0]
+
+    def glyph_positions(self, first=0, last=None):
+        """返回第 first 到 last (不含) 行的字符及其左上角坐标 (chars, xs, ys)"""
+        chars, xs, ys = [], [], []
+        rows = range(len(self.lines))[first:last]
+        for row in rows:
+            line, positions, offset = self.lines[row], self.positions[row], self.offsets[row]
+            chars.extend(line)
+            xs.extend(offset + x for x in positions)
+            ys.extend([row * self.line_height] * len(line))
+        return chars, np.array(xs, dtype=np.float32), np.array(ys, dtype=np.float32)
 
 class ChatDisplay:
-    def __init__(self, width=1400, height=240, font_path="ShanHaiNiuNaiBoBoW-2.ttf", backup_file="backup.txt", font_size=60, typing_speed=0.12):
+    def __init__(self, width=1400, height=240, font_path="ShanHaiNiuNaiBoBoW-2.ttf", address=None, font_size=60, typing_speed=0.12, start=True):
         """初始化参数"""
         self.width = width
         self.height = height
@@ -20,186 +218,287 @@ class ChatDisplay:
         self.face.set_char_size(font_size * 64)
 
         self.text_queue = ""
-        self.display_text = ""
-        self.lines = []
+        self.layout = TextLayout(self.face, width, width - 100, font_size, height // font_size) # 已显示文字的排版
         self.char_index = 0
         self.last_char_time = time.time()
         self.full_text_rendered_time = None
+        self.turn_ended = True # 本轮回复文本已全部收到
+        self.arrivals = deque() # 未显示的增量：(在 text_queue 中的起始位置, 发送时间)
+        self.latency = {
+            "transport": deque(maxlen=LATENCY_SAMPLES), # 从主进程发送到收到 (秒)
+            "screen": deque(maxlen=LATENCY_SAMPLES), # 从主进程发送到第一个字显示 (秒，包括打字效果的排队)
+        }
+        self.counters = {
+            "wakeups": 0, # 渲染循环醒来的次数
+            "redraws": 0, # 重绘并刷新画面的次数
+            "static_redraws": 0, # 已写完的行重新绘制到帧缓冲的次数
+        }
         self.lock = threading.Lock()
-        self.char_width_cache = {} # 缓存字符宽度，减少重复计算
         self.running = True # 运行状态
+        self.ready = False # 窗口和 OpenGL 上下文已创建
+        self.wake_pending = False # 已投递唤醒事件，尚未处理
+        self.dirty = True # 需要重绘 (窗口被遮挡后重新显示等)
+        self.drawn_version = None # 画面对应的排版版本
+        self.fbo = None # 缓存已写完的行的帧缓冲，不支持时为 None
+        self.fbo_texture = None
+        self.fbo_version = None
 
-        self.backup_file = backup_file
+        self.address = address or os.getenv(subtitle.ADDRESS_ENV)
+        self.conn = None
+        self.hwnd = None
 
+        if not start: # 由调用者在当前线程调用 init_window 和 step (基准测试)
+            return
         threading.Thread(target=self._pygame_loop, daemon=True).start()
-        threading.Thread(target=self._monitor_backup_file, daemon=True).start()
+        if self.address:
+            self.conn = subtitle.connect(self.address)
+            threading.Thread(target=self._receive_messages, daemon=True).start()
+            threading.Thread(target=self._report_stats, daemon=True).start()
+        else:
+            print(f"未设置 {subtitle.ADDRESS_ENV}，字幕窗口不接收文本 (请通过 main.py 启动)")
 
-    def update_text(self, text):
-        """添加文本到显示队列"""
+    def update_text(self, text, sent=None):
+        """添加文本到显示队列，sent 为主进程发送时间"""
         with self.lock:
+            if sent is not None:
+                self.arrivals.append((len(self.text_queue), sent))
             if self.text_queue:
                 self.text_queue += text
             else:
                 self.text_queue = text
             self.full_text_rendered_time = None
+        self._wake()
 
-    def _monitor_backup_file(self):
-        """监听 backup.txt 并读取内容显示"""
-        open(self.backup_file, 'a', encoding='utf-8').close()
-        with open(self.backup_file, 'r+', encoding='utf-8') as f:
-            while self.running:
-                content = f.read().strip()
-                if content:
-                    self.update_text(content)
-                    f.seek(0)
-                    f.truncate() # 清空内容
-                time.sleep(0.01)
-                
-    def _pygame_loop(self):
-        """Pygame 事件和 OpenGL 渲染循环"""
+    def begin_turn(self):
+        """新一轮回复：上一轮已显示完时直接清屏，否则从新的一行开始"""
+        with self.lock:
+            if self.full_text_rendered_time:
+                self._clear()
+            elif self.text_queue:
+                self.text_queue += "\n"
+            self.turn_ended = False
+        self._wake()
+
+    def end_turn(self):
+        """本轮回复文本已全部收到，显示完后开始计算清屏时间"""
+        with self.lock:
+            self.turn_ended = True
+        self._wake()
+
+    def stats(self):
+        """返回帧计数、图集计数和延迟百分位 (毫秒)"""
+        with self.lock:
+            data = dict(self.counters)
+            for name, samples in self.latency.items():
+                ordered = sorted(samples)
+                for p in (50, 95):
+                    data[f"{name}_latency_p{p}_ms"] = ordered[int(p / 100 * (len(ordered) - 1))] * 1000 if ordered else 0.0
+        if self.ready:
+            data.update({f"atlas_{key}": value for key, value in self.atlas.counters.items()})
+        return data
+
+    def _wake(self):
+        """唤醒等待事件的渲染循环 (线程安全)，连续的唤醒只投递一次"""
+        if not self.ready or self.wake_pending:
+            return
+        self.wake_pending = True
+        try:
+            pygame.event.post(pygame.event.Event(self.wake_event))
+        except pygame.error: # 事件队列已满或窗口已关闭，循环稍后仍会检查状态
+            self.wake_pending = False
+
+    def _report_stats(self):
+        """定时向主进程上报统计"""
+        while self.running:
+            time.sleep(STATS_INTERVAL)
+            if not subtitle.report(self.conn, self.stats()):
+                break
+
+    def _receive_messages(self):
+        """接收主进程通过本地通道发送的回复文本，主进程退出时关闭窗口"""
+        for message in subtitle.receive(self.conn):
+            kind = message["type"]
+            if kind == "delta":
+                self.latency["transport"].append(message["received"] - message["ts"])
+                self.update_text(message["text"], message["ts"])
+            elif kind == "begin":
+                self.begin_turn()
+            elif kind == "end":
+                self.end_turn()
+        self.running = False
+        self._wake()
+
+    def _clear(self):
+        """清空显示内容"""
+        self.text_queue = ""
+        self.layout.reset()
+        self.char_index = 0
+        self.arrivals.clear()
+        self.full_text_rendered_time = None
+
+    def init_window(self):
+        """创建窗口 (无窗口模式下为离屏表面) 和 OpenGL 资源，之后的绘制都要在同一线程"""
         pygame.init() 
         self.screen = pygame.display.set_mode((self.width, self.height), pygame.OPENGL | pygame.DOUBLEBUF | pygame.NOFRAME)
         pygame.display.set_caption("聊天信息显示框")
-        self.hwnd = pygame.display.get_wm_info()["window"] # 获取窗口句柄
-        self.texture_id = gl.glGenTextures(1) # 生成 OpenGL 纹理 id
+        self.hwnd = pygame.display.get_wm_info().get("window") # 获取窗口句柄，离屏驱动没有
+        self.atlas = GlyphAtlas(self.face, self.font_size) # 字形图集，需要在 OpenGL 上下文中创建
+        self.fbo = self._create_framebuffer()
+        self.wake_event = pygame.event.custom_type() # 其他线程收到文本时投递，唤醒等待
 
         gl.glViewport(0, 0, self.width, self.height)
         gl.glMatrixMode(gl.GL_PROJECTION)
         gl.glLoadIdentity()
         gl.glOrtho(0, self.width, self.height, 0, -1, 1)
         gl.glClearColor(0.0, 1.0, 0.0, 1.0) # 初始清屏颜色设置为绿色
+        self.ready = True
 
-        clock = pygame.time.Clock()
-        while self.running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    self.running = False
-                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                    self._move_window()
-
+    def step(self, now):
+        """按给定时间 (time.time() 的值) 推进打字状态，画面有变化时重绘 (不刷新窗口)，返回是否重绘"""
+        self._advance(now)
+        if self.dirty or self.drawn_version != self.layout.version:
             self._render_text()
-            pygame.display.flip()
-            clock.tick(30)
-            time.sleep(0.01)
+            self.counters["redraws"] += 1
+            return True
+        return False
+
+    def read_pixels(self):
+        """读取当前画面，返回 (高, 宽, 3) 的 RGB 数组，第一行在最上面"""
+        data = gl.glReadPixels(0, 0, self.width, self.height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE)
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)[::-1]
+
+    def _pygame_loop(self):
+        """Pygame 事件和 OpenGL 渲染循环：只在画面变化时重绘，空闲时阻塞等待事件"""
+        self.init_window()
+        last_redraw = 0.0
+        while self.running:
+            self.counters["wakeups"] += 1
+            delay = self._advance() # 距下一次打字或清屏的秒数，None 表示空闲
+            if self.dirty or self.drawn_version != self.layout.version:
+                wait = last_redraw + FRAME_INTERVAL - time.perf_counter()
+                if wait > 0: # 限制帧率，剩余时间仍然处理事件
+                    delay = wait if delay is None else min(delay, wait)
+                else:
+                    self._render_text()
+                    pygame.display.flip()
+                    self.counters["redraws"] += 1
+                    last_redraw = time.perf_counter()
+            self._wait_events(delay)
         pygame.quit()
 
+    def _wait_events(self, delay):
+        """处理窗口事件；delay 为 None 时一直等到有事件，否则最多等 delay 秒"""
+        if delay is None:
+            events = [pygame.event.wait()]
+        elif delay > 0:
+            events = [pygame.event.wait(int(delay * 1000) + 1)]
+        else:
+            events = []
+        events += pygame.event.get()
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                self._move_window()
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE, pygame.WINDOWRESTORED):
+                self.dirty = True # 窗口内容需要重新绘制
+            elif event.type == self.wake_event:
+                self.wake_pending = False
+
     def _move_window(self):
         """拖动无边框窗口 (仅限 Windows)"""
+        if sys.platform != "win32" or not self.hwnd:
+            return
         ctypes.windll.user32.ReleaseCapture()
         ctypes.windll.user32.SendMessageW(self.hwnd, 0xA1, 2, 0)
 
-    def _render_text(self):
-        """模拟打字效果，同时管理文本显示时间"""
-        current_time = time.time()
+    def _advance(self, now=None):
+        """模拟打字效果，同时管理文本显示时间；返回距下一次状态变化的秒数，None 表示空闲"""
+        current_time = time.time() if now is None else now
+        delay = None
         with self.lock:
-            if self.char_index < len(self.text_queue) and current_time - self.last_char_time > self.typing_speed:
-                self.char_index += 1
-                self.display_text = self.text_queue[:self.char_index]
-                self.lines = self._wrap_text(self.display_text)
-                self.last_char_time = current_time
-
-                if self.char_index == len(self.text_queue):
-                    self.full_text_rendered_time = current_time
-
-            # 保持屏幕内显示的行数
-            max_lines = self.height // self.font_size
-            while len(self.lines) > max_lines:
-                self.lines.pop(0)
-                self.display_text = "\n".join(self.lines)
-
-            if self.full_text_rendered_time and current_time - self.full_text_rendered_time > 8: # 完全显示后超时无新文本
-                self.text_queue = ""
-                self.display_text = ""
-                self.lines = []
-                self.char_index = 0
-                self.full_text_rendered_time = None
-
-        # 设置绿色背景并清屏
-        gl.glClearColor(0.0, 1.0, 0.0, 1.0)
-        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+            if self.char_index < len(self.text_queue):
+                delay = self.last_char_time + self.typing_speed - current_time
+                if delay <= 0:
+                    self.layout.append(self.text_queue[self.char_index])
+                    while self.arrivals and self.arrivals[0][0] <= self.char_index: # 这个增量的第一个字显示了
+                        self.latency["screen"].append(current_time - self.arrivals.popleft()[1])
+                    self.char_index += 1
+                    self.last_char_time = current_time
+                    delay = self.typing_speed if self.char_index < len(self.text_queue) else None
 
-        y_offset = 0
-        for line in self.lines:
-            line_width = self._get_text_width(line)
-            x_start_offset = (self.width - line_width) / 2  # 居中对齐
-            x_offset = x_start_offset
-            for char in line:
-                self._render_char(char, x_offset, y_offset)
-                x_offset += self.char_width_cache.get(char, self._get_text_width(char))
-            y_offset += self.font_size
-
-    def _get_text_width(self, text):
-        """计算字符串宽度，利用缓存减少重复计算"""
-        width = 0
-        for char in text:
-            if char in self.char_width_cache:
-                char_width = self.char_width_cache[char]
-            else:
-                self.face.load_char(char, freetype.FT_LOAD_RENDER)
-                char_width = self.face.glyph.linearHoriAdvance / 65536.0
-                self.char_width_cache[char] = char_width
-            width += char_width
-        return width
-
-    def _render_char(self, char, x, y):
-        """渲染单个字符，将其位图转换为纹理并绘制到 (x, y)"""
-        self.face.load_char(char, freetype.FT_LOAD_RENDER)
-        glyph = self.face.glyph
-        bitmap = glyph.bitmap
-        width, height = bitmap.width, bitmap.rows
+            if self.text_queue and self.char_index == len(self.text_queue) and self.turn_ended and not self.full_text_rendered_time:
+                self.full_text_rendered_time = current_time # 本轮全部显示完
 
-        if width == 0 or height == 0:
-            return
+            if self.full_text_rendered_time:
+                remaining = self.full_text_rendered_time + CLEAR_AFTER - current_time
+                if remaining < 0: # 完全显示后超时无新文本
+                    self._clear()
+                else:
+                    delay = remaining if delay is None else min(delay, remaining)
+        return delay
 
-        rgba_buffer = bytearray()
-    
-        for value in bitmap.buffer:
-            alpha = value
-            if alpha > 0:
-                rgba_buffer.extend([255, 191, 204, alpha])
-            else:
-                rgba_buffer.extend([0, 0, 0, 0])
+    def _create_framebuffer(self):
+        """创建缓存已写完的行的帧缓冲 (纹理附件)，不支持时返回 None"""
+        if not bool(gl.glGenFramebuffers):
+            return None
+        texture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGBA8, self.width, self.height, 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, None)
+        fbo = gl.glGenFramebuffers(1)
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, fbo)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, gl.GL_TEXTURE_2D, texture, 0)
+        complete = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER) == gl.GL_FRAMEBUFFER_COMPLETE
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+        self.fbo_texture = texture
+        return fbo if complete else None
 
-        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture_id)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
-        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
-        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
-        
-        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGBA, width, height, 0, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, bytes(rgba_buffer))
-        gl.glEnable(gl.GL_BLEND)
-        gl.glBlendFunc(gl.GL_SRC_ALPHA, gl.GL_ONE_MINUS_SRC_ALPHA)
+    def _render_text(self):
+        """绘制画面：已写完的行来自帧缓冲缓存，每次只重新绘制正在打字的最后一行"""
+        with self.lock:
+            version, static_version = self.layout.version, self.layout.static_version
+            if self.fbo is None:
+                static, active = None, self.layout.glyph_positions()
+            else:
+                static = self.layout.glyph_positions(0, -1) if static_version != self.fbo_version else None
+                active = self.layout.glyph_positions(-1)
+                finished = max(0, len(self.layout.lines) - 1)
 
-        gl.glEnable(gl.GL_TEXTURE_2D)
-        gl.glBegin(gl.GL_QUADS)
-        gl.glTexCoord2f(0, 0)
-        gl.glVertex2f(x, y)
-        gl.glTexCoord2f(1, 0)
-        gl.glVertex2f(x + width, y)
-        gl.glTexCoord2f(1, 1)
-        gl.glVertex2f(x + width, y + height)
-        gl.glTexCoord2f(0, 1)
-        gl.glVertex2f(x, y + height)
-        gl.glEnd()
-        gl.glDisable(gl.GL_TEXTURE_2D)
-        gl.glDisable(gl.GL_BLEND)
+        gl.glClearColor(0.0, 1.0, 0.0, 1.0) # 设置绿色背景并清屏
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        if self.fbo is not None:
+            if static is not None: # 已写完的行有变化 (换行、滚动、清屏)，重新绘制到帧缓冲
+                gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.fbo)
+                gl.glClearColor(0.0, 1.0, 0.0, 1.0)
+                gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+                self.atlas.draw(*static)
+                self.fbo_version = static_version
+                self.counters["static_redraws"] += 1
+                gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+            if finished:
+                # 只贴已写完的行所在的区域 (包括字形伸出行底的部分)，不混合；纹理的 v 轴与窗口 y 轴方向相反
+                height = min(self.height, (finished - 1) * self.font_size + self.atlas.cell_h + 2)
+                v = 1 - height / self.height
+                gl.glEnable(gl.GL_TEXTURE_2D)
+                gl.glBindTexture(gl.GL_TEXTURE_2D, self.fbo_texture)
+                gl.glBegin(gl.GL_QUADS)
+                gl.glTexCoord2f(0, 1)
+                gl.glVertex2f(0, 0)
+                gl.glTexCoord2f(1, 1)
+                gl.glVertex2f(self.width, 0)
+                gl.glTexCoord2f(1, v)
+                gl.glVertex2f(self.width, height)
+                gl.glTexCoord2f(0, v)
+                gl.glVertex2f(0, height)
+                gl.glEnd()
+                gl.glDisable(gl.GL_TEXTURE_2D)
+        self.atlas.draw(*active) # 一次绘制剩余的字符
+        self.drawn_version = version
+        self.dirty = False
 
-    def _wrap_text(self, text):
-        """根据窗口宽度自动换行"""
-        lines = []
-        current_line = ""
-        for char in text:
-            test_line = current_line + char
-            if self._get_text_width(test_line) > self.width - 100:
-                lines.append(current_line)
-                current_line = char
-            else:
-                current_line = test_line
-        if current_line:
-            lines.append(current_line)
-        return lines
-    
-display = ChatDisplay()
-while display.running:
-    time.sleep(1)
\ No newline at end of file
+if __name__ == "__main__":
+    display = ChatDisplay()
+    while display.running:
+        time.sleep(1)
\ No newline at end of file